@@ -8,11 +8,19 @@ const COLORS = {
   temp:     { line: "#F97316", fill: "rgba(249,115,22,0.2)" },   // red-orange
 };
 
+const METRICS = ["moisture_pct", "lux", "rh", "temp_c"];
+const LOAD_POINTS = 4000;     // full loads ask the server to bucket down to about this many points
+const MAX_RENDER = 2000;      // upper bound on points handed to Chart.js per dataset
+const DELTA_PAGE = 2000;      // rows per /api/delta page
+const DELTA_MAX_PAGES = 10;   // pages per tick; the rest is picked up next tick
+
 let charts = { moisture: null, lux: null, climate: null };
 let pollTimer = null;
+let renderPending = false;
 
-// Keep last server ts per metric for delta fetches
-let lastTs = { moisture_pct: null, lux: null, rh: null, temp_c: null };
+// One sliding window per metric, plus the /api/delta cursor they are current to
+let series = null;
+let deltaCursor = null;
 
 // AbortControllers: one for a full reload, one for periodic tick
 let loadCtrl = null;
@@ -29,6 +37,163 @@ async function fetchJSON(path, opts = {}) {
   return r.json();
 }
 
+async function fetchBuffer(path, opts = {}) {
+  const r = await fetch(`${apiBase()}${path}`, opts);
+  if (!r.ok) throw new Error(`HTTP ${r.status}: ${await r.text()}`);
+  return r.arrayBuffer();
+}
+
+/* ---------- Sliding window (typed arrays) ---------- */
+
+// Time-ordered (ms, value) pairs in two typed arrays. Live points are [start, end);
+// eviction just advances `start`, and space is reclaimed by compacting in place
+// when the buffer fills, so memory stays proportional to the window, not uptime.
+class SeriesWindow {
+  constructor(capacity = 1024) {
+    this.t = new Float64Array(capacity);
+    this.v = new Float32Array(capacity);
+    this.start = 0;
+    this.end = 0;
+  }
+
+  get length() { return this.end - this.start; }
+
+  lastT() { return this.end > this.start ? this.t[this.end - 1] : -Infinity; }
+
+  replace(t, v) {
+    if (t.length > this.t.length) {
+      this.t = new Float64Array(t.length * 2);
+      this.v = new Float32Array(t.length * 2);
+    }
+    this.t.set(t);
+    this.v.set(v);
+    this.start = 0;
+    this.end = t.length;
+  }
+
+  push(t, v) {
+    if (t <= this.lastT()) return false;  // already have it (or older than what we show)
+    if (this.end === this.t.length) this._makeRoom();
+    this.t[this.end] = t;
+    this.v[this.end] = v;
+    this.end++;
+    return true;
+  }
+
+  evictBefore(tMin) {
+    let lo = this.start, hi = this.end;
+    while (lo < hi) {              // first index with t >= tMin
+      const mid = (lo + hi) >>> 1;
+      if (this.t[mid] < tMin) lo = mid + 1; else hi = mid;
+    }
+    const evicted = lo - this.start;
+    this.start = lo;
+    return evicted;
+  }
+
+  _makeRoom() {
+    const n = this.length;
+    if (this.start > 0 && n < this.t.length * 0.75) {
+      this.t.copyWithin(0, this.start, this.end);
+      this.v.copyWithin(0, this.start, this.end);
+    } else {
+      const t = new Float64Array(this.t.length * 2);
+      const v = new Float32Array(this.v.length * 2);
+      t.set(this.t.subarray(this.start, this.end));
+      v.set(this.v.subarray(this.start, this.end));
+      this.t = t;
+      this.v = v;
+    }
+    this.start = 0;
+    this.end = n;
+  }
+}
+
+function newSeries() {
+  const s = {};
+  METRICS.forEach((m) => { s[m] = new SeriesWindow(); });
+  return s;
+}
+
+/* ---------- Decimation (LTTB) ---------- */
+
+// Largest-Triangle-Three-Buckets: keeps the visual shape (peaks included) of a
+// series in `threshold` points. Writes into `out` (reused {x, y} objects) and
+// returns the number of points written.
+function lttb(win, threshold, out) {
+  const { t, v, start } = win;
+  const n = win.length;
+  const put = (k, i) => {
+    let p = out[k];
+    if (!p) { p = out[k] = { x: 0, y: 0 }; }
+    p.x = t[i]; p.y = v[i];
+  };
+  if (threshold >= n || threshold < 3) {
+    for (let i = 0; i < n; i++) put(i, start + i);
+    return n;
+  }
+  const every = (n - 2) / (threshold - 2);
+  let a = start;
+  let k = 0;
+  put(k++, a);
+  for (let b = 0; b < threshold - 2; b++) {
+    // average of the next bucket is the third triangle corner
+    let avgStart = start + Math.floor((b + 1) * every) + 1;
+    let avgEnd = Math.min(start + Math.floor((b + 2) * every) + 1, start + n);
+    let avgX = 0, avgY = 0;
+    const avgLen = avgEnd - avgStart;
+    for (let i = avgStart; i < avgEnd; i++) { avgX += t[i]; avgY += v[i]; }
+    avgX /= avgLen; avgY /= avgLen;
+
+    const rangeStart = start + Math.floor(b * every) + 1;
+    const rangeEnd = start + Math.floor((b + 1) * every) + 1;
+    const ax = t[a], ay = v[a];
+    let maxArea = -1, next = rangeStart;
+    for (let i = rangeStart; i < rangeEnd; i++) {
+      const area = Math.abs((ax - avgX) * (v[i] - ay) - (ax - t[i]) * (avgY - ay));
+      if (area > maxArea) { maxArea = area; next = i; }
+    }
+    put(k++, next);
+    a = next;
+  }
+  put(k++, start + n - 1);
+  return k;
+}
+
+// Per-dataset pool of point objects; dataset.data is resized in place, never reallocated.
+function renderDataset(ds, win, canvas) {
+  const threshold = Math.min(MAX_RENDER, Math.max(100, Math.round((canvas?.clientWidth || 800) * 1.5)));
+  ds._pool = ds._pool || [];
+  const k = lttb(win, threshold, ds._pool);
+  const data = ds.data;
+  data.length = k;
+  for (let i = 0; i < k; i++) data[i] = ds._pool[i];
+}
+
+function render() {
+  renderPending = false;
+  if (!series) return;
+  if (charts.moisture) {
+    renderDataset(charts.moisture.data.datasets[0], series.moisture_pct, charts.moisture.canvas);
+    charts.moisture.update("none");
+  }
+  if (charts.lux) {
+    renderDataset(charts.lux.data.datasets[0], series.lux, charts.lux.canvas);
+    charts.lux.update("none");
+  }
+  if (charts.climate) {
+    renderDataset(charts.climate.data.datasets[0], series.rh, charts.climate.canvas);
+    renderDataset(charts.climate.data.datasets[1], series.temp_c, charts.climate.canvas);
+    charts.climate.update("none");
+  }
+}
+
+function scheduleRender() {
+  if (renderPending) return;
+  renderPending = true;
+  requestAnimationFrame(render);
+}
+
 /* ---------- Data loading ---------- */
 
 async function loadProbes() {
@@ -46,119 +211,103 @@ async function loadProbes() {
   }
 }
 
-// Server returns "YYYY-MM-DD HH:mm:ss" (UTC). Normalize to ISO UTC for date adapter.
-function toPoints(resp) {
-  return resp.series.map((p) => ({
-    x: p.ts.replace(" ", "T") + "Z",
-    y: Number(p.value),
-    _rawTs: p.ts,
-  }));
+// Bucket size that keeps a full load near LOAD_POINTS (raw rows for short windows).
+function bucketFor(hours) {
+  const bucket = Math.ceil((hours * 3600) / LOAD_POINTS);
+  return bucket <= 2 ? 0 : bucket;  // probes report every ~2 s
 }
 
+// /api/series?format=binary: uint32 n, uint32 pad, float64[n] epoch ms, float32[n] values
 async function fetchMetric(probeId, metric, hours, ctrl) {
-  const after = lastTs[metric];
-  const params = new URLSearchParams({ probe_id: String(probeId), metric, since_hours: String(hours) });
-  if (after) params.set("after_ts", after);
-  const resp = await fetchJSON(`/api/series?${params.toString()}`, ctrl ? { signal: ctrl.signal } : {});
-  const pts = toPoints(resp);
-  if (pts.length) lastTs[metric] = pts[pts.length - 1]._rawTs;
-  return pts;
+  const params = new URLSearchParams({
+    probe_id: String(probeId),
+    metric,
+    since_hours: String(hours),
+    bucket_seconds: String(bucketFor(hours)),
+    limit: "20000",
+    format: "binary",
+  });
+  const buf = await fetchBuffer(`/api/series?${params.toString()}`, ctrl ? { signal: ctrl.signal } : {});
+  const n = new DataView(buf).getUint32(0, true);
+  return { t: new Float64Array(buf, 8, n), v: new Float32Array(buf, 8 + 8 * n, n) };
+}
+
+// "YYYY-MM-DD HH:mm:ss" (UTC) -> epoch ms
+function parseTs(ts) {
+  return Date.parse(ts.replace(" ", "T") + "Z");
 }
 
 /* ---------- Chart helpers ---------- */
 
 function destroyIf(chart) { if (chart) chart.destroy(); }
 
-function makeLineChart(canvas, label, points, color, extraOpts = {}) {
+const DATASET_DEFAULTS = {
+  data: [],
+  borderWidth: 2,
+  pointRadius: 0,
+  tension: 0.25,
+  fill: false,
+  spanGaps: true,
+};
+
+const CHART_OPTIONS = {
+  parsing: false,       // points are already {x: ms, y: number}
+  normalized: true,     // ... and sorted by x
+  animation: false,
+  interaction: { mode: "nearest", intersect: false },
+  maintainAspectRatio: false,
+};
+
+function makeLineChart(canvas, label, color, extraOpts = {}) {
   return new Chart(canvas, {
     type: "line",
     data: {
-      datasets: [{
-        label,
-        data: points,
-        borderColor: color.line,
-        backgroundColor: color.fill,
-        borderWidth: 2,
-        pointRadius: 0,
-        tension: 0.25,
-        fill: false,
-        spanGaps: true,
-      }],
+      datasets: [{ ...DATASET_DEFAULTS, data: [], label, borderColor: color.line, backgroundColor: color.fill }],
     },
     options: {
       scales: { x: { type: "time", time: { tooltipFormat: "MMM d, HH:mm" } } },
-      animation: false,
-      interaction: { mode: "nearest", intersect: false },
-      maintainAspectRatio: false,
+      ...CHART_OPTIONS,
       ...extraOpts,
     },
   });
 }
 
-function appendPoints(chart, addPts) {
-  if (!chart || !addPts.length) return;
-  const ds = chart.data.datasets[0];
-  ds.data.push(...addPts);       // server already sorted ASC
-  chart.update("none");
-}
-
 /* ---------- Full reload / incremental tick ---------- */
 
 async function fullReloadCharts() {
   const probeId = $("#probeSelect")?.value;
-  const hours = $("#sinceHours")?.value || 24;
+  const hours = Number($("#sinceHours")?.value || 24);
   if (!probeId) return;
 
   // Abort any in-flight full reload
   if (loadCtrl) loadCtrl.abort();
   loadCtrl = new AbortController();
 
-  // Reset delta tracking
-  lastTs = { moisture_pct: null, lux: null, rh: null, temp_c: null };
-
   try {
-    const [mPts, lPts, rPts, tPts] = await Promise.all([
-      fetchMetric(probeId, "moisture_pct", hours, loadCtrl),
-      fetchMetric(probeId, "lux", hours, loadCtrl),
-      fetchMetric(probeId, "rh", hours, loadCtrl),
-      fetchMetric(probeId, "temp_c", hours, loadCtrl),
-    ]);
+    // Take the delta cursor first: rows committed while the series load are
+    // fetched again by the next tick and dropped by push() if already present.
+    const head = await fetchJSON(`/api/delta?from_latest=true&limit=1&probe_id=${probeId}`, { signal: loadCtrl.signal });
+    const loaded = await Promise.all(METRICS.map((m) => fetchMetric(probeId, m, hours, loadCtrl)));
+
+    series = newSeries();
+    METRICS.forEach((m, i) => series[m].replace(loaded[i].t, loaded[i].v));
+    deltaCursor = head.cursor;
 
     destroyIf(charts.moisture);
-    charts.moisture = makeLineChart($("#moistureChart"), "Moisture %", mPts, COLORS.moisture);
+    charts.moisture = makeLineChart($("#moistureChart"), "Moisture %", COLORS.moisture);
 
     destroyIf(charts.lux);
-    charts.lux = makeLineChart($("#luxChart"), "Lux", lPts, COLORS.lux);
+    charts.lux = makeLineChart($("#luxChart"), "Lux", COLORS.lux);
 
     destroyIf(charts.climate);
     charts.climate = new Chart($("#climateChart"), {
       type: "line",
       data: {
         datasets: [
-          {
-            label: "RH %",
-            data: rPts,
-            yAxisID: "y1",
-            borderColor: COLORS.rh.line,
-            backgroundColor: COLORS.rh.fill,
-            borderWidth: 2,
-            pointRadius: 0,
-            tension: 0.25,
-            fill: false,
-            spanGaps: true,
-          },
-          {
-            label: "Temp °C",
-            data: tPts,
-            yAxisID: "y2",
-            borderColor: COLORS.temp.line,
-            backgroundColor: COLORS.temp.fill,
-            borderWidth: 2,
-            pointRadius: 0,
-            tension: 0.25,
-            fill: false,
-            spanGaps: true,
-          }
+          { ...DATASET_DEFAULTS, data: [], label: "RH %", yAxisID: "y1",
+            borderColor: COLORS.rh.line, backgroundColor: COLORS.rh.fill },
+          { ...DATASET_DEFAULTS, data: [], label: "Temp °C", yAxisID: "y2",
+            borderColor: COLORS.temp.line, backgroundColor: COLORS.temp.fill },
         ]
       },
       options: {
@@ -167,11 +316,10 @@ async function fullReloadCharts() {
           y1: { position: "left" },
           y2: { position: "right" }
         },
-        animation: false,
-        interaction: { mode: "nearest", intersect: false },
-        maintainAspectRatio: false
+        ...CHART_OPTIONS,
       }
     });
+    render();
   } catch (e) {
     if (e.name !== "AbortError") console.warn("fullReloadCharts error:", e);
   }
@@ -179,29 +327,34 @@ async function fullReloadCharts() {
 
 async function incrementalTick() {
   const probeId = $("#probeSelect")?.value;
-  const hours = $("#sinceHours")?.value || 24;
-  if (!probeId) return;
+  const hours = Number($("#sinceHours")?.value || 24);
+  if (!probeId || !series || !deltaCursor) return;
 
   // Abort any previous tick so ticks don't overlap
   if (tickCtrl) tickCtrl.abort();
   tickCtrl = new AbortController();
 
   try {
-    const [mPts, lPts, rPts, tPts] = await Promise.all([
-      fetchMetric(probeId, "moisture_pct", hours, tickCtrl),
-      fetchMetric(probeId, "lux", hours, tickCtrl),
-      fetchMetric(probeId, "rh", hours, tickCtrl),
-      fetchMetric(probeId, "temp_c", hours, tickCtrl),
-    ]);
-
-    appendPoints(charts.moisture, mPts);
-    appendPoints(charts.lux, lPts);
-
-    if (charts.climate) {
-      if (rPts.length) charts.climate.data.datasets[0].data.push(...rPts);
-      if (tPts.length) charts.climate.data.datasets[1].data.push(...tPts);
-      if (rPts.length || tPts.length) charts.climate.update("none");
+    let added = 0;
+    for (let page = 0; page < DELTA_MAX_PAGES; page++) {
+      const params = new URLSearchParams({ cursor: deltaCursor, probe_id: String(probeId), limit: String(DELTA_PAGE) });
+      const resp = await fetchJSON(`/api/delta?${params.toString()}`, { signal: tickCtrl.signal });
+      for (const row of resp.rows) {
+        const t = parseTs(row.ts);
+        for (const m of METRICS) {
+          if (row[m] !== null && row[m] !== undefined && series[m].push(t, row[m])) added++;
+        }
+      }
+      deltaCursor = resp.cursor;
+      if (!resp.has_more) break;
     }
+
+    // slide the window: drop everything older than the selected range
+    const tMin = Date.now() - hours * 3600 * 1000;
+    let evicted = 0;
+    for (const m of METRICS) evicted += series[m].evictBefore(tMin);
+
+    if (added || evicted) scheduleRender();
   } catch (e) {
     if (e.name !== "AbortError") console.warn("incrementalTick error:", e);
   }
@@ -234,6 +387,7 @@ function wireUI() {
   document.addEventListener("visibilitychange", () => {
     if (!document.hidden && $("#autoRefresh")?.checked) incrementalTick();
   });
+  window.addEventListener("resize", scheduleRender);  // LTTB target follows canvas width
 }
 
 /* ---------- Bootstrap ---------- */
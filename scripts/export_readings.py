@@ -0,0 +1,18 @@
+#!/usr/bin/env python3
+"""
+Stream readings from the SQLite DB to CSV / JSONL / Parquet / Arrow.
+
+Replaces the old database_peek.py (which loaded the table through pandas).
+Memory stays bounded by --chunk-size, and the DB is read from a read-only
+snapshot so ingest is never blocked.
+
+    python scripts/export_readings.py --out data/plant_peek.csv
+    python scripts/export_readings.py --probe 1 --aggregate hour --out data/p1_hourly.parquet
+
+Run with the package importable (pip install -e . or PYTHONPATH=src).
+"""
+
+from plantpipe.output.export import main
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+Query-plan review for the index set.
+
+Builds a synthetic database, runs every read in PlantDBWrapper and the
+PlantAPI endpoints while recording the SQL they execute, then prints
+EXPLAIN QUERY PLAN for each distinct statement with its median latency, and
+the insert throughput of the writer's batch shape. Plans that scan readings
+or probe_alerts, sort in a temp b-tree, or look rows up outside the index are
+flagged. Indexed columns that an AFTER INSERT trigger rewrites (two index
+writes per insert) are listed with the reads they keep covered.
+
+    PYTHONPATH=src python scripts/index_review.py --rows 200000
+    PYTHONPATH=src python scripts/index_review.py --compare 3    # sql/ up to 003 vs all of sql/
+
+--compare N builds a second database with only the migrations <= N (the index
+set before a change) and prints both side by side.
+"""
+
+import argparse
+import random
+import re
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from plantpipe.storage.database import PlantDBWrapper
+from plantpipe.storage.migrations import MIGRATION_RE
+
+ROOT = Path(__file__).resolve().parent.parent
+SQL_DIR = ROOT / "sql"
+BIG_TABLES = ("readings", "probe_alerts")
+SKIP_RE = re.compile(r"^\s*(PRAGMA|BEGIN|COMMIT|ROLLBACK|INSERT)\b|sqlite_master", re.I)
+LITERAL_RE = re.compile(r"'[^']*'|\b\d+(\.\d+)?\b")
+CALIBRATION = {
+    "raw_dry": 850, "raw_wet": 350, "lux_min": 0, "lux_max": 20000,
+    "rh_min": 0, "rh_max": 100, "temp_min": -10, "temp_max": 50,
+}
+
+
+def ts_str(dt: datetime) -> str:
+    return dt.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def schema_dir(tmp: Path, upto: Optional[int]) -> Path:
+    """Copy of sql/ holding only the migrations with version <= upto (all when None)."""
+    out = tmp / f"sql_{upto or 'all'}"
+    out.mkdir()
+    for p in SQL_DIR.glob("*.sql"):
+        m = MIGRATION_RE.match(p.name)
+        if m and (upto is None or int(m.group(1)) <= upto):
+            shutil.copy(p, out / p.name)
+    return out
+
+
+# ---------- build ----------
+
+def build(path: Path, sql: Path, rows: int, probes: int, interval: int, seed: int) -> Tuple[PlantDBWrapper, Dict[str, float]]:
+    db = PlantDBWrapper(str(path), str(sql / "001_init.sql"))
+    cals = {p: db.upsert_active_calibration_from_defaults(p, CALIBRATION) for p in range(1, probes + 1)}
+
+    rng = random.Random(seed)
+    per_probe = rows // probes
+    start = datetime.utcnow() - timedelta(seconds=per_probe * interval)
+
+    def payload(i: int, p: int) -> Dict[str, Any]:
+        return {
+            "ts": ts_str(start + timedelta(seconds=i * interval)), "probe_id": p, "seq": i,
+            "lux": rng.uniform(0, 20000), "rh": rng.uniform(30, 80), "temp_c": rng.uniform(15, 30),
+            "moisture_raw": rng.randint(350, 850), "calibration_id": cals[p],
+        }
+
+    # bulk load in large transactions, then time the writer's shape (BatchConfig.size rows) on the full table
+    tail = min(20000, per_probe // 4) * probes
+    batch: List[Dict[str, Any]] = []
+    t_bulk = 0.0
+    t_tail = 0.0
+    n = 0
+    for i in range(per_probe):
+        for p in range(1, probes + 1):
+            batch.append(payload(i, p))
+            n += 1
+            size = 5000 if n <= rows - tail else 50
+            if len(batch) >= size:
+                t0 = time.perf_counter()
+                db.insert_batch_readings(batch, raise_errors=True)
+                if n <= rows - tail:
+                    t_bulk += time.perf_counter() - t0
+                else:
+                    t_tail += time.perf_counter() - t0
+                batch = []
+    if batch:
+        db.insert_batch_readings(batch, raise_errors=True)
+
+    alert_types = ("too_dry", "spike", "stuck_sensor", "moisture_drop")
+    db.insert_alerts(
+        {"probe_id": rng.randint(1, probes), "type": rng.choice(alert_types), "message": "synthetic",
+         "timestamp": ts_str(start + timedelta(seconds=rng.randint(0, per_probe * interval)))}
+        for _ in range(max(100, rows // 100))
+    )
+    db.add_ingest_counters("sequence", {(p, "delivered"): per_probe for p in range(1, probes + 1)})
+    db.connection().execute("ANALYZE")
+
+    stats = {
+        "bulk_rows_s": (rows - tail) / t_bulk if t_bulk else 0.0,
+        "batch50_rows_s": tail / t_tail if t_tail else 0.0,
+    }
+    return db, stats
+
+
+# ---------- capture ----------
+
+class Recorder:
+    """Collects the SQL each labelled call runs on any of the wrapper's thread connections."""
+
+    def __init__(self, db: PlantDBWrapper) -> None:
+        self.label = ""
+        self.statements: Dict[str, Tuple[str, str]] = {}  # shape -> (label, expanded sql)
+        get_conn = db._get_conn
+
+        def traced() -> sqlite3.Connection:
+            conn = get_conn()
+            conn.set_trace_callback(self._trace)
+            return conn
+
+        db._get_conn = traced
+
+    def _trace(self, sql: str) -> None:
+        if SKIP_RE.search(sql):
+            return
+        shape = LITERAL_RE.sub("?", " ".join(sql.split()))
+        self.statements.setdefault(shape, (self.label, sql))
+
+    def run(self, label: str, fn: Callable[[], Any]) -> Any:
+        self.label = label
+        return fn()
+
+
+def exercise(db: PlantDBWrapper, rec: Recorder, probes: int) -> None:
+    now = datetime.utcnow()
+    day = ts_str(now - timedelta(hours=24))
+    hour = ts_str(now - timedelta(hours=1))
+    recent = max(0, rec.run("max_reading_id", db.max_reading_id) - 500)
+
+    calls: List[Tuple[str, Callable[[], Any]]] = [
+        ("get_last_readings", lambda: db.get_last_readings(100)),
+        ("get_readings_after_id", lambda: db.get_readings_after_id(recent, 1000)),
+        ("get_readings_after_id(probe)", lambda: db.get_readings_after_id(recent, 1000, probe_id=1)),
+        ("get_rows_after_id(probe_alerts)", lambda: db.get_rows_after_id("probe_alerts", 0, 1000)),
+        ("get_latest_reading_per_probe", db.get_latest_reading_per_probe),
+        ("get_bucket_stats", lambda: db.get_bucket_stats(day, 300)),
+        ("get_probe_labels", db.get_probe_labels),
+        ("get_active_probes", db.get_active_probes),
+        ("get_probe_calibration", lambda: db.get_probe_calibration(1)),
+        ("get_validation_envelope", lambda: db.get_validation_envelope(1)),
+        ("get_calibration_raw_range", lambda: db.get_calibration_raw_range(1)),
+        ("get_probe_alert_thresholds", lambda: db.get_probe_alert_thresholds(1)),
+        ("get_probe_alerts", lambda: db.get_probe_alerts(1)),
+        ("get_alerts", lambda: db.get_alerts(since_ts=day)),
+        ("get_alerts(probe)", lambda: db.get_alerts(1, day, ["spike", "stuck_sensor"])),
+        ("get_metric_history", lambda: db.get_metric_history(1, "moisture_pct", day)),
+        ("get_series", lambda: db.get_series(1, "lux", day)),
+        ("get_series(after_ts)", lambda: db.get_series(1, "lux", day, after_ts=hour)),
+        ("get_series(bucket)", lambda: db.get_series(1, "lux", day, bucket_seconds=60)),
+        ("get_ingest_stats", db.get_ingest_stats),
+        ("latest_timestamp", db.latest_timestamp),
+        ("updated_within", lambda: db.updated_within(60)),
+        ("has_updates_since", lambda: db.has_updates_since(hour)),
+        ("row_count", db.row_count),
+        ("delete_readings_before", lambda: db.delete_readings_before("2000-01-01 00:00:00")),
+    ]
+    for label, fn in calls:
+        rec.run(label, fn)
+
+    try:
+        from fastapi.testclient import TestClient
+        from plantpipe.api.api_server import PlantAPI
+    except ImportError:
+        print("fastapi not installed: API endpoints not exercised")
+        return
+    client = TestClient(PlantAPI(db, frontend=str(ROOT / "frontend")).app)
+    for url in (
+        "/api/probes", "/api/overview", "/api/ingest/stats", "/api/alerts?probe_id=1",
+        "/api/series?probe_id=1&metric=temp_c", "/api/series?probe_id=1&metric=rh&bucket_seconds=300&format=binary",
+        "/api/delta?from_latest=true", f"/api/delta?probe_id={probes}&from_latest=true",
+        "/api/anomalies?probe_id=1&metric=temp_c",
+    ):
+        rec.run(f"GET {url.split('?')[0]}", lambda: client.get(url))
+
+
+# ---------- plans ----------
+
+def explain(conn: sqlite3.Connection, sql: str) -> Tuple[List[str], List[str]]:
+    details = [r[3] for r in conn.execute("EXPLAIN QUERY PLAN " + sql).fetchall()]
+    flags = []
+    for d in details:
+        if any(re.match(rf"SCAN {t}\b", d) for t in BIG_TABLES):
+            flags.append("scan")
+        if "TEMP B-TREE FOR RIGHT PART" in d:
+            flags.append("tie sort")  # only rows equal on the leading ORDER BY terms are sorted
+        elif "TEMP B-TREE" in d:
+            flags.append("temp b-tree")
+        if (any(d.startswith(f"SEARCH {t} USING INDEX") for t in BIG_TABLES)
+                and "COVERING" not in d):
+            flags.append("lookups")
+    return details, sorted(set(flags))
+
+
+def median_ms(conn: sqlite3.Connection, sql: str, budget: float = 0.5) -> float:
+    times: List[float] = []
+    deadline = time.perf_counter() + budget
+    write = not sql.lstrip().upper().startswith("SELECT")
+    while len(times) < 3 or (len(times) < 25 and time.perf_counter() < deadline):
+        if write:
+            conn.execute("BEGIN")
+        t0 = time.perf_counter()
+        conn.execute(sql).fetchall()
+        times.append(time.perf_counter() - t0)
+        if write:
+            conn.execute("ROLLBACK")
+    return statistics.median(times) * 1000.0
+
+
+def review(path: Path, db: PlantDBWrapper, probes: int) -> Dict[str, Dict[str, Any]]:
+    rec = Recorder(db)
+    exercise(db, rec, probes)
+    conn = sqlite3.connect(str(path), isolation_level=None)
+    out: Dict[str, Dict[str, Any]] = {}
+    for shape, (label, sql) in rec.statements.items():
+        details, flags = explain(conn, sql)
+        out[shape] = {"label": label, "plan": details, "flags": flags, "ms": median_ms(conn, sql)}
+    conn.close()
+    return out
+
+
+def index_summary(path: Path) -> List[str]:
+    conn = sqlite3.connect(str(path))
+    rows = conn.execute(
+        "SELECT tbl_name, name FROM sqlite_master WHERE type = 'index' AND tbl_name IN (?, ?) ORDER BY tbl_name, name",
+        BIG_TABLES,
+    ).fetchall()
+    conn.close()
+    return [f"{t}.{n}" for t, n in rows]
+
+
+def trigger_rewrites(path: Path) -> List[Tuple[str, str, str]]:
+    """(index, column, trigger) for indexed columns an AFTER INSERT trigger updates on the same row."""
+    conn = sqlite3.connect(str(path))
+    triggers = conn.execute(
+        "SELECT name, tbl_name, sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name IN (?, ?)",
+        BIG_TABLES,
+    ).fetchall()
+    out = []
+    for index, table in conn.execute(
+        "SELECT name, tbl_name FROM sqlite_master WHERE type = 'index' AND tbl_name IN (?, ?) ORDER BY name",
+        BIG_TABLES,
+    ).fetchall():
+        columns = [r[2] for r in conn.execute(f"PRAGMA index_info({index})").fetchall() if r[2]]
+        for name, tbl, sql in triggers:
+            if tbl != table or not re.search(rf"AFTER\s+INSERT.*UPDATE\s+{table}\s+SET", sql, re.I | re.S):
+                continue
+            for col in columns:
+                if re.search(rf"\bSET\b.*\b{col}\s*=", sql, re.I | re.S):
+                    out.append((index, col, name))
+    conn.close()
+    return out
+
+
+# ---------- report ----------
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="EXPLAIN QUERY PLAN + latency review of every DB read")
+    ap.add_argument("--rows", type=int, default=200000, help="synthetic readings to load")
+    ap.add_argument("--probes", type=int, default=8)
+    ap.add_argument("--interval", type=int, default=10, help="seconds between a probe's readings")
+    ap.add_argument("--compare", type=int, default=None, metavar="N",
+                    help="also build with migrations <= N only and print both")
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+
+    variants: List[Tuple[str, Optional[int]]] = [("all", None)]
+    if args.compare is not None:
+        variants.insert(0, (f"<={args.compare:03d}", args.compare))
+
+    with tempfile.TemporaryDirectory() as tmp_str:
+        tmp = Path(tmp_str)
+        results = []
+        for name, upto in variants:
+            path = tmp / f"review_{name.strip('<=')}.db"
+            db, stats = build(path, schema_dir(tmp, upto), args.rows, args.probes, args.interval, args.seed)
+            plans = review(path, db, args.probes)
+            stats["size_mb"] = path.stat().st_size / 1e6
+            results.append((name, stats, plans, index_summary(path), trigger_rewrites(path)))
+            db.close()
+
+    for name, stats, plans, indexes, rewrites in results:
+        print(f"[{name}] bulk insert {stats['bulk_rows_s']:,.0f} rows/s | "
+              f"50-row batches {stats['batch50_rows_s']:,.0f} rows/s | {stats['size_mb']:.1f} MB")
+        print(f"  indexes: {', '.join(indexes)}")
+        for index, col, trigger in rewrites:
+            covered = [f"{e['label']} {e['ms']:.1f} ms" for shape, e in plans.items()
+                       if re.search(rf"\b{col}\b", shape)
+                       and any(f"COVERING INDEX {index} " in d for d in e["plan"])]
+            print(f"  {index}.{col}: rewritten by trigger {trigger} (2 index writes per insert); "
+                  f"covers {', '.join(covered) or 'no reads'}")
+    print()
+
+    shapes = list(dict.fromkeys(s for _, _, plans, _, _ in results for s in plans))
+    for shape in shapes:
+        entries = [(name, plans.get(shape)) for name, _, plans, _, _ in results]
+        label = next(e["label"] for _, e in entries if e)
+        print(f"{label}")
+        print(f"  {shape[:160]}")
+        for name, e in entries:
+            if e is None:
+                print(f"  [{name}] (not run)")
+                continue
+            flags = f"  !! {', '.join(e['flags'])}" if e["flags"] else ""
+            print(f"  [{name}] {e['ms']:8.3f} ms{flags}")
+            for d in e["plan"]:
+                print(f"      {d}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
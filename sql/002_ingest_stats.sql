@@ -0,0 +1,17 @@
+-- 002: per-probe ingest counters written by the processing stages
+--      (e.g. decimate.kept / decimate.dropped). Values are running totals.
+
+CREATE TABLE IF NOT EXISTS probe_ingest_stats (
+  probe_id    INTEGER NOT NULL
+                REFERENCES probes(id) ON DELETE CASCADE ON UPDATE RESTRICT,
+  stage       TEXT NOT NULL,               -- processing stage name, e.g. 'decimate'
+  counter     TEXT NOT NULL,               -- e.g. 'kept', 'dropped'
+  value       INTEGER NOT NULL DEFAULT 0 CHECK (value >= 0),
+  updated_at  TEXT NOT NULL
+                DEFAULT (strftime('%Y-%m-%d %H:%M:%S','now'))
+                CHECK (
+                  updated_at = strftime('%Y-%m-%d %H:%M:%S', updated_at)
+                  AND datetime(updated_at) IS NOT NULL
+                ),
+  PRIMARY KEY (probe_id, stage, counter)
+) STRICT;
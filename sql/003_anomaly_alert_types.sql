@@ -0,0 +1,45 @@
+-- 003: allow anomaly alert types in probe_alerts ('spike', 'stuck_sensor',
+--      'moisture_drop'). SQLite cannot alter a CHECK constraint, so the table
+--      is rebuilt online: create the new table, copy rows in id chunks, then
+--      catch up and swap in one short transaction. Ids are preserved.
+
+-- @step sync
+CREATE TABLE IF NOT EXISTS probe_alerts_v3 (
+    id INTEGER PRIMARY KEY,                             -- Unique ID for the alert
+    probe_id INTEGER NOT NULL,                          -- Link to the probe
+    type TEXT NOT NULL CHECK (type IN ('too_dry', 'too_wet', 'lux_out_of_range', 'temp_out_of_range', 'rh_out_of_range', 'lux_avg_out_of_range', 'moisture_avg_out_of_range', 'spike', 'stuck_sensor', 'moisture_drop')),
+    timestamp TEXT NOT NULL
+                DEFAULT (strftime('%Y-%m-%d %H:%M:%S','now'))
+                CHECK (
+                  timestamp = strftime('%Y-%m-%d %H:%M:%S', timestamp)
+                  AND datetime(timestamp) IS NOT NULL
+                ),
+    message TEXT NOT NULL,                              -- Description of the alert
+    created_at TEXT NOT NULL
+                DEFAULT (strftime('%Y-%m-%d %H:%M:%S','now'))
+                CHECK (
+                  created_at = strftime('%Y-%m-%d %H:%M:%S', created_at)
+                  AND datetime(created_at) IS NOT NULL
+                ),
+    updated_at TEXT NOT NULL
+                DEFAULT (strftime('%Y-%m-%d %H:%M:%S','now'))
+                CHECK (
+                  updated_at = strftime('%Y-%m-%d %H:%M:%S', updated_at)
+                  AND datetime(updated_at) IS NOT NULL
+                ),
+    FOREIGN KEY(probe_id) REFERENCES probes(id) ON DELETE CASCADE  -- Foreign key to probe table
+) STRICT;
+
+-- @step chunked probe_alerts 5000
+INSERT OR IGNORE INTO probe_alerts_v3 (id, probe_id, type, timestamp, message, created_at, updated_at)
+SELECT id, probe_id, type, timestamp, message, created_at, updated_at
+FROM probe_alerts
+WHERE id > :lo AND id <= :hi;
+
+-- @step background
+INSERT OR IGNORE INTO probe_alerts_v3 (id, probe_id, type, timestamp, message, created_at, updated_at)
+SELECT id, probe_id, type, timestamp, message, created_at, updated_at
+FROM probe_alerts
+WHERE id > (SELECT COALESCE(MAX(id), 0) FROM probe_alerts_v3);
+DROP TABLE probe_alerts;
+ALTER TABLE probe_alerts_v3 RENAME TO probe_alerts;
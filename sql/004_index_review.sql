@@ -0,0 +1,31 @@
+-- 004: index set for the hot read shapes (see scripts/index_review.py).
+--
+-- * /api/series, /api/anomalies and per-probe history read one metric for one
+--   probe over a ts range, ordered by (ts, id). A covering index answers them
+--   from the index alone instead of one table lookup per row. id is listed
+--   right after ts even though every index carries the rowid: the implicit
+--   rowid comes after the metric columns, so the (ts, id) order would need a
+--   sort of every group of rows sharing a ts.
+-- * moisture_pct is set by update_moisture_pct_after_insert, so each insert
+--   writes its index entry twice. It stays covered because it is the
+--   dashboard's main series; scripts/index_review.py prints that trade-off.
+-- * idx_readings_probe_ts is a prefix of both ux_readings_probe_ts_seq and the
+--   covering index, so it only adds write cost; it is dropped once the
+--   covering index exists.
+-- * probe_alerts is read newest first, per probe or across all probes; both
+--   indexes end in the implicit rowid, so ORDER BY timestamp DESC, id DESC
+--   needs no sort.
+--
+-- The readings index is built by the background migrator (ingest keeps
+-- running; writes that hit the build lock go to the spool).
+
+-- @step sync
+CREATE INDEX IF NOT EXISTS idx_probe_alerts_probe_ts ON probe_alerts(probe_id, timestamp);
+CREATE INDEX IF NOT EXISTS idx_probe_alerts_ts       ON probe_alerts(timestamp);
+
+-- @step background
+CREATE INDEX IF NOT EXISTS idx_readings_probe_ts_cover
+  ON readings(probe_id, ts, id, moisture_pct, lux, rh, temp_c);
+
+-- @step background
+DROP INDEX IF EXISTS idx_readings_probe_ts;
@@ -0,0 +1,49 @@
+-- 005: multi-site aggregation. Edge nodes ship batches of new rows (see
+--      plantpipe/sync); a central node merges them under its own ids.
+--
+-- sync_sites            one row per edge site; node_id changes when the edge
+--                       database is recreated (its ids restart)
+-- sync_probe_map        (site, edge probe id) -> central probes.id
+-- sync_calibration_map  (site, edge calibration id) -> central probe_calibrations.id
+-- sync_watermarks       highest edge id merged per site and source table; rows at
+--                       or below it are skipped, so a re-shipped batch is a no-op
+
+CREATE TABLE IF NOT EXISTS sync_sites (
+  id              INTEGER PRIMARY KEY,
+  name            TEXT NOT NULL UNIQUE,
+  node_id         TEXT,
+  batches         INTEGER NOT NULL DEFAULT 0 CHECK (batches >= 0),
+  last_merged_at  TEXT,
+  created_at      TEXT NOT NULL
+                    DEFAULT (strftime('%Y-%m-%d %H:%M:%S','now'))
+                    CHECK (
+                      created_at = strftime('%Y-%m-%d %H:%M:%S', created_at)
+                      AND datetime(created_at) IS NOT NULL
+                    )
+) STRICT;
+
+CREATE TABLE IF NOT EXISTS sync_probe_map (
+  site_id          INTEGER NOT NULL
+                     REFERENCES sync_sites(id) ON DELETE CASCADE ON UPDATE RESTRICT,
+  remote_probe_id  INTEGER NOT NULL,
+  probe_id         INTEGER NOT NULL
+                     REFERENCES probes(id) ON DELETE CASCADE ON UPDATE RESTRICT,
+  PRIMARY KEY (site_id, remote_probe_id)
+) STRICT;
+
+CREATE TABLE IF NOT EXISTS sync_calibration_map (
+  site_id                INTEGER NOT NULL
+                           REFERENCES sync_sites(id) ON DELETE CASCADE ON UPDATE RESTRICT,
+  remote_calibration_id  INTEGER NOT NULL,
+  calibration_id         INTEGER NOT NULL
+                           REFERENCES probe_calibrations(id) ON DELETE CASCADE ON UPDATE RESTRICT,
+  PRIMARY KEY (site_id, remote_calibration_id)
+) STRICT;
+
+CREATE TABLE IF NOT EXISTS sync_watermarks (
+  site_id  INTEGER NOT NULL
+             REFERENCES sync_sites(id) ON DELETE CASCADE ON UPDATE RESTRICT,
+  source   TEXT NOT NULL,               -- readings | probe_alerts | probe_calibrations
+  last_id  INTEGER NOT NULL DEFAULT 0 CHECK (last_id >= 0),
+  PRIMARY KEY (site_id, source)
+) STRICT;
@@ -0,0 +1,28 @@
+-- 006: log of probe_calibrations updates for change-data capture (output/cdc.py).
+--      Calibration rows are inserted once and afterwards only switch `active`;
+--      those updates are not visible through the id cursor, so a trigger logs
+--      them here in commit order. after_calibration_id is the newest calibration
+--      id when the update ran, which places the update among the inserts.
+
+CREATE TABLE IF NOT EXISTS probe_calibration_changes (
+  id                    INTEGER PRIMARY KEY,
+  calibration_id        INTEGER NOT NULL,
+  probe_id              INTEGER NOT NULL,
+  active                INTEGER NOT NULL CHECK (active IN (0,1)),
+  after_calibration_id  INTEGER NOT NULL,
+  changed_at            TEXT NOT NULL
+                          DEFAULT (strftime('%Y-%m-%d %H:%M:%S','now'))
+                          CHECK (
+                            changed_at = strftime('%Y-%m-%d %H:%M:%S', changed_at)
+                            AND datetime(changed_at) IS NOT NULL
+                          )
+) STRICT;
+
+CREATE TRIGGER IF NOT EXISTS log_probe_calibration_active
+AFTER UPDATE OF active ON probe_calibrations
+FOR EACH ROW
+WHEN OLD.active IS NOT NEW.active
+BEGIN
+    INSERT INTO probe_calibration_changes (calibration_id, probe_id, active, after_calibration_id)
+    VALUES (NEW.id, NEW.probe_id, NEW.active, (SELECT MAX(id) FROM probe_calibrations));
+END;
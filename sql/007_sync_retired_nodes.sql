@@ -0,0 +1,17 @@
+-- 007: node ids an edge site has left behind. When a site's database is
+--      recreated the new node starts over from batch 1 and the old node id is
+--      recorded here, so batches of the old node still in transit are
+--      rejected instead of resetting the site again.
+
+CREATE TABLE IF NOT EXISTS sync_retired_nodes (
+  site_id     INTEGER NOT NULL
+                REFERENCES sync_sites(id) ON DELETE CASCADE ON UPDATE RESTRICT,
+  node_id     TEXT NOT NULL,
+  retired_at  TEXT NOT NULL
+                DEFAULT (strftime('%Y-%m-%d %H:%M:%S','now'))
+                CHECK (
+                  retired_at = strftime('%Y-%m-%d %H:%M:%S', retired_at)
+                  AND datetime(retired_at) IS NOT NULL
+                ),
+  PRIMARY KEY (site_id, node_id)
+) STRICT;
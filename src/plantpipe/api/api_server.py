@@ -1,20 +1,76 @@
 from __future__ import annotations
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from typing import Literal, Optional
+from starlette.concurrency import run_in_threadpool
+from typing import Any, Dict, Literal, Optional
+import argparse
+import array
+import struct
+import sys
+import os
 import threading
 import uvicorn
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
+import base64
+import hmac
 import re
+from plantpipe.config import CONFIG_ENV, load_config
+from plantpipe.processing.sequence import packet_loss
 from plantpipe.storage.database import PlantDBWrapper
+from plantpipe.storage.latest_index import ProbeLatestIndex
+from plantpipe.sync.batch import decode_batch, parse_name, store_batch
 
 Metric = Literal["moisture_pct", "lux", "rh", "temp_c"]
+SeriesFormat = Literal["json", "columnar", "binary"]
 TS_RE = re.compile(r"^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}$")
+CURSOR_VERSION = "r1"
+
+
+def encode_cursor(reading_id: int) -> str:
+    """Opaque delta cursor: clients must echo it back verbatim, never parse it."""
+    raw = f"{CURSOR_VERSION}:{int(reading_id)}".encode("ascii")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        version, _, value = base64.urlsafe_b64decode(padded.encode("ascii")).decode("ascii").partition(":")
+        reading_id = int(value)
+    except (ValueError, UnicodeError):
+        raise ValueError(f"Malformed cursor: {cursor!r}") from None
+    if version != CURSOR_VERSION or reading_id < 0:
+        raise ValueError(f"Unsupported cursor: {cursor!r}")
+    return reading_id
+
+
+def pack_series(points) -> bytes:
+    """
+    Little-endian packed series for typed-array parsing in the browser:
+    uint32 n, uint32 0 (padding), float64[n] epoch milliseconds, float32[n] values.
+    """
+    t = array.array("d", (float(p[0]) * 1000.0 for p in points))
+    v = array.array("f", (float(p[1]) for p in points))
+    if sys.byteorder != "little":
+        t.byteswap()
+        v.byteswap()
+    return struct.pack("<II", len(t), 0) + t.tobytes() + v.tobytes()
+
 
 class PlantAPI:
-    def __init__(self, db: PlantDBWrapper, frontend: str, host: str = "127.0.0.1", port: int = 8000):
+    def __init__(
+        self,
+        db: PlantDBWrapper,
+        frontend: str,
+        host: str = "127.0.0.1",
+        port: int = 8000,
+        overview_window_hours: int = 24,
+        overview_bucket_seconds: int = 300,
+        sync_inbox: Optional[str] = None,
+        sync_token: str = "",
+    ):
         self.db = db
         self.frontend = Path(frontend).expanduser().resolve()
         if not self.frontend.exists():
@@ -22,6 +78,14 @@ class PlantAPI:
 
         self.host = host
         self.port = port
+        # central node: edge batches are accepted into this directory and merged by the runner
+        self.sync_inbox = Path(sync_inbox) if sync_inbox else None
+        self.sync_token = sync_token
+        if self.sync_inbox is not None:
+            self.sync_inbox.mkdir(parents=True, exist_ok=True)
+        self.latest = ProbeLatestIndex(
+            db, window_hours=overview_window_hours, bucket_seconds=overview_bucket_seconds
+        )
         self.app = self._build_app()
         self._server: Optional[uvicorn.Server] = None
         self._thread: Optional[threading.Thread] = None
@@ -76,17 +140,63 @@ class PlantAPI:
                 "ok": self.db.health_check(),
                 "rows": self.db.row_count(),
                 "latest_ts": self.db.latest_timestamp(),
+                "schema": self.db.migration_status(),
             }
 
         @app.get("/api/probes")
         def list_probes():
-            if not self._table_exists("probes"):
-                return []
-            cur = self.db.connection().execute(
-                "SELECT id, label FROM probes WHERE is_active = 1 ORDER BY id"
-            )
-            rows = cur.fetchall()
-            return [{"id": r["id"], "label": r["label"]} for r in rows]
+            return self.db.get_active_probes()
+
+        @app.get("/api/overview")
+        def overview():
+            """Every probe's latest reading plus min/max over the overview window, in one call."""
+            return {
+                "window_hours": self.latest.window_seconds // 3600,
+                "probes": self.latest.overview(),
+            }
+
+        @app.get("/api/ingest/stats")
+        def ingest_stats(probe_id: Optional[int] = Query(None, ge=1)):
+            """Per-probe ingest counters by stage, plus packet loss from the sequence tracker."""
+            probes: Dict[int, Dict[str, Any]] = {}
+            for r in self.db.get_ingest_stats(probe_id):
+                p = probes.setdefault(r["probe_id"], {"probe_id": r["probe_id"], "stages": {}})
+                p["stages"].setdefault(r["stage"], {})[r["counter"]] = r["value"]
+            for p in probes.values():
+                p["loss"] = packet_loss(p["stages"].get("sequence", {}))
+            return {"probes": list(probes.values())}
+
+        @app.get("/api/alerts")
+        def alerts(
+            probe_id: Optional[int] = Query(None, ge=1),
+            since_hours: int = Query(24 * 7, ge=1, le=24 * 365),
+            type: Optional[str] = Query(None, description="comma-separated alert types"),
+            limit: int = Query(100, ge=1, le=1000),
+        ):
+            """Stored alerts (threshold and anomaly), newest first."""
+            since = (datetime.utcnow() - timedelta(hours=since_hours)).strftime("%Y-%m-%d %H:%M:%S")
+            types = [t.strip() for t in type.split(",") if t.strip()] if type else []
+            return {"alerts": self.db.get_alerts(probe_id, since, types, limit)}
+
+        @app.get("/api/anomalies")
+        def anomalies(
+            probe_id: int = Query(..., ge=1),
+            metric: Metric = Query(...),
+            since_hours: int = Query(24, ge=1, le=24 * 14),
+            window: int = Query(60, ge=5, le=5000),
+            z: float = Query(6.0, gt=0),
+        ):
+            """Score a stored range on demand (NumPy batch path); read-only, nothing is stored."""
+            from plantpipe.processing.anomaly import score_history
+
+            since = (datetime.utcnow() - timedelta(hours=since_hours)).strftime("%Y-%m-%d %H:%M:%S")
+            rows = self.db.get_metric_history(probe_id, metric, since)
+            try:
+                findings = score_history([r[0] for r in rows], [r[1] for r in rows], metric,
+                                         window=window, z_threshold=z)
+            except RuntimeError as e:
+                raise HTTPException(501, str(e))
+            return {"probe_id": probe_id, "metric": metric, "samples": len(rows), "anomalies": findings}
 
         @app.get("/api/series")
         def series(
@@ -95,34 +205,146 @@ class PlantAPI:
             since_hours: int = Query(24, ge=1, le=24*14),
             limit: int = Query(5000, ge=1, le=20000),
             after_ts: Optional[str] = Query(None, description="return rows with ts > after_ts"),
+            bucket_seconds: int = Query(0, ge=0, le=86400, description="average into buckets of this size (0 = raw rows)"),
+            format: SeriesFormat = Query("json", description="json: [{ts, value}]; columnar: {t: [...], v: [...]}; binary: packed arrays"),
         ):
             if metric not in {"moisture_pct", "lux", "rh", "temp_c"}:
                 raise HTTPException(400, f"Unsupported metric: {metric}")
 
-            if not self._table_exists("readings"):
-                return {"series": []}
+            if after_ts is not None and not TS_RE.match(after_ts):
+                raise HTTPException(400, "after_ts must be 'YYYY-MM-DD HH:MM:SS'")
+            since = (datetime.utcnow() - timedelta(hours=since_hours)).strftime("%Y-%m-%d %H:%M:%S")
+            points = self.db.get_series(probe_id, metric, since, after_ts=after_ts, limit=limit,
+                                        bucket_seconds=bucket_seconds)
 
-            if after_ts is not None:
-                if not TS_RE.match(after_ts):
-                    raise HTTPException(400, "after_ts must be 'YYYY-MM-DD HH:MM:SS'")
-                cond_ts = after_ts
-                cmp_op = ">"
-            else:
-                cond_ts = (datetime.utcnow() - timedelta(hours=since_hours)).strftime("%Y-%m-%d %H:%M:%S")
-                cmp_op = ">="
-
-            sql = f"""
-                SELECT ts, {metric} as v
-                FROM readings
-                WHERE probe_id = ? AND ts {cmp_op} ? AND {metric} IS NOT NULL
-                ORDER BY ts ASC, id ASC
-                LIMIT ?
-            """
-            cur = self.db.connection().execute(sql, (probe_id, cond_ts, limit))
-            data = [{"ts": r["ts"], "value": r["v"]} for r in cur.fetchall()]
+            if format == "binary":
+                return Response(content=pack_series(points), media_type="application/octet-stream")
+            if format == "columnar":
+                return {
+                    "probe_id": probe_id,
+                    "metric": metric,
+                    "bucket_seconds": bucket_seconds,
+                    "t": [p[0] for p in points],
+                    "v": [p[1] for p in points],
+                }
+            data = [{"ts": datetime.fromtimestamp(t, timezone.utc).strftime("%Y-%m-%d %H:%M:%S"), "value": v} for t, v in points]
             return {"probe_id": probe_id, "metric": metric, "series": data}
 
+        @app.get("/api/delta")
+        def delta(
+            cursor: Optional[str] = Query(None, description="opaque cursor from a previous /api/delta response"),
+            probe_id: Optional[int] = Query(None, ge=1),
+            limit: int = Query(1000, ge=1, le=20000),
+            from_latest: bool = Query(False, description="without a cursor, start at the newest row instead of the oldest"),
+        ):
+            """
+            Rows committed after `cursor`, across all probes and metrics, in commit order.
+            Poll with the returned cursor; `has_more` means another page is ready now.
+            """
+            if cursor is not None:
+                try:
+                    after_id = decode_cursor(cursor)
+                except ValueError as e:
+                    raise HTTPException(400, str(e))
+            elif from_latest:
+                after_id = self.db.max_reading_id()
+            else:
+                after_id = 0
+
+            conn = self.db.connection()
+            conn.execute("BEGIN")  # rows and MAX(id) from one snapshot
+            try:
+                rows = self.db.get_readings_after_id(after_id, limit + 1, probe_id=probe_id)
+                has_more = len(rows) > limit
+                rows = rows[:limit]
+                next_id = rows[-1]["id"] if rows else after_id
+                if not has_more:
+                    # caught up: skip past other probes' rows too, so an idle probe's
+                    # poll does not rescan everything committed since its last row
+                    next_id = max(next_id, self.db.max_reading_id())
+            finally:
+                conn.execute("COMMIT")
+            return {"cursor": encode_cursor(next_id), "has_more": has_more, "rows": rows}
+
+        @app.get("/api/sync/sites")
+        def sync_sites():
+            """Edge sites merged into this database (central node), with watermarks."""
+            return {"sites": self.db.get_sync_sites()}
+
+        if self.sync_inbox is not None:
+            inbox = self.sync_inbox
+
+            @app.post("/api/sync/batches", status_code=202)
+            async def sync_upload(request: Request, name: str = Query(..., description="batch file name")):
+                """
+                Accept one edge batch into the sync inbox. Nothing is written to the
+                database here (workers may be read-only); the runner's merger applies it.
+                """
+                if self.sync_token and not hmac.compare_digest(
+                    request.headers.get("authorization", ""), f"Bearer {self.sync_token}"
+                ):
+                    raise HTTPException(401, "Invalid sync token")
+                data = await request.body()
+                try:
+                    site, batch = parse_name(name)
+                    header, _ = await run_in_threadpool(decode_batch, data)
+                except ValueError as e:
+                    raise HTTPException(400, str(e))
+                if header["site"] != site or header["batch"] != batch:
+                    raise HTTPException(400, "Batch name does not match its header")
+                await run_in_threadpool(store_batch, inbox, name, data)
+                return {"accepted": name}
+
         return app
 
-    def _table_exists(self, name: str) -> bool:
-        return self.db.table_exists(name)
+
+# ---------- standalone (multi-worker) serving ----------
+
+def create_app() -> FastAPI:
+    """
+    uvicorn app factory for worker processes.
+
+    Each worker resolves the pipeline config (PLANTPIPE_CONFIG + env) and opens
+    the database read-only, so API load never takes the ingest process's GIL
+    or a write lock on the WAL database.
+    """
+    cfg = load_config()
+    db = PlantDBWrapper(cfg.database.path, cfg.database.schema, read_only=True)
+    api = PlantAPI(
+        db=db,
+        frontend=cfg.api.frontend,
+        host=cfg.api.host,
+        port=cfg.api.port,
+        overview_window_hours=cfg.api.overview_window_hours,
+        overview_bucket_seconds=cfg.api.overview_bucket_seconds,
+        sync_inbox=cfg.sync.inbox if cfg.stages.sync_merge else None,
+        sync_token=cfg.sync.token,
+    )
+    return api.app
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description="Serve the plant API as a read-only worker group")
+    ap.add_argument("--config", default=None, help="JSON config file (default: $PLANTPIPE_CONFIG)")
+    ap.add_argument("--workers", type=int, default=None, help="Worker processes (default: api.workers)")
+    return ap.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.config:
+        os.environ[CONFIG_ENV] = args.config  # inherited by the worker processes
+    cfg = load_config()
+    workers = max(1, args.workers if args.workers is not None else cfg.api.workers)
+    uvicorn.run(
+        "plantpipe.api.api_server:create_app",
+        factory=True,
+        host=cfg.api.host,
+        port=cfg.api.port,
+        workers=workers,
+        log_level="info",
+    )
+
+
+if __name__ == "__main__":
+    main()
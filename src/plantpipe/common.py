@@ -0,0 +1,24 @@
+# src/plantpipe/common.py
+
+"""Small helpers shared by several packages."""
+
+import json
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict
+
+
+def epoch(ts: str) -> float:
+    """Epoch seconds of a stored 'YYYY-MM-DD HH:MM:SS' (UTC) timestamp."""
+    return datetime.fromisoformat(ts).replace(tzinfo=timezone.utc).timestamp()
+
+
+def write_json_atomic(path: Path, data: Dict[str, Any]) -> None:
+    """Write *data* as JSON to *path* via a fsynced temp file and rename."""
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
@@ -0,0 +1,266 @@
+"""
+Typed runtime configuration for plantpipe.
+
+Values are resolved in three layers (later wins):
+
+1. the dataclass defaults below
+2. an optional JSON file whose top-level keys mirror the sections, e.g.
+   {"probes": {"ports": ["/dev/ttyUSB0", "/dev/ttyUSB1"]}, "batch": {"size": 200}}
+3. environment variables named PLANTPIPE_<SECTION>_<FIELD>, e.g.
+   PLANTPIPE_PROBES_PORTS=/dev/pts/3,/dev/pts/5 or PLANTPIPE_STAGES_API=0
+
+The config file path can be passed explicitly or via PLANTPIPE_CONFIG.
+"""
+
+import json
+import os
+from dataclasses import asdict, dataclass, field, fields, is_dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Optional, get_args, get_origin, get_type_hints
+
+ENV_PREFIX = "PLANTPIPE_"
+CONFIG_ENV = ENV_PREFIX + "CONFIG"
+
+
+@dataclass
+class DatabaseConfig:
+    path: str = "data/plant.db"
+    schema: str = "sql/001_init.sql"
+
+
+@dataclass
+class ProbesConfig:
+    ports: List[str] = field(default_factory=lambda: ["/dev/ttyUSB0"])
+    baud: int = 115200
+    timeout: float = 2.5  # serial read timeout (s); also bounds shutdown latency
+
+
+@dataclass
+class BatchConfig:
+    size: int = 50           # max readings per INSERT transaction
+    max_delay: float = 1.0   # max seconds a reading waits before a partial batch is flushed
+    queue_size: int = 10000  # readers -> writer hand-off bound
+    stats_interval: float = 10.0  # seconds between ingest-counter writes (probe_ingest_stats)
+
+
+@dataclass
+class SpoolConfig:
+    directory: str = "data/spool"
+    write_ahead: bool = False      # False: spool only when a DB write fails; True: every batch goes through the spool
+    segment_bytes: int = 16 * 1024 * 1024
+    fsync_interval: float = 0.2    # group commit: at most one fsync per interval
+    drain_batch: int = 5000        # readings replayed per transaction
+    retry_interval: float = 1.0    # first backoff after a transient DB error (doubles up to max)
+    max_retry_interval: float = 30.0
+
+
+@dataclass
+class CacheConfig:
+    calibrations: int = 1024  # per-probe calibration/envelope entries kept in memory
+    calibration_check: float = 5.0  # seconds between checks for recalibrated probes (0 = every reading)
+
+
+@dataclass
+class RetentionConfig:
+    days: int = 0             # 0 keeps readings forever
+    interval: float = 3600.0  # seconds between purge passes
+    chunk_size: int = 5000    # rows deleted per transaction
+
+
+@dataclass
+class ApiConfig:
+    host: str = "127.0.0.1"
+    port: int = 8000
+    frontend: str = "./frontend"
+    mode: str = "thread"  # "thread": in the ingest process; "process": supervised read-only worker group
+    workers: int = 1      # uvicorn worker processes in "process" mode
+    overview_window_hours: int = 24     # /api/overview min/max window
+    overview_bucket_seconds: int = 300  # window granularity (memory vs. edge precision)
+
+
+@dataclass
+class CdcConfig:
+    directory: str = "data/cdc"
+    segment_bytes: int = 64 * 1024 * 1024  # rotate segments at this size
+    batch_size: int = 1000                 # rows per table per read
+    poll_interval: float = 1.0
+    keep_segments: int = 0                 # 0 keeps every segment
+
+
+@dataclass
+class SyncConfig:
+    site: str = ""                      # edge: this node's site name (default: hostname)
+    outbox: str = "data/sync/outbox"    # edge: batches are cut here (file transport: the central inbox)
+    url: str = ""                       # edge: central /api/sync/batches URL; empty = file transport
+    token: str = ""                     # shared secret for /api/sync/batches (empty: no auth)
+    inbox: str = "data/sync/inbox"      # central: batches waiting to be merged
+    batch_rows: int = 5000              # max rows per table per batch
+    poll_interval: float = 10.0
+
+
+@dataclass
+class SequenceConfig:
+    window: int = 64       # max out-of-order readings held per probe (also the late/reset boundary)
+    max_wait: float = 5.0  # seconds a held reading waits for a missing predecessor
+
+
+@dataclass
+class AnomalyConfig:
+    z_threshold: float = 6.0      # spike when |x - EWMA| exceeds this many EWM standard deviations
+    alpha: float = 0.05           # EWMA smoothing (~1/alpha readings of memory)
+    warmup: int = 30              # readings per probe/metric before spikes are scored
+    stuck_samples: int = 900      # identical consecutive readings that count as a stuck sensor
+    stuck_metrics: List[str] = field(default_factory=lambda: ["moisture_raw"])
+    drop_pct: float = 10.0        # moisture_pct points below the recent max that raise moisture_drop
+    drop_window_seconds: float = 1800.0
+    cooldown_seconds: float = 3600.0  # min gap between alerts of one type per probe/metric
+
+
+@dataclass
+class DecimationConfig:
+    # deadband per metric: a reading is stored once any metric moves more than
+    # this from its last stored value (0 stores every change)
+    lux: float = 50.0
+    rh: float = 1.0
+    temp_c: float = 0.2
+    moisture_raw: float = 3.0
+    heartbeat_seconds: float = 300.0  # store at least one reading per probe this often
+
+
+@dataclass
+class StagesConfig:
+    api: bool = True
+    spool: bool = True
+    retention: bool = True
+    cdc: bool = False
+    sequence: bool = True
+    anomaly: bool = False
+    decimate: bool = False
+    sync_ship: bool = False   # edge: ship new rows to a central node
+    sync_merge: bool = False  # central: merge edge batches from sync.inbox (+ POST /api/sync/batches)
+
+
+@dataclass
+class CalibrationConfig:
+    raw_dry: int = 500
+    raw_wet: int = 150
+    lux_min: float = 0.0
+    lux_max: float = 300000.0
+    rh_min: float = 0.0
+    rh_max: float = 100.0
+    temp_min: float = -40.0
+    temp_max: float = 85.0
+    notes: str = "Hardcoded default calibration values for testing."
+
+
+@dataclass
+class PipelineConfig:
+    database: DatabaseConfig = field(default_factory=DatabaseConfig)
+    probes: ProbesConfig = field(default_factory=ProbesConfig)
+    batch: BatchConfig = field(default_factory=BatchConfig)
+    spool: SpoolConfig = field(default_factory=SpoolConfig)
+    cache: CacheConfig = field(default_factory=CacheConfig)
+    retention: RetentionConfig = field(default_factory=RetentionConfig)
+    api: ApiConfig = field(default_factory=ApiConfig)
+    cdc: CdcConfig = field(default_factory=CdcConfig)
+    sync: SyncConfig = field(default_factory=SyncConfig)
+    sequence: SequenceConfig = field(default_factory=SequenceConfig)
+    anomaly: AnomalyConfig = field(default_factory=AnomalyConfig)
+    decimation: DecimationConfig = field(default_factory=DecimationConfig)
+    stages: StagesConfig = field(default_factory=StagesConfig)
+    calibration: CalibrationConfig = field(default_factory=CalibrationConfig)
+    run_seconds: float = 0.0  # non-zero stops the runner after this many seconds
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+# ------------------- loading -------------------
+
+def load_config(path: Optional[str] = None, env: Optional[Mapping[str, str]] = None) -> PipelineConfig:
+    """Build a PipelineConfig from defaults, an optional JSON file and the environment."""
+    env = os.environ if env is None else env
+    cfg = PipelineConfig()
+
+    path = path or env.get(CONFIG_ENV)
+    if path:
+        cfg_path = Path(path)
+        if not cfg_path.exists():
+            raise FileNotFoundError(f"Config file not found: {cfg_path}")
+        data = json.loads(cfg_path.read_text(encoding="utf-8"))
+        if not isinstance(data, dict):
+            raise ValueError(f"Config file {cfg_path} must contain a JSON object")
+        _apply_mapping(cfg, data, where=str(cfg_path))
+
+    _apply_env(cfg, env)
+    return cfg
+
+
+def _apply_mapping(target: Any, data: Mapping[str, Any], where: str) -> None:
+    hints = get_type_hints(type(target))
+    known = {f.name for f in fields(target)}
+    for key, value in data.items():
+        if key not in known:
+            raise ValueError(f"Unknown config key {where}.{key}")
+        current = getattr(target, key)
+        if is_dataclass(current):
+            if not isinstance(value, Mapping):
+                raise ValueError(f"Config section {where}.{key} must be an object")
+            _apply_mapping(current, value, where=f"{where}.{key}")
+        else:
+            setattr(target, key, _coerce(value, hints[key], f"{where}.{key}"))
+
+
+def _apply_env(cfg: PipelineConfig, env: Mapping[str, str]) -> None:
+    sections = {f.name: getattr(cfg, f.name) for f in fields(cfg) if is_dataclass(getattr(cfg, f.name))}
+    top_hints = get_type_hints(PipelineConfig)
+
+    for raw_key, value in env.items():
+        if not raw_key.startswith(ENV_PREFIX) or raw_key == CONFIG_ENV:
+            continue
+        key = raw_key[len(ENV_PREFIX):].lower()
+
+        if key in top_hints and key not in sections:
+            setattr(cfg, key, _coerce(value, top_hints[key], raw_key))
+            continue
+
+        for name, section in sections.items():
+            if not key.startswith(name + "_"):
+                continue
+            field_name = key[len(name) + 1:]
+            hints = get_type_hints(type(section))
+            if field_name not in hints:
+                raise ValueError(f"Unknown config variable {raw_key}")
+            setattr(section, field_name, _coerce(value, hints[field_name], raw_key))
+            break
+
+
+def _coerce(value: Any, tp: Any, where: str) -> Any:
+    try:
+        if get_origin(tp) in (list, List):
+            (item_tp,) = get_args(tp) or (str,)
+            if isinstance(value, str):
+                value = [v.strip() for v in value.split(",") if v.strip()]
+            if not isinstance(value, (list, tuple)):
+                raise TypeError("expected a list")
+            return [_coerce(v, item_tp, where) for v in value]
+        if tp is bool:
+            if isinstance(value, str):
+                lowered = value.strip().lower()
+                if lowered in ("1", "true", "yes", "on"):
+                    return True
+                if lowered in ("0", "false", "no", "off", ""):
+                    return False
+                raise ValueError(f"not a boolean: {value!r}")
+            return bool(value)
+        if tp is int:
+            if isinstance(value, bool):
+                raise TypeError("expected an integer")
+            return int(value)
+        if tp is float:
+            return float(value)
+        if tp is str:
+            return str(value)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid value for {where}: {e}") from None
+    return value
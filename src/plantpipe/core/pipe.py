@@ -1,69 +1,534 @@
+import argparse
+import json
+import os
+import queue
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
 import time
-from typing import Optional
+from dataclasses import asdict
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
 
+from plantpipe.config import CONFIG_ENV, PipelineConfig, load_config
+from plantpipe.processing.stage import Stage, run_chain
 from plantpipe.storage.database import PlantDBWrapper
-from plantpipe.input.serial_ingestor import ProbeReader
-from plantpipe.api.api_server import PlantAPI
-
-DB_PATH = "data/plant.db"
-SCHEMA_PATH = "sql/001_init.sql"
-PROBE_PORT = "/dev/ttyUSB0"
-BAUD = 115200
-API_HOST = "127.0.0.1"
-API_PORT = 8000
-FRONTEND_ASSETS = "./frontend"
-RUN_SECONDS = 0 # set to non-zero value to set timer
-START_API = True
-
-HARD_CODED_CALIBRATION = {
-    "raw_dry": 500,
-    "raw_wet": 150,
-    "lux_min": 0.0,
-    "lux_max": 300000.0,
-    "rh_min": 0.0,
-    "rh_max": 100.0,
-    "temp_min": -40.0,
-    "temp_max": 85.0,
-    "notes": "Hardcoded default calibration values for testing."
-}
+from plantpipe.storage.spool import Spool
 
-def main():
-    db = PlantDBWrapper(DB_PATH, SCHEMA_PATH)
-
-    api: Optional[PlantAPI] = None
-    if START_API:
-        api = PlantAPI(db=db, frontend=FRONTEND_ASSETS, host=API_HOST, port=API_PORT)
-        api.start()
-        print(f"API at http://{API_HOST}:{API_PORT}/frontend")
-
-    reader = ProbeReader(
-        port=PROBE_PORT,
-        baud=BAUD,
-        db_wrapper=db,
-        defaults=HARD_CODED_CALIBRATION,
-        timeout=2.5,
-    )
-
-    try:
+# FastAPI/uvicorn and pyserial are imported only by the stages that need them,
+# so ingest-only workers and CLI tools don't pay for the web stack at startup.
+if TYPE_CHECKING:
+    from plantpipe.api.api_server import PlantAPI
+    from plantpipe.processing.anomaly import AnomalyStage
+    from plantpipe.input.serial_ingestor import ProbeReader
+    from plantpipe.output.cdc import CDCWriter
+    from plantpipe.sync.merger import SyncMerger
+    from plantpipe.sync.shipper import SyncShipper
+
+
+class ApiSupervisor:
+    """
+    Runs the API as a separate uvicorn worker group (python -m plantpipe.api.api_server)
+    against the same WAL database opened read-only, and restarts it if it exits.
+    Dashboard traffic then competes with ingestion for neither the GIL nor a write lock.
+    """
+
+    def __init__(self, config: PipelineConfig, restart_delay: float = 2.0) -> None:
+        self.config = config
+        self.restart_delay = restart_delay
+        self._proc: Optional[subprocess.Popen] = None
+        self._config_file: Optional[str] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.restarts = 0
+
+    def _spawn(self) -> subprocess.Popen:
+        env = dict(os.environ)
+        env[CONFIG_ENV] = self._config_file
+        # make sure the child can import plantpipe however this process found it
+        pkg_root = str(Path(__file__).resolve().parents[2])
+        env["PYTHONPATH"] = os.pathsep.join(p for p in (pkg_root, env.get("PYTHONPATH")) if p)
+        cmd = [sys.executable, "-m", "plantpipe.api.api_server", "--workers", str(max(1, self.config.api.workers))]
+        return subprocess.Popen(cmd, env=env)
+
+    def start(self) -> None:
+        # hand the fully resolved config to the workers
+        fd, self._config_file = tempfile.mkstemp(prefix="plantpipe_api_", suffix=".json")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(self.config.to_dict(), f)
+        self._proc = self._spawn()
+        self._thread = threading.Thread(target=self._watch, name="api-supervisor", daemon=True)
+        self._thread.start()
+
+    def _watch(self) -> None:
+        while not self._stop.wait(0.5):
+            if self._proc is not None and self._proc.poll() is not None:
+                print(f"API workers exited with {self._proc.returncode}; restarting in {self.restart_delay}s")
+                if self._stop.wait(self.restart_delay):
+                    return
+                self._proc = self._spawn()
+                self.restarts += 1
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+        if self._proc is not None and self._proc.poll() is None:
+            self._proc.terminate()  # uvicorn shuts its workers down gracefully on SIGTERM
+            try:
+                self._proc.wait(timeout=10.0)
+            except subprocess.TimeoutExpired:
+                self._proc.kill()
+        self._proc = None
+        if self._config_file:
+            try:
+                os.unlink(self._config_file)
+            except OSError:
+                pass
+            self._config_file = None
+
+
+class PipelineRunner:
+    """
+    Wires the configured stages together:
+
+        ProbeReader (one thread per port) -> queue -> stages -> batch writer -> SQLite
+                                                                    |            ^
+                                                                    +-> spool -> drainer
+                                                     (+ optional API, retention, CDC, sync)
+
+    The API runs either as a thread in this process (api.mode = "thread") or as
+    a supervised read-only worker group (api.mode = "process"). For multi-site
+    setups an edge node ships its new rows (stages.sync_ship) and a central node
+    merges every site's batches into its own database (stages.sync_merge).
+
+    Readers only decode/validate; processing stages (e.g. decimation) and all
+    inserts run on the writer thread in batched transactions, so a slow commit
+    never stalls a serial port. When SQLite cannot take a write (locked past
+    busy_timeout, disk full, I/O error) the batch goes to the on-disk spool and
+    later batches follow it there until the drainer has replayed it, so order
+    is kept and nothing is dropped.
+    """
+
+    def __init__(self, config: PipelineConfig) -> None:
+        self.config = config
+        self.db = PlantDBWrapper(config.database.path, config.database.schema)
+
+        self._stop = threading.Event()
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=max(1, config.batch.queue_size))
+        self._readers: List["ProbeReader"] = []
+        self._reader_threads: List[threading.Thread] = []
+        self._threads: List[threading.Thread] = []
+        self._drain_thread: Optional[threading.Thread] = None
+        self._writer_done = threading.Event()
+        self.api: Optional["PlantAPI"] = None
+        self.api_supervisor: Optional[ApiSupervisor] = None
+        self.cdc: Optional["CDCWriter"] = None
+        self.sync_shipper: Optional["SyncShipper"] = None
+        self.sync_merger: Optional["SyncMerger"] = None
+        self.anomaly: Optional["AnomalyStage"] = None
+        self.spool: Optional[Spool] = None
+        if config.stages.spool:
+            sc = config.spool
+            self.spool = Spool(sc.directory, segment_bytes=sc.segment_bytes, fsync_interval=sc.fsync_interval)
+        self.stages: List[Stage] = self._build_stages()
+
+        self.stored = 0
+        self.failed = 0
+        self._counts_lock = threading.Lock()  # writer and spool drainer both insert
+        self._transient_error = ""
+
+    # ---------- lifecycle ----------
+
+    def _build_stages(self) -> List[Stage]:
+        cfg = self.config
+        stages: List[Stage] = []
+        # order matters: reorder/dedupe on the full stream before anything scores or drops readings
+        if cfg.stages.sequence:
+            from plantpipe.processing.sequence import SequenceStage
+
+            stages.append(SequenceStage(window=cfg.sequence.window, max_wait=cfg.sequence.max_wait))
+        if cfg.stages.anomaly:
+            from plantpipe.processing.anomaly import AnomalyStage
+
+            a = cfg.anomaly
+            self.anomaly = AnomalyStage(
+                self.db.get_calibration_raw_range,
+                z_threshold=a.z_threshold,
+                alpha=a.alpha,
+                warmup=a.warmup,
+                stuck_samples=a.stuck_samples,
+                stuck_metrics=a.stuck_metrics,
+                drop_pct=a.drop_pct,
+                drop_window_seconds=a.drop_window_seconds,
+                cooldown_seconds=a.cooldown_seconds,
+                cache_size=cfg.cache.calibrations,
+            )
+            stages.append(self.anomaly)  # before decimation: scores the full-rate stream
+        if cfg.stages.decimate:
+            from plantpipe.processing.decimate import DeadbandStage
+
+            d = cfg.decimation
+            stages.append(DeadbandStage(
+                {"lux": d.lux, "rh": d.rh, "temp_c": d.temp_c, "moisture_raw": d.moisture_raw},
+                heartbeat_seconds=d.heartbeat_seconds,
+            ))
+        return stages
+
+    def start(self) -> None:
+        cfg = self.config
+
+        if self.db.start_background_migrations():
+            print("Background schema migration running; ingest continues meanwhile.")
+
+        if cfg.api.mode not in ("thread", "process"):
+            raise ValueError(f"Unknown api.mode {cfg.api.mode!r} (expected 'thread' or 'process')")
+
+        if cfg.stages.api and cfg.api.mode == "process":
+            self.api_supervisor = ApiSupervisor(cfg)
+            self.api_supervisor.start()
+            print(f"API ({cfg.api.workers} worker(s)) at http://{cfg.api.host}:{cfg.api.port}/frontend")
+        elif cfg.stages.api:
+            from plantpipe.api.api_server import PlantAPI
+
+            self.api = PlantAPI(
+                db=self.db,
+                frontend=cfg.api.frontend,
+                host=cfg.api.host,
+                port=cfg.api.port,
+                overview_window_hours=cfg.api.overview_window_hours,
+                overview_bucket_seconds=cfg.api.overview_bucket_seconds,
+                sync_inbox=cfg.sync.inbox if cfg.stages.sync_merge else None,
+                sync_token=cfg.sync.token,
+            )
+            self.api.start()
+            print(f"API at http://{cfg.api.host}:{cfg.api.port}/frontend")
+
+        from plantpipe.input.serial_ingestor import ProbeReader
+
+        defaults = asdict(cfg.calibration)
+        for port in cfg.probes.ports:
+            reader = ProbeReader(
+                port=port,
+                baud=cfg.probes.baud,
+                db_wrapper=self.db,
+                defaults=defaults,
+                timeout=cfg.probes.timeout,
+                cache_size=cfg.cache.calibrations,
+                check_interval=cfg.cache.calibration_check,
+            )
+            self._readers.append(reader)
+            t = threading.Thread(target=self._read_loop, args=(reader,), name=f"reader:{port}", daemon=True)
+            self._reader_threads.append(t)
+
+        self._threads.append(threading.Thread(target=self._write_loop, name="writer", daemon=True))
+        if self.spool is not None:
+            if self.spool.pending():
+                print("Spool has readings from a previous run; replaying them first.")
+            self._drain_thread = threading.Thread(target=self._drain_loop, name="spool-drain", daemon=True)
+            self._drain_thread.start()
+        if cfg.stages.retention and cfg.retention.days > 0:
+            self._threads.append(threading.Thread(target=self._retention_loop, name="retention", daemon=True))
+
+        for t in self._reader_threads + self._threads:
+            t.start()
+
+        if cfg.stages.cdc:
+            from plantpipe.output.cdc import CDCWriter
+
+            self.cdc = CDCWriter(
+                self.db,
+                cfg.cdc.directory,
+                segment_bytes=cfg.cdc.segment_bytes,
+                batch_size=cfg.cdc.batch_size,
+                poll_interval=cfg.cdc.poll_interval,
+                keep_segments=cfg.cdc.keep_segments,
+            )
+            self.cdc.start()
+
+        if cfg.stages.sync_ship:
+            from plantpipe.sync.shipper import SyncShipper
+
+            self.sync_shipper = SyncShipper(
+                self.db,
+                cfg.sync.site,
+                cfg.sync.outbox,
+                url=cfg.sync.url,
+                token=cfg.sync.token,
+                batch_rows=cfg.sync.batch_rows,
+                poll_interval=cfg.sync.poll_interval,
+            )
+            self.sync_shipper.start()
+            print(f"Shipping site {self.sync_shipper.site!r} to {cfg.sync.url or cfg.sync.outbox}")
+        if cfg.stages.sync_merge:
+            from plantpipe.sync.merger import SyncMerger
+
+            self.sync_merger = SyncMerger(self.db, cfg.sync.inbox, poll_interval=cfg.sync.poll_interval)
+            self.sync_merger.start()
+
+    def run(self) -> None:
+        """Start all stages and block until run_seconds elapses, readers die, or Ctrl-C."""
+        self.start()
         start = time.time()
-        for inserted_payload in reader:
-            last = db.get_last_readings(1, oldest_first=False)
-            if last:
-                print("Last reading:", last[0])
-            if RUN_SECONDS:
-                if time.time() - start > RUN_SECONDS:
+        try:
+            while not self._stop.is_set():
+                if self.config.run_seconds and time.time() - start > self.config.run_seconds:
                     break
-    finally:
+                if self._reader_threads and not any(t.is_alive() for t in self._reader_threads):
+                    print("All probe readers stopped; shutting down.")
+                    break
+                self._stop.wait(0.5)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def stop(self) -> None:
+        self._stop.set()
+        for t in self._reader_threads:
+            t.join(timeout=self.config.probes.timeout + 1.0)
+        for reader in self._readers:
+            try:
+                reader.close()
+            except Exception:
+                pass
+        for t in self._threads:
+            t.join(timeout=5.0)
+        if self._drain_thread is not None:
+            self._drain_thread.join(timeout=30.0)  # one last replay attempt once the writer is done
+            self._drain_thread = None
+        if self.spool is not None:
+            self.spool.close()
+            if self.spool.pending():
+                print("Readings left in the spool will be replayed on the next start.")
+        if self.cdc is not None:
+            self.cdc.stop()  # after the writer so the final batch is captured
+            self.cdc.poll_once()
+            self.cdc = None
+        if self.sync_shipper is not None:
+            self.sync_shipper.stop()
+            while self.sync_shipper.cut_batch() is not None:  # uploaded on the next start
+                pass
+            self.sync_shipper = None
+        if self.sync_merger is not None:
+            self.sync_merger.stop()
+            self.sync_merger = None
+        if self.api is not None:
+            try:
+                self.api.stop()
+            except Exception:
+                pass
+            self.api = None
+        if self.api_supervisor is not None:
+            self.api_supervisor.stop()
+            self.api_supervisor = None
+        self.db.stop_background_migrations()
+        self.db.close()
+
+    # ---------- stage loops ----------
+
+    def _read_loop(self, reader: "ProbeReader") -> None:
+        try:
+            while not self._stop.is_set():
+                payload = reader.read_payload()
+                if payload is None:
+                    continue
+                while not self._stop.is_set():
+                    try:
+                        self._queue.put(payload, timeout=0.5)
+                        break
+                    except queue.Full:
+                        continue
+        except Exception as e:
+            print(f"Reader on {reader.port} stopped: {e}")
+        finally:
+            self.db.close()
+
+    def _write_loop(self) -> None:
+        size = max(1, self.config.batch.size)
+        max_delay = max(0.0, self.config.batch.max_delay)
+        stats_interval = max(1.0, self.config.batch.stats_interval)
+        batch: List[Dict[str, Any]] = []
+        deadline = 0.0
+        next_stats = time.monotonic() + stats_interval
+        try:
+            while not (self._stop.is_set() and self._queue.empty()):
+                timeout = max(0.0, deadline - time.monotonic()) if batch else 0.5
+                try:
+                    incoming = [self._queue.get(timeout=timeout)]
+                except queue.Empty:
+                    incoming = []
+                # stages may drop, pass or hold payloads; flushing each pass releases held ones that are due
+                out = run_chain(self.stages, incoming, flush=True) if self.stages else incoming
+                if out and not batch:
+                    deadline = time.monotonic() + max_delay
+                batch.extend(out)
+
+                if batch and (len(batch) >= size or time.monotonic() >= deadline):
+                    self._flush(batch)
+                    batch = []
+                if time.monotonic() >= next_stats:
+                    self._flush_stage_counters()
+                    next_stats = time.monotonic() + stats_interval
+            batch.extend(run_chain(self.stages, [], flush=True, force=True))
+            if batch:
+                self._flush(batch)
+            self._flush_alerts()
+            self._flush_stage_counters()
+        finally:
+            self._writer_done.set()
+            self.db.close()
+
+    def _flush(self, batch: List[Dict[str, Any]]) -> None:
+        spool = self.spool
+        if spool is not None and (self.config.spool.write_ahead or spool.pending()):
+            # write-ahead, or older readings are still spooled: queue behind them to keep order
+            spool.append(batch)
+        else:
+            done = self._insert(batch)
+            if done < len(batch):
+                rest = batch[done:]
+                if spool is not None:
+                    print(f"Database unavailable; spooling {len(rest)} readings")
+                    spool.append(rest)
+                else:
+                    self._tally(failed=len(rest))
+        self._flush_alerts()  # after the readings they refer to
+
+    def _tally(self, stored: int = 0, failed: int = 0) -> None:
+        with self._counts_lock:
+            self.stored += stored
+            self.failed += failed
+
+    def _insert(self, rows: List[Dict[str, Any]]) -> int:
+        """
+        Store rows in order. Returns how many leading rows are done (stored or
+        permanently rejected); the rest hit a transient error and should be retried.
+        """
         try:
-            reader.close()
+            if self.db.insert_batch_readings(rows, raise_errors=True):
+                self._tally(stored=len(rows))
+                return len(rows)
+            return 0  # readings table missing, e.g. mid-restore
+        except sqlite3.OperationalError as e:
+            # locked past busy_timeout, disk full, I/O error, ...: the batch may succeed later
+            self._transient_error = str(e)
+            return 0
         except Exception:
             pass
-        if api is not None:
+        # One bad row fails the whole transaction; retry row by row so the rest are kept.
+        for i, payload in enumerate(rows):
+            try:
+                self.db.insert_single_reading(payload, raise_errors=True)
+                self._tally(stored=1)
+            except sqlite3.OperationalError as e:
+                self._transient_error = str(e)
+                return i
+            except Exception as e:
+                # constraint/type errors will fail the same way on every retry
+                self._tally(failed=1)
+                print(f"Rejected reading for probe {payload.get('probe_id')}: {e}")
+                if self.spool is not None:
+                    self.spool.reject(payload, str(e))
+        return len(rows)
+
+    def _drain_loop(self) -> None:
+        cfg = self.config.spool
+        spool = self.spool
+        delay = max(0.05, cfg.retry_interval)
+        try:
+            while True:
+                if not spool.pending():
+                    if self._writer_done.is_set():
+                        return
+                    spool.sync()
+                    self._writer_done.wait(0.1)
+                    continue
+                rows, ends, end = spool.read(max(1, cfg.drain_batch))
+                if not rows:
+                    spool.commit(end, 0)  # step over an exhausted segment
+                    continue
+                done = self._insert(rows)
+                if done:
+                    spool.commit(ends[done - 1], done)
+                if done == len(rows):
+                    delay = max(0.05, cfg.retry_interval)
+                    continue
+                if self._writer_done.is_set():
+                    return  # still failing at shutdown: leave it for the next start
+                print(f"Spool replay paused ({self._transient_error}); retrying in {delay:.1f}s")
+                self._writer_done.wait(delay)  # a shutdown cuts the backoff short for one last attempt
+                delay = min(delay * 2, max(delay, cfg.max_retry_interval))
+        except Exception as e:
+            print(f"Spool drainer stopped: {e}")
+        finally:
+            self.db.close()
+
+    def _flush_alerts(self) -> None:
+        if self.anomaly is None:
+            return
+        alerts = self.anomaly.drain_alerts()
+        if alerts and not self.db.insert_alerts(alerts):
+            self.anomaly.requeue_alerts(alerts)
+
+    def _flush_stage_counters(self) -> None:
+        for st in self.stages:
+            counts = st.drain_counters()
+            if not counts:
+                continue
             try:
-                api.stop()
+                if self.db.add_ingest_counters(st.name, counts, raise_errors=True):
+                    continue
+                retry = counts  # stats table missing, e.g. mid-restore
+            except sqlite3.OperationalError:
+                retry = counts  # locked, disk full, ...: the same increments may succeed later
             except Exception:
-                pass
-        db.close()
+                # one bad key (e.g. a probe deleted meanwhile) fails them all: store key by key
+                retry = {}
+                for key, n in counts.items():
+                    try:
+                        self.db.add_ingest_counters(st.name, {key: n}, raise_errors=True)
+                    except sqlite3.OperationalError:
+                        retry[key] = n
+                    except Exception as e:
+                        print(f"Dropped {st.name} counter {key[1]}={n} of probe {key[0]}: {e}")
+            # keep the increments for the next attempt rather than losing them
+            for key, n in retry.items():
+                st.count(key[0], key[1], n)
+
+    def _retention_loop(self) -> None:
+        cfg = self.config.retention
+        try:
+            while not self._stop.is_set():
+                cutoff = (datetime.now(timezone.utc) - timedelta(days=cfg.days)).strftime("%Y-%m-%d %H:%M:%S")
+                deleted = self.db.delete_readings_before(cutoff, chunk_size=max(1, cfg.chunk_size))
+                if deleted:
+                    print(f"Retention: deleted {deleted} readings older than {cutoff}")
+                self._stop.wait(max(1.0, cfg.interval))
+        except Exception as e:
+            print(f"Retention stage stopped: {e}")
+        finally:
+            self.db.close()
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description="Run the plantpipe ingest pipeline")
+    ap.add_argument("--config", default=None, help="JSON config file (default: $PLANTPIPE_CONFIG)")
+    ap.add_argument("--print-config", action="store_true", help="Print the resolved config and exit")
+    return ap.parse_args()
+
+
+def main():
+    args = parse_args()
+    config = load_config(args.config)
+    if args.print_config:
+        print(json.dumps(config.to_dict(), indent=2))
+        return
+    PipelineRunner(config).run()
+
 
 if __name__ == "__main__":
     main()
@@ -1,9 +1,10 @@
 # src/plantpipe/input/serial_ingestor.py
 
 import json
+import time
+from collections import OrderedDict
 from datetime import datetime, timezone
-from typing import Any, Dict, Optional
-import serial
+from typing import Any, Dict, Optional, Tuple
 from plantpipe.storage.database import PlantDBWrapper
 
 
@@ -12,20 +13,53 @@ class ProbeManager:
     Owns calibration lifecycle (DB-backed), validation, and writing readings.
     """
 
-    def __init__(self, db: PlantDBWrapper, defaults: Dict[str, Any]) -> None:
+    def __init__(
+        self,
+        db: PlantDBWrapper,
+        defaults: Dict[str, Any],
+        cache_size: int = 1024,
+        check_interval: float = 5.0,
+    ) -> None:
         self.db = db
         self.defaults = defaults
-        self._cal_id_cache: Dict[int, int] = {}
+        self.cache_size = max(1, int(cache_size))
+        # seconds between checks for calibrations changed elsewhere (API, CLI, sync merge)
+        self.check_interval = max(0.0, float(check_interval))
+        self._checked_at: Optional[float] = None
+        self._cal_version = 0
+        # probe_id -> active calibration id, LRU-bounded
+        self._cal_id_cache: "OrderedDict[int, int]" = OrderedDict()
+        # probe_id -> validation envelope of the active calibration, LRU-bounded
+        self._envelope_cache: "OrderedDict[int, Tuple]" = OrderedDict()
 
     # ---------- calibration ----------
 
+    def _cache_put(self, cache: OrderedDict, key: int, value: Any) -> None:
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > self.cache_size:
+            cache.popitem(last=False)
+
+    def _revalidate(self) -> None:
+        """Drop both caches once the calibration set has changed since the last check."""
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        version = self.db.calibration_version()
+        if version != self._cal_version:
+            self._cal_version = version
+            self.invalidate_calibration_cache()
+
     def get_active_calibration_id(self, probe_id: int) -> Optional[int]:
+        self._revalidate()
         cal_id = self._cal_id_cache.get(probe_id)
         if cal_id is not None:
+            self._cal_id_cache.move_to_end(probe_id)
             return cal_id
         cal_id = self.db.get_active_calibration_id(probe_id)
         if cal_id is not None:
-            self._cal_id_cache[probe_id] = cal_id
+            self._cache_put(self._cal_id_cache, probe_id, cal_id)
         return cal_id
 
     def ensure_active_calibration(self, probe_id: int) -> int:
@@ -35,14 +69,27 @@ class ProbeManager:
         cal_id = self.db.upsert_active_calibration_from_defaults(probe_id, self.defaults)
         if cal_id is None:
             raise RuntimeError(f"Failed to create default calibration for probe {probe_id}")
-        self._cal_id_cache[probe_id] = cal_id
+        self._cache_put(self._cal_id_cache, probe_id, cal_id)
         return cal_id
 
     def invalidate_calibration_cache(self, probe_id: Optional[int] = None) -> None:
         if probe_id is None:
             self._cal_id_cache.clear()
+            self._envelope_cache.clear()
         else:
             self._cal_id_cache.pop(probe_id, None)
+            self._envelope_cache.pop(probe_id, None)
+
+    def get_validation_envelope(self, probe_id: int) -> Optional[Tuple]:
+        self._revalidate()
+        env = self._envelope_cache.get(probe_id)
+        if env is not None:
+            self._envelope_cache.move_to_end(probe_id)
+            return env
+        env = self.db.get_validation_envelope(probe_id)
+        if env is not None:
+            self._cache_put(self._envelope_cache, probe_id, env)
+        return env
 
     # ---------- validation ----------
 
@@ -54,7 +101,7 @@ class ProbeManager:
         temp_c: Optional[float],
         moisture_raw: Optional[int],
     ) -> bool:
-        env = self.db.get_validation_envelope(probe_id)
+        env = self.get_validation_envelope(probe_id)
         if not env:
             print(f"No active calibration found for probe {probe_id}. Cannot validate sensor readings.")
             return False
@@ -79,7 +126,8 @@ class ProbeManager:
 
     # ---------- ingest ----------
 
-    def ingest_reading(self, line: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    def prepare_reading(self, line: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Validate a decoded device line and build the row payload (no DB write)."""
         pid = line.get("probe_id", line.get("plant_id"))
         if pid is None:
             print("Skipping record without probe_id/plant_id")
@@ -90,6 +138,10 @@ class ProbeManager:
         except (TypeError, ValueError):
             print(f"Skipping record with non-integer probe_id: {pid!r}")
             return None
+        if probe_id >= self.db.SYNC_PROBE_ID_BASE:
+            # that range belongs to probes merged from other sites (multi-site sync)
+            print(f"Skipping record with out-of-range probe_id: {probe_id}")
+            return None
 
         lux = self._maybe_float(line.get("lux"))
         rh = self._maybe_float(line.get("rh"))
@@ -114,7 +166,14 @@ class ProbeManager:
             "seq": seq,
             "calibration_id": cal_id,
         }
+        return payload
+
+    def ingest_reading(self, line: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        payload = self.prepare_reading(line)
+        if payload is None:
+            return None
 
+        probe_id = payload["probe_id"]
         ok = self.db.insert_single_reading(payload)
         if not ok:
             print(f"Insert failed for probe {probe_id}")
@@ -151,15 +210,26 @@ class ProbeReader:
     Manager owns calibration, validation, and DB insert.
     """
 
-    def __init__(self, port: str, baud: int, db_wrapper: PlantDBWrapper, defaults: Dict[str, Any], timeout: float = 2.5) -> None:
+    def __init__(
+        self,
+        port: str,
+        baud: int,
+        db_wrapper: PlantDBWrapper,
+        defaults: Dict[str, Any],
+        timeout: float = 2.5,
+        cache_size: int = 1024,
+        check_interval: float = 5.0,
+    ) -> None:
         self.port = port
         self.baud = baud
         self.timeout = timeout
         self.db = db_wrapper
-        self.manager = ProbeManager(db_wrapper, defaults)
+        self.manager = ProbeManager(db_wrapper, defaults, cache_size=cache_size, check_interval=check_interval)
+        import serial  # pyserial is only needed once a port is actually opened
+
         self.ser = serial.Serial(self.port, self.baud, timeout=self.timeout)
 
-    def read_single(self) -> Optional[Dict[str, Any]]:
+    def _read_line(self) -> Optional[Dict[str, Any]]:
         raw = self.ser.readline()
         if not raw:
             return None
@@ -167,8 +237,23 @@ class ProbeReader:
             line = json.loads(raw.decode("utf-8", "replace").strip())
         except json.JSONDecodeError:
             return None
+        if not isinstance(line, dict):
+            return None
+        return line
+
+    def read_single(self) -> Optional[Dict[str, Any]]:
+        line = self._read_line()
+        if line is None:
+            return None
         return self.manager.ingest_reading(line)
 
+    def read_payload(self) -> Optional[Dict[str, Any]]:
+        """Read and validate one line, returning the row payload without storing it."""
+        line = self._read_line()
+        if line is None:
+            return None
+        return self.manager.prepare_reading(line)
+
     def __iter__(self):
         while True:
             rec = self.read_single()
@@ -0,0 +1,332 @@
+# src/plantpipe/output/cdc.py
+
+"""
+Change-data-capture export.
+
+CDCWriter tails committed rows of readings, probe_alerts and probe_calibrations
+(by their INTEGER PRIMARY KEY, i.e. commit order) on its own read connection and
+appends them as JSON lines to rotating segment files:
+
+    <dir>/segment-00000000000000000000.jsonl
+    <dir>/segment-00000000000000012345.jsonl   <- named by its first offset
+    <dir>/_writer.json                          <- writer watermarks (atomic)
+
+Every event gets a global, gap-free `offset`. Calibrations come first: inserts
+(op "insert", the row as of capture) and `active` switches logged by
+probe_calibration_changes (op "update", row {id, probe_id, active}), merged in
+commit order. Readings and alerts follow, each in its own commit order, only
+once every calibration in the snapshot is out, so a reading never precedes the
+calibration it references. Readings and alerts are not interleaved by commit.
+
+CDCReader lets a downstream consumer resume from its own checkpointed offset;
+if keep_segments pruned past it, read() raises OffsetPrunedError.
+Because WAL readers never block the writer, tailing does not slow ingest.
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from plantpipe.common import write_json_atomic
+from plantpipe.storage.database import PlantDBWrapper
+
+SOURCES = ("probe_calibrations", "probe_calibration_changes", "readings", "probe_alerts")
+SEGMENT_PREFIX = "segment-"
+SEGMENT_SUFFIX = ".jsonl"
+WRITER_STATE = "_writer.json"
+
+
+def _segment_name(first_offset: int) -> str:
+    return f"{SEGMENT_PREFIX}{first_offset:020d}{SEGMENT_SUFFIX}"
+
+
+def _segment_offset(path: Path) -> int:
+    return int(path.name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)])
+
+
+def _list_segments(directory: Path) -> List[Path]:
+    return sorted(directory.glob(f"{SEGMENT_PREFIX}*{SEGMENT_SUFFIX}"), key=_segment_offset)
+
+
+class OffsetPrunedError(RuntimeError):
+    """The consumer's next offset is older than the oldest segment left on disk."""
+
+    def __init__(self, offset: int, oldest: int) -> None:
+        super().__init__(f"CDC offsets {offset}..{oldest - 1} were pruned; oldest available is {oldest}")
+        self.offset = offset
+        self.oldest = oldest
+
+
+class CDCWriter:
+    """Tail committed changes into rotating JSONL segments with a durable watermark file."""
+
+    def __init__(
+        self,
+        db: PlantDBWrapper,
+        directory: str,
+        segment_bytes: int = 64 * 1024 * 1024,
+        batch_size: int = 1000,
+        poll_interval: float = 1.0,
+        keep_segments: int = 0,
+    ) -> None:
+        self.db = db
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.segment_bytes = max(1, int(segment_bytes))
+        self.batch_size = max(1, int(batch_size))
+        self.poll_interval = max(0.05, float(poll_interval))
+        self.keep_segments = max(0, int(keep_segments))
+
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self._state_path = self.directory / WRITER_STATE
+        self.next_offset = 0
+        self.watermarks: Dict[str, int] = {t: 0 for t in SOURCES}
+        self._segment: Optional[Path] = None
+        self._load_state()
+
+    # ---------- state ----------
+
+    def _load_state(self) -> None:
+        if self._state_path.exists():
+            state = json.loads(self._state_path.read_text(encoding="utf-8"))
+            self.next_offset = int(state["next_offset"])
+            self.watermarks.update({k: int(v) for k, v in state["watermarks"].items()})
+            if state.get("segment"):
+                self._segment = self.directory / state["segment"]
+                # Drop any tail written after the last saved state (crash between write and save).
+                size = int(state.get("segment_size", 0))
+                if self._segment.exists() and self._segment.stat().st_size > size:
+                    with open(self._segment, "r+b") as f:
+                        f.truncate(size)
+        # A segment starting at or past next_offset was rotated to but never recorded:
+        # its events are re-captured from the watermarks, so remove it rather than reuse its offsets.
+        for seg in _list_segments(self.directory):
+            if _segment_offset(seg) >= self.next_offset and seg != self._segment:
+                seg.unlink()
+
+    def _save_state(self, segment: Path, next_offset: int, watermarks: Dict[str, int]) -> None:
+        write_json_atomic(self._state_path, {
+            "next_offset": next_offset,
+            "watermarks": watermarks,
+            "segment": segment.name,
+            "segment_size": segment.stat().st_size,
+        })
+
+    # ---------- capture ----------
+
+    def poll_once(self) -> int:
+        """Capture everything committed since the last poll. Returns events written."""
+        written = 0
+        while True:
+            events: List[Dict[str, Any]] = []
+            watermarks = dict(self.watermarks)
+            conn = self.db.connection()
+            conn.execute("BEGIN")  # one read snapshot across all sources
+            try:
+                if not self._calibration_events(watermarks, events):
+                    for table in ("readings", "probe_alerts"):
+                        rows = self.db.get_rows_after_id(table, watermarks[table], self.batch_size)
+                        for row in rows:
+                            events.append({"table": table, "op": "insert", "id": row["id"], "row": row})
+                        if rows:
+                            watermarks[table] = rows[-1]["id"]
+            finally:
+                conn.execute("COMMIT")
+            if not events:
+                return written
+            self._append(events, watermarks)
+            written += len(events)
+
+    def _calibration_events(self, watermarks: Dict[str, int], events: List[Dict[str, Any]]) -> bool:
+        """
+        Append calibration inserts and updates in commit order. An update sorts after
+        the inserts up to its after_calibration_id. Returns True if a page was full:
+        later calibrations are still unread, so readings must wait for the next round.
+        """
+        inserts = self.db.get_rows_after_id("probe_calibrations", watermarks["probe_calibrations"], self.batch_size)
+        changes = self.db.get_rows_after_id(
+            "probe_calibration_changes", watermarks["probe_calibration_changes"], self.batch_size
+        )
+        keyed = [((r["id"], 0, r["id"]), "probe_calibrations", r) for r in inserts]
+        keyed += [((c["after_calibration_id"], 1, c["id"]), "probe_calibration_changes", c) for c in changes]
+        keyed.sort(key=lambda k: k[0])
+        full = [rows for rows in (inserts, changes) if len(rows) >= self.batch_size]
+        # past the last row of a full page, rows of that source not read yet may sort first
+        ends = [k for k, _, r in keyed if any(r is rows[-1] for rows in full)]
+        limit = min(ends) if ends else None
+        for key, source, r in keyed:
+            if limit is not None and key > limit:
+                break
+            if source == "probe_calibrations":
+                events.append({"table": "probe_calibrations", "op": "insert", "id": r["id"], "row": r})
+            else:
+                events.append({
+                    "table": "probe_calibrations", "op": "update", "id": r["calibration_id"],
+                    "row": {"id": r["calibration_id"], "probe_id": r["probe_id"], "active": r["active"]},
+                })
+            watermarks[source] = r["id"]
+        return bool(full)
+
+    def _append(self, events: List[Dict[str, Any]], watermarks: Dict[str, int]) -> None:
+        """Write events and the state after them; self only moves once both are durable."""
+        segment = self._segment
+        rotate = segment is None or (segment.exists() and segment.stat().st_size >= self.segment_bytes)
+        if rotate:
+            segment = self.directory / _segment_name(self.next_offset)
+        size = segment.stat().st_size if segment.exists() else 0
+
+        offset = self.next_offset
+        try:
+            with open(segment, "a", encoding="utf-8") as f:
+                for ev in events:
+                    ev["offset"] = offset
+                    offset += 1
+                    f.write(json.dumps(ev, separators=(",", ":")) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._save_state(segment, offset, watermarks)
+        except Exception:
+            # leave the segment as the saved state describes it; the rows are re-read next poll
+            try:
+                if rotate:
+                    segment.unlink()
+                elif segment.exists():
+                    with open(segment, "r+b") as f:
+                        f.truncate(size)
+            except OSError:
+                pass
+            raise
+
+        self._segment = segment
+        self.next_offset = offset
+        self.watermarks = watermarks
+        if rotate:
+            self._prune_segments()
+
+    def _prune_segments(self) -> None:
+        if not self.keep_segments:
+            return
+        segments = _list_segments(self.directory)
+        for old in segments[:max(0, len(segments) - self.keep_segments)]:
+            try:
+                old.unlink()
+            except OSError:
+                pass
+
+    # ---------- thread ----------
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="cdc", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        try:
+            while not self._stop.is_set():
+                try:
+                    self.poll_once()
+                except Exception as e:
+                    print(f"CDC poll failed: {e}")
+                self._stop.wait(self.poll_interval)
+        finally:
+            self.db.close()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5.0)
+        self._thread = None
+
+
+class CDCReader:
+    """
+    Consumer side: read events from a CDC directory starting at a checkpointed offset.
+
+    Each named consumer keeps its own checkpoint file, so several downstream
+    systems can tail the same segments independently.
+    """
+
+    def __init__(self, directory: str, consumer: str) -> None:
+        self.directory = Path(directory)
+        self._checkpoint_path = self.directory / f"_consumer-{consumer}.json"
+        self.offset = 0
+        if self._checkpoint_path.exists():
+            self.offset = int(json.loads(self._checkpoint_path.read_text(encoding="utf-8"))["offset"])
+
+    def read(self, max_events: int = 1000) -> Iterator[Dict[str, Any]]:
+        """
+        Yield up to max_events events with offset >= the checkpoint (does not commit).
+        Raises OffsetPrunedError if some of them were already pruned; commit(e.oldest)
+        skips the lost range explicitly.
+        """
+        segments = _list_segments(self.directory)
+        if segments and _segment_offset(segments[0]) > self.offset:
+            raise OffsetPrunedError(self.offset, _segment_offset(segments[0]))
+        start = 0
+        for i, seg in enumerate(segments):
+            if _segment_offset(seg) <= self.offset:
+                start = i
+        produced = 0
+        for seg in segments[start:]:
+            try:
+                f = open(seg, "r", encoding="utf-8")
+            except FileNotFoundError:  # pruned after we listed it
+                left = _list_segments(self.directory)
+                raise OffsetPrunedError(self.offset, _segment_offset(left[0]) if left else self.offset) from None
+            with f:
+                for line in f:
+                    if not line.endswith("\n"):
+                        return  # partially written tail; pick it up next time
+                    ev = json.loads(line)
+                    if ev["offset"] < self.offset:
+                        continue
+                    yield ev
+                    produced += 1
+                    if produced >= max_events:
+                        return
+
+    def commit(self, offset: int) -> None:
+        """Record that every event below `offset` has been processed."""
+        self.offset = int(offset)
+        write_json_atomic(self._checkpoint_path, {"offset": self.offset})
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description="Tail plant.db changes into JSONL CDC segments")
+    ap.add_argument("--db", default="data/plant.db")
+    ap.add_argument("--schema", default="sql/001_init.sql")
+    ap.add_argument("--dir", default="data/cdc", help="Segment output directory")
+    ap.add_argument("--segment-mb", type=float, default=64.0)
+    ap.add_argument("--interval", type=float, default=1.0, help="Seconds between polls")
+    ap.add_argument("--once", action="store_true", help="Capture pending changes and exit")
+    return ap.parse_args()
+
+
+def main():
+    args = parse_args()
+    db = PlantDBWrapper(args.db, args.schema, read_only=True)
+    writer = CDCWriter(db, args.dir, segment_bytes=int(args.segment_mb * 1024 * 1024), poll_interval=args.interval)
+    if args.once:
+        print(f"Wrote {writer.poll_once()} events (next offset {writer.next_offset})")
+        db.close()
+        return
+    writer.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        writer.stop()
+
+
+if __name__ == "__main__":
+    main()
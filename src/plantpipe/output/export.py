@@ -0,0 +1,302 @@
+# src/plantpipe/output/export.py
+
+"""
+Streaming export of readings (raw or bucketed aggregates) to CSV, JSONL,
+Parquet or Arrow IPC.
+
+Rows are pulled with keyset pagination (id > last_id ... LIMIT chunk) and
+written chunk by chunk, so memory stays bounded by --chunk-size regardless of
+history length. The source is opened read-only inside a single read
+transaction, which pins one WAL snapshot for the whole export without ever
+blocking the ingest writer; --copy first takes an online backup instead, for
+very long exports that should not hold back WAL checkpoints.
+
+Examples:
+    python -m plantpipe.output.export --out data/readings.csv
+    python -m plantpipe.output.export --probe 1 --since "2026-10-01 00:00:00" \\
+        --metric moisture_pct --metric temp_c --out data/p1.parquet
+    python -m plantpipe.output.export --aggregate hour --out data/hourly.csv
+"""
+
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import tempfile
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+METRICS = ("moisture_pct", "lux", "rh", "temp_c", "moisture_raw")
+BASE_COLUMNS = ("id", "ts", "probe_id")
+EXTRA_COLUMNS = ("seq", "calibration_id")
+BUCKETS = {
+    "minute": "%Y-%m-%d %H:%M:00",
+    "hour": "%Y-%m-%d %H:00:00",
+    "day": "%Y-%m-%d 00:00:00",
+}
+FORMATS = ("csv", "jsonl", "parquet", "arrow")
+
+
+# ------------------- source -------------------
+
+def open_snapshot(db_path: str) -> sqlite3.Connection:
+    """Read-only connection holding one consistent WAL snapshot until closed."""
+    path = Path(db_path)
+    if not path.exists():
+        raise FileNotFoundError(f"Database not found at {path}")
+    conn = sqlite3.connect(f"{path.resolve().as_uri()}?mode=ro", uri=True, isolation_level=None)
+    conn.execute("PRAGMA busy_timeout=3000;")
+    conn.execute("BEGIN")
+    conn.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchone()  # start the read txn now
+    return conn
+
+
+def copy_snapshot(db_path: str, dest_dir: Optional[str] = None) -> str:
+    """Online backup into a temp file, copied in page steps so ingest keeps running."""
+    src = sqlite3.connect(f"{Path(db_path).resolve().as_uri()}?mode=ro", uri=True)
+    fd, tmp = tempfile.mkstemp(prefix="plant_snapshot_", suffix=".db", dir=dest_dir)
+    os.close(fd)
+    dst = sqlite3.connect(tmp)
+    try:
+        src.backup(dst, pages=1024)
+        dst.execute("PRAGMA journal_mode=DELETE")  # standalone file, no -wal/-shm left behind
+    finally:
+        dst.close()
+        src.close()
+    return tmp
+
+
+class ReadingsQuery:
+    """Filters shared by raw and aggregate exports."""
+
+    def __init__(
+        self,
+        probe_ids: Sequence[int] = (),
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        metrics: Sequence[str] = (),
+    ) -> None:
+        bad = [m for m in metrics if m not in METRICS]
+        if bad:
+            raise ValueError(f"Unsupported metric(s): {', '.join(bad)}")
+        self.probe_ids = [int(p) for p in probe_ids]
+        self.since = since
+        self.until = until
+        self.metrics = list(metrics) or list(METRICS)
+
+    def where(self) -> Tuple[str, List[Any]]:
+        clauses: List[str] = []
+        params: List[Any] = []
+        if self.probe_ids:
+            clauses.append(f"probe_id IN ({','.join('?' * len(self.probe_ids))})")
+            params.extend(self.probe_ids)
+        if self.since:
+            clauses.append("ts >= ?")
+            params.append(self.since)
+        if self.until:
+            clauses.append("ts < ?")
+            params.append(self.until)
+        clauses.append("(" + " OR ".join(f"{m} IS NOT NULL" for m in self.metrics) + ")")
+        return " AND ".join(clauses), params
+
+
+def iter_raw(conn: sqlite3.Connection, q: ReadingsQuery, chunk_size: int) -> Iterator[Tuple[List[str], List[tuple]]]:
+    """Yield (columns, rows) chunks of raw readings in id order."""
+    columns = list(BASE_COLUMNS) + q.metrics + list(EXTRA_COLUMNS)
+    where, params = q.where()
+    sql = f"SELECT {', '.join(columns)} FROM readings WHERE id > ? AND {where} ORDER BY id LIMIT ?"
+    last_id = 0
+    while True:
+        rows = conn.execute(sql, [last_id, *params, chunk_size]).fetchall()
+        if not rows:
+            return
+        yield columns, rows
+        last_id = rows[-1][0]
+        if len(rows) < chunk_size:
+            return
+
+
+def iter_aggregate(
+    conn: sqlite3.Connection, q: ReadingsQuery, bucket: str, chunk_size: int
+) -> Iterator[Tuple[List[str], List[tuple]]]:
+    """Yield (columns, rows) chunks of per-probe, per-bucket count/min/max/avg."""
+    fmt = BUCKETS[bucket]
+    columns = ["probe_id", "bucket"]
+    selects = ["probe_id", f"strftime('{fmt}', ts) AS bucket"]
+    for m in q.metrics:
+        columns += [f"{m}_count", f"{m}_min", f"{m}_max", f"{m}_avg"]
+        selects += [f"COUNT({m})", f"MIN({m})", f"MAX({m})", f"AVG({m})"]
+    where, params = q.where()
+    cur = conn.execute(
+        f"SELECT {', '.join(selects)} FROM readings WHERE {where} GROUP BY probe_id, bucket ORDER BY probe_id, bucket",
+        params,
+    )
+    while True:
+        rows = cur.fetchmany(chunk_size)
+        if not rows:
+            return
+        yield columns, rows
+
+
+# ------------------- sinks -------------------
+
+class _Sink(ABC):
+    @abstractmethod
+    def write(self, columns: List[str], rows: List[tuple]) -> None:
+        """Append one chunk of rows; `columns` is the same for every chunk."""
+
+    def close(self) -> None:
+        pass
+
+
+class _CsvSink(_Sink):
+    def __init__(self, path: Path) -> None:
+        self._f = open(path, "w", newline="", encoding="utf-8")
+        self._w = csv.writer(self._f)
+        self._header = False
+
+    def write(self, columns, rows):
+        if not self._header:
+            self._w.writerow(columns)
+            self._header = True
+        self._w.writerows(rows)
+
+    def close(self):
+        self._f.close()
+
+
+class _JsonlSink(_Sink):
+    def __init__(self, path: Path) -> None:
+        self._f = open(path, "w", encoding="utf-8")
+
+    def write(self, columns, rows):
+        self._f.writelines(json.dumps(dict(zip(columns, r)), separators=(",", ":")) + "\n" for r in rows)
+
+    def close(self):
+        self._f.close()
+
+
+class _ArrowSink(_Sink):
+    """Parquet or Arrow IPC via pyarrow (optional dependency), one record batch per chunk."""
+
+    def __init__(self, path: Path, fmt: str) -> None:
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError(f"{fmt} export requires pyarrow (pip install pyarrow)") from None
+        self._pa, self._pq = pa, pq
+        self._path, self._fmt = path, fmt
+        self._writer = None
+        self._schema_obj = None
+
+    def _schema(self, columns: List[str]):
+        pa = self._pa
+        types = {"id": pa.int64(), "probe_id": pa.int64(), "seq": pa.int64(), "calibration_id": pa.int64(),
+                 "moisture_raw": pa.int64(), "ts": pa.string(), "bucket": pa.string()}
+        return pa.schema([(c, pa.int64() if c.endswith("_count") else types.get(c, pa.float64())) for c in columns])
+
+    def write(self, columns, rows):
+        pa = self._pa
+        if self._writer is None:
+            self._schema_obj = self._schema(columns)
+            if self._fmt == "parquet":
+                self._writer = self._pq.ParquetWriter(str(self._path), self._schema_obj)
+            else:
+                self._writer = pa.ipc.new_file(str(self._path), self._schema_obj)
+        schema = self._schema_obj
+        arrays = [pa.array([r[i] for r in rows], type=schema.field(i).type) for i in range(len(columns))]
+        batch = pa.RecordBatch.from_arrays(arrays, schema=schema)
+        if self._fmt == "parquet":
+            self._writer.write_batch(batch)
+        else:
+            self._writer.write(batch)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+def open_sink(path: Path, fmt: str) -> _Sink:
+    if fmt == "csv":
+        return _CsvSink(path)
+    if fmt == "jsonl":
+        return _JsonlSink(path)
+    if fmt in ("parquet", "arrow"):
+        return _ArrowSink(path, fmt)
+    raise ValueError(f"Unsupported format: {fmt}")
+
+
+# ------------------- driver -------------------
+
+def export_readings(
+    db_path: str,
+    out: str,
+    fmt: Optional[str] = None,
+    query: Optional[ReadingsQuery] = None,
+    aggregate: Optional[str] = None,
+    chunk_size: int = 10000,
+    copy: bool = False,
+) -> int:
+    """Export readings (or aggregates) to `out`. Returns the number of rows written."""
+    out_path = Path(out)
+    fmt = fmt or out_path.suffix.lstrip(".").lower()
+    if fmt not in FORMATS:
+        raise ValueError(f"Cannot infer format from {out!r}; use one of {', '.join(FORMATS)}")
+    if aggregate is not None and aggregate not in BUCKETS:
+        raise ValueError(f"Unsupported aggregate bucket: {aggregate!r}")
+    query = query or ReadingsQuery()
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+
+    snapshot_path = copy_snapshot(db_path, dest_dir=str(out_path.parent)) if copy else None
+    conn: Optional[sqlite3.Connection] = None
+    sink: Optional[_Sink] = None
+    written = 0
+    try:
+        conn = open_snapshot(snapshot_path or db_path)
+        sink = open_sink(out_path, fmt)  # may fail, e.g. pyarrow missing for parquet/arrow
+        chunks = (iter_aggregate(conn, query, aggregate, chunk_size) if aggregate
+                  else iter_raw(conn, query, chunk_size))
+        for columns, rows in chunks:
+            sink.write(columns, rows)
+            written += len(rows)
+    finally:
+        if sink is not None:
+            sink.close()
+        if conn is not None:
+            conn.execute("COMMIT")
+            conn.close()
+        if snapshot_path:
+            os.unlink(snapshot_path)
+    return written
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description="Stream plant readings to CSV/JSONL/Parquet/Arrow")
+    ap.add_argument("--db", default="data/plant.db")
+    ap.add_argument("--out", required=True, help="Output file; format inferred from extension")
+    ap.add_argument("--format", choices=FORMATS, default=None)
+    ap.add_argument("--probe", type=int, action="append", default=[], help="Probe id (repeatable)")
+    ap.add_argument("--since", default=None, help="Inclusive 'YYYY-MM-DD HH:MM:SS' (UTC)")
+    ap.add_argument("--until", default=None, help="Exclusive 'YYYY-MM-DD HH:MM:SS' (UTC)")
+    ap.add_argument("--metric", action="append", choices=METRICS, default=[], help="Metric column (repeatable)")
+    ap.add_argument("--aggregate", choices=sorted(BUCKETS), default=None, help="Export per-bucket stats instead of raw rows")
+    ap.add_argument("--chunk-size", type=int, default=10000, help="Rows fetched per round trip")
+    ap.add_argument("--copy", action="store_true", help="Export from an online backup copy instead of the live file")
+    return ap.parse_args()
+
+
+def main():
+    args = parse_args()
+    q = ReadingsQuery(probe_ids=args.probe, since=args.since, until=args.until, metrics=args.metric)
+    n = export_readings(
+        args.db, args.out, fmt=args.format, query=q, aggregate=args.aggregate,
+        chunk_size=max(1, args.chunk_size), copy=args.copy,
+    )
+    print(f"Wrote {n} rows to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
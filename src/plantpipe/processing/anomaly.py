@@ -0,0 +1,355 @@
+# src/plantpipe/processing/anomaly.py
+
+"""
+Anomaly detection for sensor faults and plant stress.
+
+Streaming (AnomalyStage, on the writer thread): per probe and metric an EWMA
+mean/variance, a run-length counter and, for moisture, a monotonic max-deque
+over the drop window. Each update is a handful of float ops, so scoring adds
+microseconds per reading and allocates nothing on the hot path.
+
+    spike          |x - ewma| > z * ewm_std after `warmup` samples
+    stuck_sensor   the same value `stuck_samples` times in a row
+    moisture_drop  moisture_pct fell `drop_pct` points below its max over the
+                   last `drop_window_seconds` (e.g. the 40% -> 25% crash)
+
+Batch (score_history / CLI): the same detectors over a stored range with NumPy,
+using a trailing rolling mean/std in place of the EWMA. numpy is only imported
+here, so ingest does not need it.
+
+    python -m plantpipe.processing.anomaly --probe 1 --since "2026-10-01 00:00:00"
+    python -m plantpipe.processing.anomaly --probe 1 --since ... --write   # store as alerts
+"""
+
+import argparse
+import math
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+from plantpipe.common import epoch
+from plantpipe.processing.stage import Payload, Stage
+
+SPIKE_METRICS = ("lux", "rh", "temp_c", "moisture_pct")
+ALERT_TYPES = ("spike", "stuck_sensor", "moisture_drop")
+
+
+def moisture_pct(raw: int, raw_dry: int, raw_wet: int) -> Optional[float]:
+    """Same mapping as the readings trigger: 0% at raw_dry, 100% at raw_wet, clamped."""
+    if raw_dry == raw_wet:
+        return None
+    return float(min(100, max(0, round(100.0 * (raw_dry - raw) / (raw_dry - raw_wet)))))
+
+
+class _Ewma:
+    __slots__ = ("n", "mean", "var")
+
+    def __init__(self) -> None:
+        self.n = 0
+        self.mean = 0.0
+        self.var = 0.0
+
+
+class _Run:
+    __slots__ = ("value", "count")
+
+    def __init__(self) -> None:
+        self.value: Any = None
+        self.count = 0
+
+
+class AnomalyStage(Stage):
+    """Scores every reading in passing (never drops any) and queues alerts for the writer."""
+
+    name = "anomaly"
+
+    def __init__(
+        self,
+        raw_range: Callable[[int], Optional[Tuple[int, int]]],
+        z_threshold: float = 6.0,
+        alpha: float = 0.05,
+        warmup: int = 30,
+        stuck_samples: int = 900,
+        stuck_metrics: Sequence[str] = ("moisture_raw",),
+        drop_pct: float = 10.0,
+        drop_window_seconds: float = 1800.0,
+        cooldown_seconds: float = 3600.0,
+        cache_size: int = 1024,
+        max_pending: int = 10000,
+    ) -> None:
+        super().__init__()
+        self.raw_range = raw_range
+        self.z_threshold = float(z_threshold)
+        self.alpha = float(alpha)
+        self.warmup = max(2, int(warmup))
+        self.stuck_samples = max(2, int(stuck_samples))
+        self.stuck_metrics = tuple(stuck_metrics)
+        self.drop_pct = float(drop_pct)
+        self.drop_window = float(drop_window_seconds)
+        self.cooldown = float(cooldown_seconds)
+        self.cache_size = max(1, int(cache_size))
+        self.max_pending = max(1, int(max_pending))
+
+        self._ewma: Dict[Tuple[int, str], _Ewma] = {}
+        self._runs: Dict[Tuple[int, str], _Run] = {}
+        self._moist_max: Dict[int, Deque[Tuple[float, float]]] = {}  # (t, pct), pct decreasing
+        self._last_alert: Dict[Tuple[int, str, str], float] = {}
+        self._ranges: "OrderedDict[int, Optional[Tuple[int, int]]]" = OrderedDict()
+        self._alerts: List[Dict[str, Any]] = []
+
+    # ---------- helpers ----------
+
+    def _pct(self, payload: Payload) -> Optional[float]:
+        raw, cal_id = payload.get("moisture_raw"), payload.get("calibration_id")
+        if raw is None or cal_id is None:
+            return None
+        rng = self._ranges.get(cal_id)
+        if rng is None and cal_id not in self._ranges:
+            rng = self.raw_range(cal_id)
+            self._ranges[cal_id] = rng
+            while len(self._ranges) > self.cache_size:
+                self._ranges.popitem(last=False)
+        return moisture_pct(raw, *rng) if rng else None
+
+    def _alert(self, pid: int, kind: str, metric: str, t: float, ts: str, message: str) -> None:
+        key = (pid, kind, metric)
+        last = self._last_alert.get(key)
+        if last is not None and t - last < self.cooldown:
+            return
+        self._last_alert[key] = t
+        self.count(pid, kind)
+        if len(self._alerts) < self.max_pending:
+            self._alerts.append({"probe_id": pid, "type": kind, "timestamp": ts, "message": message})
+
+    def _score(self, pid: int, metric: str, x: float, t: float, ts: str) -> None:
+        key = (pid, metric)
+        e = self._ewma.get(key)
+        if e is None:
+            e = self._ewma[key] = _Ewma()
+        if e.n >= self.warmup and e.var > 0.0:
+            sd = math.sqrt(e.var)
+            z = (x - e.mean) / sd
+            if abs(z) > self.z_threshold:
+                self._alert(pid, "spike", metric, t, ts,
+                            f"{metric} spike: {x:g} vs EWMA {e.mean:.3g} (z={z:+.1f})")
+                # winsorize so one outlier does not drag the baseline along
+                x = e.mean + math.copysign(self.z_threshold * sd, z)
+        if e.n == 0:
+            e.mean = x
+        else:
+            d = x - e.mean
+            incr = self.alpha * d
+            e.mean += incr
+            e.var = (1.0 - self.alpha) * (e.var + d * incr)
+        e.n += 1
+
+    def _stuck(self, pid: int, metric: str, x: Any, t: float, ts: str) -> None:
+        key = (pid, metric)
+        r = self._runs.get(key)
+        if r is None:
+            r = self._runs[key] = _Run()
+        if x == r.value:
+            r.count += 1
+            if r.count == self.stuck_samples:
+                self._alert(pid, "stuck_sensor", metric, t, ts,
+                            f"{metric} stuck at {x:g} for {r.count} readings")
+        else:
+            r.value, r.count = x, 1
+
+    def _drop(self, pid: int, pct: float, t: float, ts: str) -> None:
+        dq = self._moist_max.get(pid)
+        if dq is None:
+            dq = self._moist_max[pid] = deque()
+        while dq and dq[-1][1] <= pct:
+            dq.pop()
+        dq.append((t, pct))
+        while dq[0][0] < t - self.drop_window:
+            dq.popleft()
+        peak = dq[0][1]
+        if peak - pct >= self.drop_pct:
+            self._alert(pid, "moisture_drop", "moisture_pct", t, ts,
+                        f"moisture dropped {peak:g}% -> {pct:g}% within {self.drop_window / 60:g} min")
+
+    # ---------- stage ----------
+
+    def process(self, payload: Payload) -> List[Payload]:
+        pid = payload["probe_id"]
+        ts = payload["ts"]
+        t = epoch(ts)
+        pct = self._pct(payload)
+        for m in SPIKE_METRICS:
+            x = pct if m == "moisture_pct" else payload.get(m)
+            if x is not None:
+                self._score(pid, m, float(x), t, ts)
+        for m in self.stuck_metrics:
+            x = payload.get(m)
+            if x is not None:
+                self._stuck(pid, m, x, t, ts)
+        if pct is not None:
+            self._drop(pid, pct, t, ts)
+        return [payload]
+
+    def drain_alerts(self) -> List[Dict[str, Any]]:
+        out, self._alerts = self._alerts, []
+        return out
+
+    def requeue_alerts(self, alerts: List[Dict[str, Any]]) -> None:
+        """Put back alerts the DB refused (e.g. during a migration) for the next attempt."""
+        self._alerts = (alerts + self._alerts)[: self.max_pending]
+
+
+# ------------------- batch scoring -------------------
+
+def score_history(
+    ts: Sequence[str],
+    values: Sequence[float],
+    metric: str,
+    window: int = 60,
+    z_threshold: float = 6.0,
+    stuck_samples: int = 900,
+    drop_pct: float = 10.0,
+    drop_window_seconds: float = 1800.0,
+) -> List[Dict[str, Any]]:
+    """
+    Vectorized detectors over one metric's stored history (oldest first).
+
+    Returns one finding per flagged point ({ts, value, type, score}); unlike the
+    streaming stage there is no cooldown, so callers see every flagged sample.
+    """
+    try:
+        import numpy as np
+    except ImportError:
+        raise RuntimeError("batch anomaly scoring requires numpy (pip install numpy)") from None
+
+    x = np.asarray(values, dtype=np.float64)
+    n = x.size
+    found: List[Dict[str, Any]] = []
+    if n == 0:
+        return found
+
+    # spikes: z against the trailing `window` samples (current sample excluded)
+    if n > window:
+        idx = np.arange(window, n)
+        mean, sd = _rolling_mean_std(x[:-1], window)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            z = np.where(sd > 0, (x[idx] - mean) / sd, 0.0)
+        for i in np.nonzero(np.abs(z) > z_threshold)[0]:
+            found.append({"i": int(idx[i]), "type": "spike", "score": float(z[i])})
+
+    # stuck: run lengths of equal consecutive values; flag where a run reaches stuck_samples
+    if n >= stuck_samples:
+        change = np.concatenate(([True], x[1:] != x[:-1]))
+        run_id = np.cumsum(change)
+        starts = np.nonzero(change)[0]
+        run_pos = np.arange(n) - starts[run_id - 1] + 1
+        for i in np.nonzero(run_pos == stuck_samples)[0]:
+            found.append({"i": int(i), "type": "stuck_sensor", "score": float(stuck_samples)})
+
+    # moisture drop: trailing max over the drop window (in samples, from the median spacing)
+    if metric == "moisture_pct" and n > 1:
+        t = np.array([epoch(s) for s in ts], dtype=np.float64)
+        step = float(np.median(np.diff(t))) or 1.0
+        w = max(1, min(n, int(round(drop_window_seconds / step))))
+        drop = _trailing_max(x, w) - x
+        flagged = drop >= drop_pct
+        # report the first sample of each drop episode
+        first = flagged & ~np.concatenate(([False], flagged[:-1]))
+        for i in np.nonzero(first)[0]:
+            found.append({"i": int(i), "type": "moisture_drop", "score": float(drop[i])})
+
+    found.sort(key=lambda f: f["i"])
+    return [{"ts": ts[f["i"]], "value": float(x[f["i"]]), "type": f["type"], "score": round(f["score"], 3)}
+            for f in found]
+
+
+def _rolling_mean_std(x, window: int):
+    """
+    Mean and population std of every `window`-sample slice of x. Two passes
+    over each slice's offsets from its first sample: no cancellation against
+    large sums, and a flat slice has std exactly 0. Processed in blocks of
+    slices to bound the temporaries to ~1M floats.
+    """
+    import numpy as np
+    from numpy.lib.stride_tricks import sliding_window_view
+
+    view = sliding_window_view(x, window)
+    mean = np.empty(len(view))
+    sd = np.empty(len(view))
+    rows = max(1, (1 << 20) // window)
+    for lo in range(0, len(view), rows):
+        block = view[lo:lo + rows]
+        d = block - block[:, :1]
+        m = d.mean(axis=1)
+        mean[lo:lo + rows] = block[:, 0] + m
+        sd[lo:lo + rows] = np.sqrt(np.square(d - m[:, None]).mean(axis=1))
+    return mean, sd
+
+
+def _trailing_max(x, w: int):
+    """
+    max(x[i-w+1 .. i]) for every i in O(n): prefix and suffix maxima within
+    blocks of w samples; each window spans at most two blocks.
+    """
+    import numpy as np
+
+    n = x.size
+    total = -(-(n + w - 1) // w) * w
+    padded = np.full(total, -np.inf)
+    padded[w - 1:w - 1 + n] = x
+    blocks = padded.reshape(-1, w)
+    prefix = np.maximum.accumulate(blocks, axis=1).ravel()
+    suffix = np.maximum.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].ravel()
+    return np.maximum(suffix[:n], prefix[w - 1:w - 1 + n])
+
+
+def _describe(metric: str, f: Dict[str, Any]) -> str:
+    if f["type"] == "spike":
+        return f"{metric} spike: {f['value']:g} (z={f['score']:+.1f}, backfill)"
+    if f["type"] == "stuck_sensor":
+        return f"{metric} stuck at {f['value']:g} for {int(f['score'])} readings (backfill)"
+    return f"moisture dropped {f['score']:g} points to {f['value']:g}% (backfill)"
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description="Score stored readings for anomalies with NumPy")
+    ap.add_argument("--db", default="data/plant.db")
+    ap.add_argument("--schema", default="sql/001_init.sql")
+    ap.add_argument("--probe", type=int, required=True)
+    ap.add_argument("--metric", action="append", choices=SPIKE_METRICS + ("moisture_raw",), default=[],
+                    help="Metric to score (repeatable; default: all)")
+    ap.add_argument("--since", default=None, help="Inclusive 'YYYY-MM-DD HH:MM:SS' (UTC); default 7 days ago")
+    ap.add_argument("--until", default=None, help="Exclusive 'YYYY-MM-DD HH:MM:SS' (UTC)")
+    ap.add_argument("--window", type=int, default=60, help="Trailing samples for the rolling z-score")
+    ap.add_argument("--z", type=float, default=6.0)
+    ap.add_argument("--write", action="store_true", help="Store findings in probe_alerts")
+    return ap.parse_args()
+
+
+def main():
+    from plantpipe.storage.database import PlantDBWrapper
+
+    args = parse_args()
+    since = args.since or (datetime.now(timezone.utc) - timedelta(days=7)).strftime("%Y-%m-%d %H:%M:%S")
+    db = PlantDBWrapper(args.db, args.schema)
+    alerts: List[Dict[str, Any]] = []
+    for metric in args.metric or SPIKE_METRICS:
+        rows = db.get_metric_history(args.probe, metric, since, args.until)
+        findings = score_history([r[0] for r in rows], [r[1] for r in rows], metric,
+                                 window=args.window, z_threshold=args.z)
+        for f in findings:
+            print(f"{f['ts']}  {metric:<12} {f['type']:<14} value={f['value']:g} score={f['score']:g}")
+            alerts.append({"probe_id": args.probe, "type": f["type"], "timestamp": f["ts"],
+                           "message": _describe(metric, f)})
+    if args.write and alerts:
+        # spike/stuck_sensor/moisture_drop need the probe_alerts rebuild of migration 003
+        if not db.finish_migrations():
+            print("Storing alerts failed: schema migration still pending")
+        elif db.insert_alerts(alerts):
+            print(f"Stored {len(alerts)} alerts")
+        else:
+            print("Storing alerts failed")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
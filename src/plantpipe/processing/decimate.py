@@ -0,0 +1,61 @@
+# src/plantpipe/processing/decimate.py
+
+from typing import Any, Dict, List, Optional
+
+from plantpipe.common import epoch
+from plantpipe.processing.stage import Payload, Stage
+
+METRICS = ("lux", "rh", "temp_c", "moisture_raw")
+
+
+class DeadbandStage(Stage):
+    """
+    Per-probe deadband (change-threshold) compression.
+
+    A reading is stored only when some metric moved more than its tolerance
+    away from the last *stored* value, a metric appeared/disappeared, the
+    calibration changed, or `heartbeat_seconds` passed since the last stored
+    row. Comparing against the last stored value (not the previous sample)
+    means slow drifts are still captured once they add up to the tolerance.
+    Counters: decimate.kept / decimate.dropped per probe.
+    """
+
+    name = "decimate"
+
+    def __init__(self, tolerances: Dict[str, float], heartbeat_seconds: float = 300.0) -> None:
+        super().__init__()
+        self.tolerances = {m: float(tolerances.get(m, 0.0)) for m in METRICS}
+        self.heartbeat_seconds = float(heartbeat_seconds)
+        self._last: Dict[int, Dict[str, Any]] = {}
+        self._last_ts: Dict[int, float] = {}
+
+    def _changed(self, prev: Dict[str, Any], payload: Payload) -> bool:
+        if prev.get("calibration_id") != payload.get("calibration_id"):
+            return True
+        for m in METRICS:
+            old, new = prev.get(m), payload.get(m)
+            if (old is None) != (new is None):
+                return True
+            if new is not None and abs(new - old) > self.tolerances[m]:
+                return True
+        return False
+
+    def process(self, payload: Payload) -> List[Payload]:
+        pid = payload["probe_id"]
+        now = epoch(payload["ts"])
+        prev: Optional[Dict[str, Any]] = self._last.get(pid)
+
+        keep = (
+            prev is None
+            or now - self._last_ts[pid] >= self.heartbeat_seconds
+            or now < self._last_ts[pid]  # clock went backwards: resync
+            or self._changed(prev, payload)
+        )
+        if not keep:
+            self.count(pid, "dropped")
+            return []
+
+        self._last[pid] = {m: payload.get(m) for m in METRICS + ("calibration_id",)}
+        self._last_ts[pid] = now
+        self.count(pid, "kept")
+        return [payload]
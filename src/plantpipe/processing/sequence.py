@@ -0,0 +1,189 @@
+# src/plantpipe/processing/sequence.py
+
+import heapq
+import time
+from collections import deque
+from typing import Deque, Dict, List, Mapping, Optional, Set, Tuple
+
+from plantpipe.processing.stage import Payload, Stage
+
+
+class _ProbeSeq:
+    __slots__ = ("expected", "held", "held_seqs", "recent", "recent_order", "skipped")
+
+    def __init__(self, recent_size: int) -> None:
+        self.expected: Optional[int] = None                # next seq to release
+        self.held: List[Tuple[int, float, int, Payload]] = []  # heap of (seq, arrived, tiebreak, payload)
+        self.held_seqs: Set[int] = set()
+        self.recent: Set[int] = set()                      # recently released seqs (dedupe)
+        self.recent_order: Deque[int] = deque(maxlen=recent_size)
+        self.skipped: Set[int] = set()                     # seqs counted as gap, still within the window
+
+    def remember(self, seq: int) -> None:
+        if len(self.recent_order) == self.recent_order.maxlen:
+            self.recent.discard(self.recent_order[0])
+        self.recent_order.append(seq)
+        self.recent.add(seq)
+
+
+class SequenceStage(Stage):
+    """
+    Per-probe seq tracking: reorder, dedupe, and gap/reset detection.
+
+    Readings that arrive ahead of the next expected seq are held (at most
+    `window` per probe, for at most `max_wait` seconds) so a late predecessor
+    can be released first. When the wait runs out the missing seqs are counted
+    as a gap and the held readings are released. A seq already released or
+    held is a duplicate and dropped here, before it can hit
+    ux_readings_probe_ts_seq. A seq that jumps back to near zero (the
+    firmware counter starts from 0) is a device restart and re-bases the
+    tracker, even after an uptime shorter than the window where that seq
+    was already seen; "near zero" means below `window` and closer to zero
+    than to the expected seq. Any other seq more than `window` behind is a
+    stale replay and dropped.
+
+    Counters: received, duplicate, stale, gap, late (a gap seq that showed up
+    after all), out_of_order, reset, reordered (released from the hold buffer).
+    Readings without a seq pass straight through (counted as unsequenced).
+    """
+
+    name = "sequence"
+
+    def __init__(self, window: int = 64, max_wait: float = 5.0) -> None:
+        super().__init__()
+        self.window = max(1, int(window))
+        self.max_wait = max(0.0, float(max_wait))
+        self._probes: Dict[int, _ProbeSeq] = {}
+        self._pending: Set[int] = set()  # probes with held readings
+        self._tiebreak = 0
+
+    def _state(self, probe_id: int) -> _ProbeSeq:
+        st = self._probes.get(probe_id)
+        if st is None:
+            st = _ProbeSeq(recent_size=self.window * 2)
+            self._probes[probe_id] = st
+        return st
+
+    def _release_ready(self, pid: int, st: _ProbeSeq, out: List[Payload]) -> None:
+        while st.held and st.held[0][0] == st.expected:
+            seq, _, _, payload = heapq.heappop(st.held)
+            st.held_seqs.discard(seq)
+            st.remember(seq)
+            st.expected = seq + 1
+            self.count(pid, "reordered")
+            out.append(payload)
+        if not st.held:
+            self._pending.discard(pid)
+
+    def _skip_to_oldest(self, pid: int, st: _ProbeSeq, out: List[Payload]) -> None:
+        """Give up on the missing seqs before the oldest held reading."""
+        seq = st.held[0][0]
+        self.count(pid, "gap", seq - st.expected)
+        st.skipped = {s for s in st.skipped if s >= seq - self.window}
+        st.skipped.update(range(max(st.expected, seq - self.window), seq))
+        st.expected = seq
+        self._release_ready(pid, st, out)
+
+    def _release_all(self, pid: int, st: _ProbeSeq, out: List[Payload]) -> None:
+        while st.held:
+            self._skip_to_oldest(pid, st, out)
+
+    def _is_restart(self, st: _ProbeSeq, seq: int) -> bool:
+        back = st.expected - seq
+        if back <= 0 or seq >= self.window:
+            return False
+        if back > self.window:
+            return True
+        # short uptime: the old run's seqs are still in `recent`, so a repeat would look
+        # like a duplicate. Closer to zero than to `expected` means a new run (a late
+        # gap seq is not one). A misread true duplicate still meets ux_readings_probe_ts_seq.
+        return seq < back and seq not in st.skipped and seq not in st.held_seqs
+
+    def process(self, payload: Payload) -> List[Payload]:
+        pid = payload["probe_id"]
+        seq = payload.get("seq")
+        if seq is None:
+            self.count(pid, "unsequenced")
+            return [payload]
+
+        st = self._state(pid)
+        self.count(pid, "received")
+        out: List[Payload] = []
+
+        if st.expected is None:
+            st.expected = seq + 1
+            st.remember(seq)
+            return [payload]
+
+        if self._is_restart(st, seq):
+            # counter jumped back to near zero: device restarted
+            self.count(pid, "reset")
+            self._release_all(pid, st, out)
+            st.recent.clear()
+            st.recent_order.clear()
+            st.skipped.clear()
+            st.expected = seq + 1
+            st.remember(seq)
+            out.append(payload)
+            return out
+
+        if st.expected - seq > self.window:
+            # far behind but not a restarted counter: a replay/duplicate we no longer track
+            self.count(pid, "stale")
+            return []
+
+        if seq in st.recent or seq in st.held_seqs:
+            self.count(pid, "duplicate")
+            return []
+
+        if seq < st.expected:
+            # arrived after we stopped waiting for it (or before tracking started): store it anyway
+            if seq in st.skipped:
+                st.skipped.discard(seq)
+                self.count(pid, "late")
+            else:
+                self.count(pid, "out_of_order")
+            st.remember(seq)
+            return [payload]
+
+        if seq == st.expected:
+            st.expected = seq + 1
+            st.remember(seq)
+            out.append(payload)
+            self._release_ready(pid, st, out)
+            return out
+
+        # ahead of expected: hold until the gap fills, the wait expires or the window is full
+        self._tiebreak += 1
+        heapq.heappush(st.held, (seq, time.monotonic(), self._tiebreak, payload))
+        st.held_seqs.add(seq)
+        self._pending.add(pid)
+        while len(st.held) > self.window:
+            self._skip_to_oldest(pid, st, out)
+        return out
+
+    def flush(self, force: bool = False) -> List[Payload]:
+        if not self._pending:
+            return []
+        out: List[Payload] = []
+        cutoff = time.monotonic() - self.max_wait
+        for pid in list(self._pending):
+            st = self._probes[pid]
+            if force:
+                self._release_all(pid, st, out)
+                continue
+            while st.held and min(h[1] for h in st.held) <= cutoff:
+                self._skip_to_oldest(pid, st, out)
+        return out
+
+
+def packet_loss(counters: Mapping[str, int]) -> Dict[str, Optional[float]]:
+    """Loss summary from one probe's sequence counters (running totals)."""
+    delivered = counters.get("received", 0) - counters.get("duplicate", 0) - counters.get("stale", 0)
+    lost = max(0, counters.get("gap", 0) - counters.get("late", 0))
+    expected = delivered + lost
+    return {
+        "delivered": delivered,
+        "lost": lost,
+        "loss_pct": round(100.0 * lost / expected, 3) if expected else None,
+    }
@@ -0,0 +1,52 @@
+# src/plantpipe/processing/stage.py
+
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+Payload = Dict[str, Any]
+CounterKey = Tuple[int, str]  # (probe_id, counter name)
+
+
+class Stage:
+    """
+    One step of the writer-side processing chain.
+
+    Stages run on the single writer thread between the probe readers and the
+    batch insert, so they keep plain per-probe state without locks. A stage
+    may drop a payload (return []), pass it through, or hold it and release it
+    later from flush().
+    """
+
+    name = "stage"
+
+    def __init__(self) -> None:
+        self._counters: Dict[CounterKey, int] = defaultdict(int)
+
+    def process(self, payload: Payload) -> List[Payload]:
+        return [payload]
+
+    def flush(self, force: bool = False) -> List[Payload]:
+        """Release held payloads that are due (all of them when force=True)."""
+        return []
+
+    def count(self, probe_id: int, counter: str, n: int = 1) -> None:
+        self._counters[(probe_id, counter)] += n
+
+    def drain_counters(self) -> Dict[CounterKey, int]:
+        """Counter increments since the last drain (persisted to probe_ingest_stats)."""
+        out = dict(self._counters)
+        self._counters.clear()
+        return out
+
+
+def run_chain(stages: Sequence[Stage], payloads: Iterable[Payload], flush: bool = False, force: bool = False) -> List[Payload]:
+    """Push payloads through every stage in order; with flush=True also drain each stage."""
+    batch = list(payloads)
+    for st in stages:
+        out: List[Payload] = []
+        for p in batch:
+            out.extend(st.process(p))
+        if flush:
+            out.extend(st.flush(force=force))
+        batch = out
+    return batch
@@ -1,9 +1,18 @@
+import hashlib
 import sqlite3
 import threading
 from pathlib import Path
 from datetime import datetime
 from typing import Any, Dict, Optional, Iterable, List, Tuple
 
+from plantpipe.storage.migrations import (
+    META_TABLE,
+    Migrator,
+    baseline_version,
+    load_migrations,
+    split_statements,
+)
+
 
 class PlantDBWrapper:
     """
@@ -11,34 +20,81 @@ class PlantDBWrapper:
 
     - Use self._get_conn() internally for all DB ops.
     - Public .connection() returns the calling thread's connection.
+    - Schema is versioned with PRAGMA user_version: db_schema is the baseline
+      and sibling sql/NNN_*.sql files are migrations (see storage/migrations.py).
     """
 
-    def __init__(self, path: str, db_schema: str) -> None:
+    def __init__(self, path: str, db_schema: str, read_only: bool = False) -> None:
         schema_path = Path(db_schema)
         if not schema_path.exists():
             raise FileNotFoundError(f"Schema file not found: {schema_path}")
         self._schema_sql = schema_path.read_text(encoding="utf-8")
+        self._baseline_version = baseline_version(schema_path)
+        self._migrations = load_migrations(schema_path.parent, self._baseline_version)
 
         target_path = Path(path)
         self.path: Path = target_path
         self._path_str = str(target_path)
+        self.read_only = read_only
 
         # thread-local holder
         self._local = threading.local()
+        self._migrator = Migrator(self.__new_conn, self._migrations)
+
+        if read_only:
+            # query-only replica of a DB owned by an ingest process: never create or migrate
+            if not target_path.exists():
+                raise FileNotFoundError(f"Database not found: {target_path}")
+            return
 
         # initialize DB file (create/verify schema) using a temporary bootstrap connection
-        if not target_path.exists():
+        fresh = not target_path.exists()
+        verified = True
+        if fresh:
             conn = self.__create_with_schema(self._path_str)
             conn.close()
         else:
-            if not self.__schemas_match(self._path_str):
-                _ = self.__rename_as_backup(target_path)
-                conn = self.__create_with_schema(self._path_str)
-                conn.close()
+            version, stored_fp, disk_digest = self.__read_schema_state(self._path_str)
+            if version == 0:
+                # unversioned file: adopt it if it is exactly the baseline, else start fresh
+                if self.__schemas_match(self._path_str, self._baseline_version, exact=True):
+                    self.__stamp_baseline(self._path_str)
+                else:
+                    _ = self.__rename_as_backup(target_path)
+                    conn = self.__create_with_schema(self._path_str)
+                    conn.close()
+                    fresh = True
+            elif stored_fp != self.__fingerprint(version, disk_digest):
+                # full in-memory replay only when sources or the on-disk schema changed
+                verified = self.__schemas_match(self._path_str, version, exact=False)
+                if not verified:
+                    print(f"Warning: schema of {target_path} differs from migrations up to version {version}")
+
+        conn = self.__new_conn()
+        try:
+            if fresh:
+                self._migrator.apply_all(conn)  # empty tables: online steps are instant
+            else:
+                self._migrator.apply_sync(conn)
+            if verified:
+                self.__store_fingerprint(conn)
+        finally:
+            conn.close()
 
     # ------------------- connection utilities -------------------
 
     def __new_conn(self) -> sqlite3.Connection:
+        if self.read_only:
+            conn = sqlite3.connect(
+                f"{self.path.resolve().as_uri()}?mode=ro",
+                uri=True,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA query_only = ON;")
+            conn.execute("PRAGMA busy_timeout=3000;")
+            return conn
         conn = sqlite3.connect(
             self._path_str,
             isolation_level=None,      # autocommit
@@ -69,6 +125,8 @@ class PlantDBWrapper:
         conn.execute("PRAGMA busy_timeout=3000;")
         try:
             conn.executescript(self._schema_sql)
+            Migrator.ensure_meta(conn)
+            conn.execute(f"PRAGMA user_version = {int(self._baseline_version)}")
         except Exception as e:
             print("Schema execution failed:", e)
             conn.close()
@@ -83,24 +141,86 @@ class PlantDBWrapper:
             FROM sqlite_master
             WHERE sql IS NOT NULL
               AND type IN ('table','index','trigger','view')
-        """).fetchall()
+              AND name <> ?
+        """, (META_TABLE,)).fetchall()
         return {(r[0], r[1]): r[2] for r in rows}
 
-    def __schemas_match(self, db_path_str: str) -> bool:
-        mem = sqlite3.connect(":memory:")
+    def __expected_snapshot(self, version: int):
+        """Replay the baseline plus schema steps of migrations <= version in memory."""
+        mem = sqlite3.connect(":memory:", isolation_level=None)
         try:
             mem.executescript(self._schema_sql)
-            expected = self.__snapshot(mem)
+            for mig in self._migrations:
+                if mig.version > version:
+                    break
+                for step in mig.steps:
+                    if step.mode != "chunked":  # chunked steps only move data
+                        for stmt in split_statements(step.sql):
+                            mem.execute(stmt)
+            return self.__snapshot(mem)
         finally:
             mem.close()
 
+    def __schemas_match(self, db_path_str: str, version: int, exact: bool) -> bool:
+        expected = self.__expected_snapshot(version)
+
         disk = sqlite3.connect(db_path_str)
         try:
             actual = self.__snapshot(disk)
         finally:
             disk.close()
 
-        return expected == actual
+        if exact:
+            return expected == actual
+        # objects from an in-progress migration may already exist on disk
+        return all(actual.get(k) == v for k, v in expected.items())
+
+    def __schema_digest(self, conn: sqlite3.Connection) -> str:
+        h = hashlib.sha256()
+        for key, sql in sorted(self.__snapshot(conn).items()):
+            h.update(f"{key[0]}\0{key[1]}\0{sql}\0".encode("utf-8"))
+        return h.hexdigest()
+
+    def __fingerprint(self, version: int, disk_digest: str) -> str:
+        """Hash of the schema sources up to `version` plus the on-disk sqlite_master digest."""
+        h = hashlib.sha256(self._schema_sql.encode("utf-8"))
+        for mig in self._migrations:
+            if mig.version <= version:
+                h.update(f"\0{mig.name}\0{mig.text}".encode("utf-8"))
+        return f"{version}:{h.hexdigest()}:{disk_digest}"
+
+    def __read_schema_state(self, db_path_str: str) -> Tuple[int, Optional[str], str]:
+        """(user_version, stored fingerprint, digest of sqlite_master) from one cheap connection."""
+        conn = sqlite3.connect(db_path_str)
+        try:
+            version = Migrator.user_version(conn)
+            stored = None
+            if conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (META_TABLE,)
+            ).fetchone():
+                row = conn.execute(f"SELECT value FROM {META_TABLE} WHERE key='schema.fingerprint'").fetchone()
+                stored = row[0] if row else None
+            return version, stored, self.__schema_digest(conn)
+        finally:
+            conn.close()
+
+    def __store_fingerprint(self, conn: sqlite3.Connection) -> None:
+        fp = self.__fingerprint(Migrator.user_version(conn), self.__schema_digest(conn))
+        row = conn.execute(f"SELECT value FROM {META_TABLE} WHERE key='schema.fingerprint'").fetchone()
+        if row is None or row[0] != fp:
+            conn.execute(
+                f"INSERT INTO {META_TABLE}(key, value) VALUES ('schema.fingerprint', ?) "
+                "ON CONFLICT(key) DO UPDATE SET value=excluded.value",
+                (fp,),
+            )
+
+    def __stamp_baseline(self, db_path_str: str) -> None:
+        conn = sqlite3.connect(db_path_str, isolation_level=None)
+        try:
+            Migrator.ensure_meta(conn)
+            conn.execute(f"PRAGMA user_version = {int(self._baseline_version)}")
+        finally:
+            conn.close()
 
     def __rename_as_backup(self, base: Path) -> Path:
         ts = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -108,6 +228,46 @@ class PlantDBWrapper:
         base.rename(backup_path)
         return backup_path
 
+    # ------------------- migrations -------------------
+
+    def schema_version(self) -> int:
+        return Migrator.user_version(self._get_conn())
+
+    def start_background_migrations(self) -> bool:
+        """Run index builds / chunked rewrites of pending migrations while ingest continues."""
+        if self.read_only:
+            return False
+        return self._migrator.start_background()
+
+    def migrations_pending(self) -> bool:
+        return bool(self._migrator.pending(self._get_conn()))
+
+    def finish_migrations(self) -> bool:
+        """
+        Apply every pending migration step in this thread, for tools that run
+        without the pipeline's background migrator. Returns False if the
+        database stayed locked (e.g. a pipeline is building an index): retry later.
+        """
+        if self.read_only:
+            return not self.migrations_pending()
+        conn = self._get_conn()
+        if not self._migrator.pending(conn):
+            return True
+        print("Applying pending schema migrations ...")
+        try:
+            self._migrator.apply_all(conn)
+        except sqlite3.OperationalError as e:
+            print(f"Schema migration deferred: {e}")
+            return False
+        print(f"Schema at version {Migrator.user_version(conn)}")
+        return True
+
+    def stop_background_migrations(self) -> None:
+        self._migrator.stop_background()
+
+    def migration_status(self) -> Dict[str, Any]:
+        return self._migrator.status(self._get_conn())
+
     # ------------------- small helpers -------------------
 
     def table_exists(self, name: str) -> bool:
@@ -160,10 +320,11 @@ class PlantDBWrapper:
 
     # ------------------- public: inserts -------------------
 
-    def insert_single_reading(self, payload: Dict[str, Any]) -> bool:
-        if not self.table_exists("readings"):
-            return False
+    def insert_single_reading(self, payload: Dict[str, Any], raise_errors: bool = False) -> bool:
+        """Insert one reading. With raise_errors, sqlite errors propagate so callers can classify them."""
         try:
+            if not self.table_exists("readings"):
+                return False
             row = self.__build_row(payload)
             self._get_conn().execute("""
                 INSERT INTO readings (ts, probe_id, lux, rh, temp_c, moisture_raw, seq, calibration_id)
@@ -171,17 +332,20 @@ class PlantDBWrapper:
             """, row)
             return True
         except Exception as e:
+            if raise_errors:
+                raise
             print(f"Error inserting reading: {e}")
             return False
 
-    def insert_batch_readings(self, payloads: Iterable[Dict[str, Any]]) -> bool:
-        if not self.table_exists("readings"):
-            return False
+    def insert_batch_readings(self, payloads: Iterable[Dict[str, Any]], raise_errors: bool = False) -> bool:
+        """Insert readings in one transaction (all or nothing). See insert_single_reading for raise_errors."""
+        conn = self._get_conn()
         try:
+            if not self.table_exists("readings"):
+                return False
             rows = [self.__build_row(p) for p in payloads]
             if not rows:
                 return True
-            conn = self._get_conn()
             conn.execute("BEGIN")
             conn.executemany(
                 """
@@ -193,10 +357,14 @@ class PlantDBWrapper:
             conn.execute("COMMIT")
             return True
         except Exception:
-            try:
-                self._get_conn().execute("ROLLBACK")
-            finally:
-                return False
+            if conn.in_transaction:
+                try:
+                    conn.execute("ROLLBACK")
+                except sqlite3.Error:
+                    pass
+            if raise_errors:
+                raise
+            return False
 
     def insert_alert(self, probe_id: int, alert_type: str, message: str) -> bool:
         if not self.table_exists("probe_alerts"):
@@ -211,6 +379,353 @@ class PlantDBWrapper:
             print(f"Error inserting alert: {e}")
             return False
 
+    def insert_alerts(self, alerts: Iterable[Dict[str, Any]]) -> bool:
+        """Insert many alerts ({probe_id, type, message[, timestamp]}) in one transaction."""
+        rows = [
+            (a["probe_id"], a["type"], a.get("timestamp"), a["message"])
+            for a in alerts
+        ]
+        if not rows:
+            return True
+        if not self.table_exists("probe_alerts"):
+            return False
+        conn = self._get_conn()
+        try:
+            conn.execute("BEGIN")
+            conn.executemany(
+                """
+                INSERT INTO probe_alerts (probe_id, type, timestamp, message)
+                VALUES (?, ?, COALESCE(?, strftime('%Y-%m-%d %H:%M:%S', 'now')), ?)
+                """,
+                rows,
+            )
+            conn.execute("COMMIT")
+            return True
+        except Exception as e:
+            if conn.in_transaction:
+                try:
+                    conn.execute("ROLLBACK")
+                except sqlite3.Error:
+                    pass
+            print(f"Error inserting alerts: {e}")
+            return False
+
+    # ------------------- retention -------------------
+
+    def delete_readings_before(self, ts: str, chunk_size: int = 5000) -> int:
+        """
+        Delete readings older than `ts` in chunks of `chunk_size` rows.
+
+        Each chunk is its own short transaction so ingest writers are never
+        locked out for the duration of a large purge. The newest row is always
+        kept: readings.id has no AUTOINCREMENT, so emptying the table would let
+        SQLite hand out old ids again and break id-based delta cursors.
+        """
+        if not self.__is_valid_iso_ts(ts) or not self.table_exists("readings"):
+            return 0
+        conn = self._get_conn()
+        total = 0
+        while True:
+            cur = conn.execute(
+                """
+                DELETE FROM readings
+                WHERE id IN (
+                    SELECT id FROM readings
+                    WHERE ts < ? AND id < (SELECT MAX(id) FROM readings)
+                    ORDER BY ts LIMIT ?
+                )
+                """,
+                (ts, int(chunk_size)),
+            )
+            deleted = cur.rowcount if cur.rowcount is not None else 0
+            total += deleted
+            if deleted < chunk_size:
+                return total
+
+    # ------------------- ingest stats -------------------
+
+    def add_ingest_counters(
+        self, stage: str, counts: Dict[Tuple[int, str], int], raise_errors: bool = False
+    ) -> bool:
+        """
+        Add {(probe_id, counter): n} increments to the running totals in probe_ingest_stats
+        (one transaction). raise_errors=True re-raises after rollback instead of returning False.
+        """
+        if not counts:
+            return True
+        if not self.table_exists("probe_ingest_stats"):
+            return False
+        conn = self._get_conn()
+        try:
+            conn.execute("BEGIN")
+            conn.executemany(
+                """
+                INSERT INTO probe_ingest_stats (probe_id, stage, counter, value)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(probe_id, stage, counter) DO UPDATE SET
+                  value = value + excluded.value,
+                  updated_at = strftime('%Y-%m-%d %H:%M:%S', 'now')
+                """,
+                [(pid, stage, counter, int(n)) for (pid, counter), n in counts.items() if n],
+            )
+            conn.execute("COMMIT")
+            return True
+        except Exception as e:
+            if conn.in_transaction:
+                try:
+                    conn.execute("ROLLBACK")
+                except sqlite3.Error:
+                    pass
+            if raise_errors:
+                raise
+            print(f"Error recording ingest counters: {e}")
+            return False
+
+    def get_ingest_stats(self, probe_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        if not self.table_exists("probe_ingest_stats"):
+            return []
+        query = "SELECT probe_id, stage, counter, value, updated_at FROM probe_ingest_stats"
+        params: Tuple[Any, ...] = ()
+        if probe_id is not None:
+            query += " WHERE probe_id = ?"
+            params = (probe_id,)
+        cur = self._get_conn().execute(query + " ORDER BY probe_id, stage, counter", params)
+        return [dict(row) for row in cur.fetchall()]
+
+    # ------------------- meta -------------------
+
+    def get_meta(self, prefix: str) -> Dict[str, str]:
+        """plantpipe_meta entries whose key starts with `prefix`."""
+        rows = self._get_conn().execute(
+            f"SELECT key, value FROM {META_TABLE} WHERE substr(key, 1, ?) = ?",
+            (len(prefix), prefix),
+        ).fetchall()
+        return {r["key"]: r["value"] for r in rows}
+
+    def set_meta(self, values: Dict[str, Any]) -> None:
+        """Upsert several plantpipe_meta entries in one transaction."""
+        conn = self._get_conn()
+        try:
+            conn.execute("BEGIN")
+            conn.executemany(
+                f"INSERT INTO {META_TABLE}(key, value) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value=excluded.value",
+                [(k, str(v)) for k, v in values.items()],
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+
+    # ------------------- multi-site sync -------------------
+
+    SYNC_SOURCES: Tuple[str, ...] = ("probe_calibrations", "readings", "probe_alerts")
+    # merged probes get id site_id * SYNC_PROBE_ID_BASE + edge probe id; local (firmware)
+    # probe ids must stay below it, so local readings can never land on a merged probe
+    SYNC_PROBE_ID_BASE = 1_000_000
+
+    def merge_sync_batch(
+        self, header: Dict[str, Any], rows: Dict[str, List[Dict[str, Any]]]
+    ) -> Dict[str, Any]:
+        """
+        Merge one edge batch (plantpipe.sync.batch) in a single transaction.
+
+        Edge probe and calibration ids are mapped to central ids (new probes are
+        labelled "<site>/<edge label>" and numbered in the site's own range, see
+        SYNC_PROBE_ID_BASE). Rows at or below the site's watermark
+        for their table are skipped and readings are INSERT OR IGNORE, so a
+        batch merged twice changes nothing. Returns {"status": ...} with
+        "merged", "duplicate" (nothing new), or "gap" (an earlier batch of
+        this site is still missing; nothing written) plus per-table counts.
+        A new node id of a known site (its database was recreated) takes over
+        from its first batch on; batches of a node it replaced raise ValueError.
+        sqlite errors propagate after rollback so the caller can retry or reject.
+        """
+        site, node_id = header["site"], header["node_id"]
+        after, upto = header["after"], header["upto"]
+        probe_labels = header.get("probes", {})
+        conn = self._get_conn()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT INTO sync_sites (name, node_id) VALUES (?, ?) ON CONFLICT(name) DO NOTHING",
+                (site, node_id),
+            )
+            site_row = conn.execute("SELECT id, node_id FROM sync_sites WHERE name = ?", (site,)).fetchone()
+            site_id = int(site_row["id"])
+            if site_row["node_id"] != node_id:
+                if conn.execute(
+                    "SELECT 1 FROM sync_retired_nodes WHERE site_id = ? AND node_id = ?", (site_id, node_id)
+                ).fetchone():
+                    raise ValueError(f"Batch {header['batch']} of site {site!r} comes from replaced node {node_id}")
+                if any(int(v) for v in after.values()):
+                    # not the first batch of a new node: its start has not arrived yet
+                    conn.execute("ROLLBACK")
+                    return {"status": "gap", "site": site, "batch": header["batch"]}
+                # edge database was recreated: its ids restart, old watermarks and calibration ids no longer apply
+                if site_row["node_id"]:
+                    conn.execute(
+                        "INSERT OR IGNORE INTO sync_retired_nodes (site_id, node_id) VALUES (?, ?)",
+                        (site_id, site_row["node_id"]),
+                    )
+                conn.execute("DELETE FROM sync_watermarks WHERE site_id = ?", (site_id,))
+                conn.execute("DELETE FROM sync_calibration_map WHERE site_id = ?", (site_id,))
+                conn.execute("UPDATE sync_sites SET node_id = ? WHERE id = ?", (node_id, site_id))
+
+            marks = {
+                r["source"]: int(r["last_id"])
+                for r in conn.execute("SELECT source, last_id FROM sync_watermarks WHERE site_id = ?", (site_id,))
+            }
+            if any(int(after.get(t, 0)) > marks.get(t, 0) for t in self.SYNC_SOURCES):
+                conn.execute("ROLLBACK")
+                return {"status": "gap", "site": site, "batch": header["batch"]}
+
+            probe_map = {
+                int(r[0]): int(r[1])
+                for r in conn.execute(
+                    "SELECT remote_probe_id, probe_id FROM sync_probe_map WHERE site_id = ?", (site_id,)
+                )
+            }
+            cal_map = {
+                int(r[0]): int(r[1])
+                for r in conn.execute(
+                    "SELECT remote_calibration_id, calibration_id FROM sync_calibration_map WHERE site_id = ?",
+                    (site_id,),
+                )
+            }
+
+            def central_probe(remote_id: int) -> int:
+                if remote_id not in probe_map:
+                    if not 0 < remote_id < self.SYNC_PROBE_ID_BASE:
+                        raise ValueError(f"Edge probe id {remote_id} of site {site!r} is out of range")
+                    pid = site_id * self.SYNC_PROBE_ID_BASE + remote_id
+                    if conn.execute("SELECT 1 FROM probes WHERE id = ?", (pid,)).fetchone():
+                        raise ValueError(f"Probe id {pid} for {site}/{remote_id} is already in use")
+                    label = f"{site}/{probe_labels.get(str(remote_id)) or f'Probe {remote_id}'}"
+                    try:
+                        conn.execute("INSERT INTO probes (id, label) VALUES (?, ?)", (pid, label))
+                    except sqlite3.IntegrityError:  # label taken (labels are unique, case-insensitive)
+                        conn.execute("INSERT INTO probes (id, label) VALUES (?, ?)", (pid, f"{label} ({remote_id})"))
+                    probe_map[remote_id] = pid
+                    conn.execute(
+                        "INSERT INTO sync_probe_map (site_id, remote_probe_id, probe_id) VALUES (?, ?, ?)",
+                        (site_id, remote_id, probe_map[remote_id]),
+                    )
+                return probe_map[remote_id]
+
+            counts: Dict[str, int] = {}
+            skipped: Dict[str, int] = {}
+
+            cals = [r for r in rows.get("probe_calibrations", []) if r["id"] > marks.get("probe_calibrations", 0)]
+            for r in cals:  # id order, so the newest active calibration of a probe wins
+                pid = central_probe(int(r["probe_id"]))
+                if r["active"]:
+                    conn.execute("UPDATE probe_calibrations SET active = 0 WHERE probe_id = ? AND active = 1", (pid,))
+                cur = conn.execute(
+                    """
+                    INSERT INTO probe_calibrations (
+                        probe_id, raw_dry, raw_wet, lux_min, lux_max, rh_min, rh_max,
+                        temp_min, temp_max, notes, active, created_at
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    (
+                        pid, r["raw_dry"], r["raw_wet"], r["lux_min"], r["lux_max"], r["rh_min"], r["rh_max"],
+                        r["temp_min"], r["temp_max"], r["notes"], r["active"], r["created_at"],
+                    ),
+                )
+                cal_map[int(r["id"])] = int(cur.lastrowid)
+                conn.execute(
+                    "INSERT OR REPLACE INTO sync_calibration_map (site_id, remote_calibration_id, calibration_id) "
+                    "VALUES (?, ?, ?)",
+                    (site_id, r["id"], cal_map[int(r["id"])]),
+                )
+            counts["probe_calibrations"] = len(cals)
+
+            readings = [
+                (
+                    r["ts"], central_probe(int(r["probe_id"])), r["lux"], r["rh"], r["temp_c"],
+                    r["moisture_raw"], r["seq"], cal_map.get(r["calibration_id"]),
+                )
+                for r in rows.get("readings", [])
+                if r["id"] > marks.get("readings", 0)
+            ]
+            cur = conn.executemany(
+                """
+                INSERT OR IGNORE INTO readings (ts, probe_id, lux, rh, temp_c, moisture_raw, seq, calibration_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                readings,
+            )
+            counts["readings"] = max(0, cur.rowcount) if readings else 0
+            skipped["readings"] = len(readings) - counts["readings"]
+
+            alerts = [
+                (central_probe(int(r["probe_id"])), r["type"], r["timestamp"], r["message"])
+                for r in rows.get("probe_alerts", [])
+                if r["id"] > marks.get("probe_alerts", 0)
+            ]
+            cur = conn.executemany(
+                "INSERT OR IGNORE INTO probe_alerts (probe_id, type, timestamp, message) VALUES (?, ?, ?, ?)",
+                alerts,
+            )
+            counts["probe_alerts"] = max(0, cur.rowcount) if alerts else 0
+            skipped["probe_alerts"] = len(alerts) - counts["probe_alerts"]
+
+            new_marks = {t: max(marks.get(t, 0), int(upto.get(t, 0))) for t in self.SYNC_SOURCES}
+            conn.executemany(
+                """
+                INSERT INTO sync_watermarks (site_id, source, last_id) VALUES (?, ?, ?)
+                ON CONFLICT(site_id, source) DO UPDATE SET last_id = excluded.last_id
+                """,
+                [(site_id, t, v) for t, v in new_marks.items()],
+            )
+            merged = new_marks != {t: marks.get(t, 0) for t in self.SYNC_SOURCES}
+            if merged:
+                conn.execute(
+                    """
+                    UPDATE sync_sites
+                    SET batches = batches + 1, last_merged_at = strftime('%Y-%m-%d %H:%M:%S', 'now')
+                    WHERE id = ?
+                    """,
+                    (site_id,),
+                )
+            conn.execute("COMMIT")
+            return {
+                "status": "merged" if merged else "duplicate",
+                "site": site,
+                "batch": header["batch"],
+                "rows": counts,
+                "skipped": {t: n for t, n in skipped.items() if n},
+            }
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+
+    def get_sync_sites(self) -> List[Dict[str, Any]]:
+        """Edge sites merged into this database, with their probe count and watermarks."""
+        if not self.table_exists("sync_sites"):
+            return []
+        conn = self._get_conn()
+        sites = [
+            dict(r)
+            for r in conn.execute(
+                """
+                SELECT s.id, s.name, s.node_id, s.batches, s.last_merged_at,
+                       (SELECT COUNT(*) FROM sync_probe_map m WHERE m.site_id = s.id) AS probes
+                FROM sync_sites s
+                ORDER BY s.name
+                """
+            )
+        ]
+        marks: Dict[int, Dict[str, int]] = {}
+        for r in conn.execute("SELECT site_id, source, last_id FROM sync_watermarks"):
+            marks.setdefault(r["site_id"], {})[r["source"]] = r["last_id"]
+        for s in sites:
+            s["watermarks"] = marks.get(s["id"], {})
+        return sites
+
     # ------------------- calibrations -------------------
 
     def ensure_probe_exists(self, probe_id: int, label: Optional[str] = None) -> None:
@@ -320,6 +835,14 @@ class PlantDBWrapper:
         return (row["raw_dry"], row["raw_wet"], row["lux_min"], row["lux_max"],
                 row["rh_min"], row["rh_max"], row["temp_min"], row["temp_max"])
 
+    def get_calibration_raw_range(self, calibration_id: int) -> Optional[Tuple[int, int]]:
+        """(raw_dry, raw_wet) of one calibration row; rows are never edited, so safe to cache."""
+        row = self._get_conn().execute(
+            "SELECT raw_dry, raw_wet FROM probe_calibrations WHERE id=?",
+            (calibration_id,),
+        ).fetchone()
+        return (row["raw_dry"], row["raw_wet"]) if row else None
+
     # ------------------- public: reads / health -------------------
 
     def get_last_readings(self, n: int, oldest_first: bool = False) -> List[Dict[str, Any]]:
@@ -345,6 +868,122 @@ class PlantDBWrapper:
         cur = self._get_conn().execute(sql, (n,))
         return [dict(row) for row in cur.fetchall()]
 
+    def get_readings_after_id(
+        self, after_id: int, limit: int, probe_id: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Rows with id > after_id in id order (the insert/commit order), optionally
+        for one probe. readings.id is the change cursor for incremental consumers.
+        """
+        if not self.table_exists("readings"):
+            return []
+        sql = """
+            SELECT id, ts, probe_id, lux, rh, temp_c, moisture_raw, moisture_pct, seq, calibration_id
+            FROM readings
+            WHERE id > ?
+        """
+        params: List[Any] = [int(after_id)]
+        if probe_id is not None:
+            sql += " AND probe_id = ?"
+            params.append(int(probe_id))
+        sql += " ORDER BY id ASC LIMIT ?"
+        params.append(int(limit))
+        cur = self._get_conn().execute(sql, params)
+        return [dict(row) for row in cur.fetchall()]
+
+    # change-capture sources: table -> column list, all keyed by INTEGER PRIMARY KEY id
+    CHANGE_TABLES: Dict[str, str] = {
+        "readings": "id, ts, probe_id, lux, rh, temp_c, moisture_raw, moisture_pct, seq, calibration_id",
+        "probe_alerts": "id, probe_id, type, timestamp, message, created_at",
+        "probe_calibrations": (
+            "id, probe_id, raw_dry, raw_wet, lux_min, lux_max, rh_min, rh_max, "
+            "temp_min, temp_max, notes, active, created_at"
+        ),
+        "probe_calibration_changes": "id, calibration_id, probe_id, active, after_calibration_id, changed_at",
+    }
+
+    def get_rows_after_id(self, table: str, after_id: int, limit: int) -> List[Dict[str, Any]]:
+        """Generic id-cursor read over one of CHANGE_TABLES, in id order."""
+        cols = self.CHANGE_TABLES.get(table)
+        if cols is None:
+            raise ValueError(f"Unsupported change table: {table!r}")
+        if not self.table_exists(table):
+            return []
+        cur = self._get_conn().execute(
+            f"SELECT {cols} FROM {table} WHERE id > ? ORDER BY id ASC LIMIT ?",
+            (int(after_id), int(limit)),
+        )
+        return [dict(row) for row in cur.fetchall()]
+
+    def get_latest_reading_per_probe(self) -> List[Dict[str, Any]]:
+        """Newest row for every probe: one indexed lookup per probe, no table scan."""
+        if not self.table_exists("readings") or not self.table_exists("probes"):
+            return []
+        conn = self._get_conn()
+        out: List[Dict[str, Any]] = []
+        for p in conn.execute("SELECT id FROM probes ORDER BY id").fetchall():
+            row = conn.execute(
+                """
+                SELECT id, ts, probe_id, lux, rh, temp_c, moisture_raw, moisture_pct, seq
+                FROM readings
+                WHERE probe_id = ?
+                ORDER BY ts DESC, id DESC
+                LIMIT 1
+                """,
+                (p["id"],),
+            ).fetchone()
+            if row is not None:
+                out.append(dict(row))
+        return out
+
+    def get_bucket_stats(self, since_ts: str, bucket_seconds: int) -> List[Dict[str, Any]]:
+        """Per-probe, per-time-bucket min/max of each metric for readings with ts >= since_ts."""
+        if not self.__is_valid_iso_ts(since_ts) or not self.table_exists("readings"):
+            return []
+        cur = self._get_conn().execute(
+            """
+            SELECT probe_id,
+                   CAST(strftime('%s', ts) AS INTEGER) / ? AS bucket,
+                   MIN(moisture_pct) AS moisture_pct_min, MAX(moisture_pct) AS moisture_pct_max,
+                   MIN(lux) AS lux_min,       MAX(lux) AS lux_max,
+                   MIN(rh) AS rh_min,         MAX(rh) AS rh_max,
+                   MIN(temp_c) AS temp_c_min, MAX(temp_c) AS temp_c_max
+            FROM readings
+            WHERE ts >= ?
+            GROUP BY probe_id, bucket
+            ORDER BY probe_id, bucket
+            """,
+            (int(bucket_seconds), since_ts),
+        )
+        return [dict(row) for row in cur.fetchall()]
+
+    def get_probe_labels(self) -> Dict[int, str]:
+        if not self.table_exists("probes"):
+            return {}
+        rows = self._get_conn().execute("SELECT id, label FROM probes").fetchall()
+        return {int(r["id"]): r["label"] for r in rows}
+
+    def get_active_probes(self) -> List[Dict[str, Any]]:
+        if not self.table_exists("probes"):
+            return []
+        rows = self._get_conn().execute(
+            "SELECT id, label FROM probes WHERE is_active = 1 ORDER BY id"
+        ).fetchall()
+        return [{"id": r["id"], "label": r["label"]} for r in rows]
+
+    def calibration_version(self) -> int:
+        """Changes whenever a calibration does: every change inserts a new probe_calibrations row."""
+        if not self.table_exists("probe_calibrations"):
+            return 0
+        row = self._get_conn().execute("SELECT MAX(id) FROM probe_calibrations").fetchone()
+        return int(row[0]) if row and row[0] is not None else 0
+
+    def max_reading_id(self) -> int:
+        if not self.table_exists("readings"):
+            return 0
+        row = self._get_conn().execute("SELECT MAX(id) FROM readings").fetchone()
+        return int(row[0]) if row and row[0] is not None else 0
+
     def get_probe_calibration(self, probe_id: int) -> Optional[Dict[str, float]]:
         query = """
         SELECT lux_min, lux_max, rh_min, rh_max, temp_min, temp_max
@@ -379,6 +1018,99 @@ class PlantDBWrapper:
         cur = self._get_conn().execute(query, (probe_id, limit))
         return [dict(row) for row in cur.fetchall()]
 
+    def get_alerts(
+        self,
+        probe_id: Optional[int] = None,
+        since_ts: Optional[str] = None,
+        types: Iterable[str] = (),
+        limit: int = 100,
+    ) -> List[Dict[str, Any]]:
+        if not self.table_exists("probe_alerts"):
+            return []
+        clauses: List[str] = []
+        params: List[Any] = []
+        if probe_id is not None:
+            clauses.append("probe_id = ?")
+            params.append(probe_id)
+        if since_ts is not None:
+            clauses.append("timestamp >= ?")
+            params.append(since_ts)
+        types = list(types)
+        if types:
+            clauses.append(f"type IN ({','.join('?' * len(types))})")
+            params.extend(types)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        cur = self._get_conn().execute(
+            f"""
+            SELECT id, probe_id, type, timestamp, message
+            FROM probe_alerts
+            {where}
+            ORDER BY timestamp DESC, id DESC
+            LIMIT ?
+            """,
+            (*params, int(limit)),
+        )
+        return [dict(row) for row in cur.fetchall()]
+
+    def get_metric_history(
+        self, probe_id: int, metric: str, since_ts: str, until_ts: Optional[str] = None
+    ) -> List[Tuple[str, float]]:
+        """(ts, value) of one metric for one probe, oldest first; NULLs skipped."""
+        if metric not in ("moisture_pct", "moisture_raw", "lux", "rh", "temp_c"):
+            raise ValueError(f"Unsupported metric: {metric}")
+        if not self.table_exists("readings"):
+            return []
+        sql = f"SELECT ts, {metric} FROM readings WHERE probe_id = ? AND ts >= ? AND {metric} IS NOT NULL"
+        params: List[Any] = [probe_id, since_ts]
+        if until_ts is not None:
+            sql += " AND ts < ?"
+            params.append(until_ts)
+        cur = self._get_conn().execute(sql + " ORDER BY ts, id", params)
+        return [(r[0], r[1]) for r in cur.fetchall()]
+
+    def get_series(
+        self,
+        probe_id: int,
+        metric: str,
+        since_ts: str,
+        after_ts: Optional[str] = None,
+        limit: int = 5000,
+        bucket_seconds: int = 0,
+    ) -> List[Tuple[int, float]]:
+        """
+        (epoch seconds, value) points of one metric, oldest first.
+
+        Rows with ts >= since_ts (or ts > after_ts for incremental fetches);
+        with bucket_seconds > 0 each point is the average of one time bucket,
+        labelled with the bucket start.
+        """
+        if metric not in ("moisture_pct", "lux", "rh", "temp_c"):
+            raise ValueError(f"Unsupported metric: {metric}")
+        if not self.table_exists("readings"):
+            return []
+        cond, ts = ("ts > ?", after_ts) if after_ts is not None else ("ts >= ?", since_ts)
+        if bucket_seconds > 0:
+            sql = f"""
+                SELECT (CAST(strftime('%s', ts) AS INTEGER) / :b) * :b AS t, AVG({metric}) AS v
+                FROM readings
+                WHERE probe_id = :p AND {cond.replace('?', ':ts')} AND {metric} IS NOT NULL
+                GROUP BY t
+                ORDER BY t
+                LIMIT :n
+            """
+            params: Any = {"b": int(bucket_seconds), "p": probe_id, "ts": ts, "n": int(limit)}
+        else:
+            sql = f"""
+                SELECT CAST(strftime('%s', ts) AS INTEGER) AS t, {metric} AS v
+                FROM readings
+                WHERE probe_id = ? AND {cond} AND {metric} IS NOT NULL
+                ORDER BY ts ASC, id ASC
+                LIMIT ?
+            """
+            params = (probe_id, ts, int(limit))
+        cur = self._get_conn().execute(sql, params)
+        return [(r[0], r[1]) for r in cur.fetchall()]
+
     def get_probe_alert_thresholds(self, probe_id: int) -> Optional[Dict[str, Any]]:
         if not self.table_exists("probe_alert_thresholds"):
             return None
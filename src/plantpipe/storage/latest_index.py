@@ -0,0 +1,175 @@
+# src/plantpipe/storage/latest_index.py
+
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Any, Deque, Dict, List, Optional
+
+from plantpipe.common import epoch
+from plantpipe.storage.database import PlantDBWrapper
+
+METRICS = ("moisture_pct", "lux", "rh", "temp_c")
+LATEST_FIELDS = ("id", "ts", "lux", "rh", "temp_c", "moisture_raw", "moisture_pct", "seq")
+
+
+class _WindowMinMax:
+    """
+    Min/max of one metric over a sliding window, kept as coarse time buckets.
+
+    Adding a value is O(1); the cached extremes are only recomputed (over at
+    most window/bucket entries) when the oldest bucket expires.
+    """
+
+    __slots__ = ("buckets", "mn", "mx")
+
+    def __init__(self) -> None:
+        self.buckets: Deque[List[float]] = deque()  # [bucket_idx, min, max], ascending idx
+        self.mn: Optional[float] = None
+        self.mx: Optional[float] = None
+
+    def add(self, idx: int, lo: float, hi: float) -> None:
+        b = self.buckets
+        if b and b[-1][0] == idx:
+            last = b[-1]
+            if lo < last[1]: last[1] = lo
+            if hi > last[2]: last[2] = hi
+        elif not b or idx > b[-1][0]:
+            b.append([idx, lo, hi])
+        else:
+            # late row for an older bucket (rare): merge in place
+            for entry in b:
+                if entry[0] == idx:
+                    entry[1] = min(entry[1], lo)
+                    entry[2] = max(entry[2], hi)
+                    break
+            else:
+                b.append([idx, lo, hi])
+                self.buckets = deque(sorted(b, key=lambda e: e[0]))
+        self.mn = lo if self.mn is None or lo < self.mn else self.mn
+        self.mx = hi if self.mx is None or hi > self.mx else self.mx
+
+    def expire(self, min_idx: int) -> None:
+        b = self.buckets
+        if not b or b[0][0] >= min_idx:
+            return
+        while b and b[0][0] < min_idx:
+            b.popleft()
+        self.mn = min((e[1] for e in b), default=None)
+        self.mx = max((e[2] for e in b), default=None)
+
+
+class ProbeLatestIndex:
+    """
+    In-memory per-probe "current state" index for fleet overviews.
+
+    Bootstraps from the DB once (an indexed latest-row lookup per probe plus a
+    bucketed GROUP BY for the window), then follows new rows via the
+    readings.id cursor, so each refresh costs O(new rows) and an overview is
+    O(probes). Works the same whether ingest runs in this process or another.
+    """
+
+    def __init__(
+        self,
+        db: PlantDBWrapper,
+        window_hours: int = 24,
+        bucket_seconds: int = 300,
+        refresh_interval: float = 1.0,
+        batch_size: int = 5000,
+    ) -> None:
+        self.db = db
+        self.window_seconds = int(window_hours) * 3600
+        self.bucket_seconds = max(1, int(bucket_seconds))
+        self.refresh_interval = float(refresh_interval)
+        self.batch_size = max(1, int(batch_size))
+
+        self._lock = threading.Lock()
+        self._cursor: Optional[int] = None
+        self._last_refresh = 0.0
+        self._latest: Dict[int, Dict[str, Any]] = {}
+        self._windows: Dict[int, Dict[str, _WindowMinMax]] = {}
+        self._labels: Dict[int, str] = {}
+
+    # ---------- maintenance ----------
+
+    def _series(self, probe_id: int) -> Dict[str, _WindowMinMax]:
+        w = self._windows.get(probe_id)
+        if w is None:
+            w = {m: _WindowMinMax() for m in METRICS}
+            self._windows[probe_id] = w
+        return w
+
+    def _bootstrap(self) -> None:
+        conn = self.db.connection()
+        conn.execute("BEGIN")  # consistent snapshot: cursor matches the loaded state
+        try:
+            cursor = self.db.max_reading_id()
+            self._labels = self.db.get_probe_labels()
+            for row in self.db.get_latest_reading_per_probe():
+                self._latest[row["probe_id"]] = {k: row[k] for k in LATEST_FIELDS}
+            since = (datetime.now(timezone.utc) - timedelta(seconds=self.window_seconds)).strftime("%Y-%m-%d %H:%M:%S")
+            for b in self.db.get_bucket_stats(since, self.bucket_seconds):
+                series = self._series(b["probe_id"])
+                for m in METRICS:
+                    lo, hi = b[f"{m}_min"], b[f"{m}_max"]
+                    if lo is not None:
+                        series[m].add(b["bucket"], lo, hi)
+        finally:
+            conn.execute("COMMIT")
+        self._cursor = cursor
+
+    def _apply(self, row: Dict[str, Any]) -> None:
+        pid = row["probe_id"]
+        prev = self._latest.get(pid)
+        if prev is None or row["id"] > prev["id"]:
+            self._latest[pid] = {k: row[k] for k in LATEST_FIELDS}
+        if pid not in self._labels:
+            self._labels = self.db.get_probe_labels()
+        idx = int(epoch(row["ts"])) // self.bucket_seconds
+        series = self._series(pid)
+        for m in METRICS:
+            v = row[m]
+            if v is not None:
+                series[m].add(idx, v, v)
+
+    def refresh(self, force: bool = False) -> int:
+        """Pull rows committed since the last refresh. Returns rows applied."""
+        with self._lock:
+            now = time.monotonic()
+            if not force and self._cursor is not None and now - self._last_refresh < self.refresh_interval:
+                return 0
+            self._last_refresh = now
+            if self._cursor is None:
+                self._bootstrap()
+                return 0
+            applied = 0
+            while True:
+                rows = self.db.get_readings_after_id(self._cursor, self.batch_size)
+                for row in rows:
+                    self._apply(row)
+                applied += len(rows)
+                if rows:
+                    self._cursor = rows[-1]["id"]
+                if len(rows) < self.batch_size:
+                    return applied
+
+    # ---------- queries ----------
+
+    def overview(self) -> List[Dict[str, Any]]:
+        """Latest reading and window min/max for every probe that has data, by probe id."""
+        self.refresh()
+        min_idx = (int(time.time()) - self.window_seconds) // self.bucket_seconds
+        out: List[Dict[str, Any]] = []
+        with self._lock:
+            for pid in sorted(self._latest):
+                stats: Dict[str, Dict[str, Optional[float]]] = {}
+                for m, w in self._series(pid).items():
+                    w.expire(min_idx)
+                    stats[m] = {"min": w.mn, "max": w.mx}
+                out.append({
+                    "probe_id": pid,
+                    "label": self._labels.get(pid),
+                    "latest": dict(self._latest[pid]),
+                    "window": stats,
+                })
+        return out
@@ -0,0 +1,357 @@
+# src/plantpipe/storage/migrations.py
+
+"""
+Versioned, online schema migrations tracked with PRAGMA user_version.
+
+sql/001_init.sql is the baseline (version 1). Every later file
+sql/NNN_<name>.sql is migration NNN and is split into steps by marker lines:
+
+    -- @step sync                      run at startup, in one transaction (default)
+    -- @step background                run by the background migrator, one transaction
+    -- @step chunked <table> [rows]    one DML statement using :lo / :hi, run over
+                                       <table>.id in ranges of [rows] (default 5000),
+                                       re-reading MAX(id) so rows ingested meanwhile
+                                       are picked up too
+
+Sync steps must be cheap (new tables, triggers, ALTER TABLE ADD COLUMN). Index
+builds go in background steps; table rewrites are a sync "create new table",
+a chunked copy, and a background catch-up + swap. Progress (current step and
+chunk watermark) lives in plantpipe_meta, so an interrupted migration resumes
+where it stopped. user_version is bumped in the same transaction as the last
+step, so it always names the newest fully applied migration.
+
+Migrations apply strictly in version order: a later migration may rely on an
+earlier one's swap or index, so startup stops at the first online step and
+the rest (later sync steps included) waits for the background migrator, or
+for apply_all in tools that run without a pipeline. Every step re-checks its
+progress under the write lock, so two runners on one file (a pipeline and a
+standalone tool) never apply a step twice.
+
+A background step runs in one write transaction. SQLite cannot build an
+index in pieces, so ingest writes that arrive meanwhile fail with
+"database is locked" after busy_timeout; the pipeline spools them and
+replays them once the step commits. Without the spool stage enabled,
+readings that arrive during an index build are counted as failed.
+"""
+
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+MIGRATION_RE = re.compile(r"^(\d{3})_[\w\-]+\.sql$")
+STEP_RE = re.compile(r"^--\s*@step\s+(sync|background|chunked)(?:\s+(\w+))?(?:\s+(\d+))?\s*$")
+META_TABLE = "plantpipe_meta"
+DEFAULT_CHUNK = 5000
+
+
+class MigrationStep:
+    def __init__(self, mode: str, sql: str, table: Optional[str] = None, chunk_size: int = DEFAULT_CHUNK) -> None:
+        self.mode = mode
+        self.sql = sql
+        self.table = table
+        self.chunk_size = chunk_size
+
+    @property
+    def online(self) -> bool:
+        return self.mode != "sync"
+
+
+class Migration:
+    def __init__(self, version: int, path: Path) -> None:
+        self.version = version
+        self.path = path
+        self.name = path.stem
+        self.text = path.read_text(encoding="utf-8")
+        self.steps = self._parse(self.text)
+        if not self.steps:
+            raise ValueError(f"Migration {path.name} contains no statements")
+
+    def _parse(self, text: str) -> List[MigrationStep]:
+        steps: List[MigrationStep] = []
+        mode, table, chunk = "sync", None, DEFAULT_CHUNK
+        buf: List[str] = []
+
+        def flush() -> None:
+            sql = "\n".join(buf).strip()
+            if split_statements(sql):
+                if mode == "chunked" and len(split_statements(sql)) != 1:
+                    raise ValueError(f"{self.path.name}: a chunked step must be a single statement")
+                steps.append(MigrationStep(mode, sql, table, chunk))
+
+        for line in text.splitlines():
+            m = STEP_RE.match(line.strip())
+            if m:
+                flush()
+                buf = []
+                mode, table = m.group(1), m.group(2)
+                chunk = int(m.group(3)) if m.group(3) else DEFAULT_CHUNK
+                if mode == "chunked" and not table:
+                    raise ValueError(f"{self.path.name}: chunked step needs a table name")
+            else:
+                buf.append(line)
+        flush()
+        return steps
+
+
+def split_statements(sql: str) -> List[str]:
+    """Split a script into complete statements (trigger bodies stay intact)."""
+    out: List[str] = []
+    cur = ""
+    for line in sql.splitlines(keepends=True):
+        cur += line
+        if sqlite3.complete_statement(cur):
+            stmt = cur.strip()
+            if _strip_comments(stmt):
+                out.append(stmt)
+            cur = ""
+    if _strip_comments(cur.strip()):
+        out.append(cur.strip())
+    return out
+
+
+def _strip_comments(sql: str) -> str:
+    return "\n".join(l for l in sql.splitlines() if not l.strip().startswith("--")).strip().rstrip(";").strip()
+
+
+def baseline_version(schema_path: Path) -> int:
+    m = MIGRATION_RE.match(schema_path.name)
+    return int(m.group(1)) if m else 1
+
+
+def load_migrations(sql_dir: Path, after_version: int) -> List[Migration]:
+    found: List[Migration] = []
+    for p in sorted(sql_dir.glob("*.sql")):
+        m = MIGRATION_RE.match(p.name)
+        if m and int(m.group(1)) > after_version:
+            found.append(Migration(int(m.group(1)), p))
+    versions = [m.version for m in found]
+    if len(versions) != len(set(versions)):
+        raise ValueError(f"Duplicate migration versions in {sql_dir}")
+    return found
+
+
+# ------------------- runner -------------------
+
+class Migrator:
+    """Applies pending migrations to one database file."""
+
+    def __init__(
+        self,
+        connect: Callable[[], sqlite3.Connection],
+        migrations: List[Migration],
+        pause: float = 0.05,
+        on_progress: Optional[Callable[[str], None]] = print,
+    ) -> None:
+        self._connect = connect
+        self.migrations = migrations
+        self.pause = pause
+        self.on_progress = on_progress
+
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.error: Optional[str] = None
+
+    # ---------- state ----------
+
+    @staticmethod
+    def ensure_meta(conn: sqlite3.Connection) -> None:
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {META_TABLE} (key TEXT PRIMARY KEY, value TEXT) STRICT")
+
+    @staticmethod
+    def user_version(conn: sqlite3.Connection) -> int:
+        return int(conn.execute("PRAGMA user_version").fetchone()[0])
+
+    @staticmethod
+    def _get_meta(conn: sqlite3.Connection, key: str, default: int = 0) -> int:
+        row = conn.execute(f"SELECT value FROM {META_TABLE} WHERE key=?", (key,)).fetchone()
+        return int(row[0]) if row else default
+
+    @staticmethod
+    def _set_meta(conn: sqlite3.Connection, key: str, value: Any) -> None:
+        conn.execute(
+            f"INSERT INTO {META_TABLE}(key, value) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value=excluded.value",
+            (key, str(value)),
+        )
+
+    def pending(self, conn: sqlite3.Connection) -> List[Migration]:
+        current = self.user_version(conn)
+        return [m for m in self.migrations if m.version > current]
+
+    def _emit(self, msg: str) -> None:
+        if self.on_progress is not None:
+            self.on_progress(msg)
+
+    # ---------- step execution ----------
+
+    def _step_done(self, conn: sqlite3.Connection, mig: Migration, index: int) -> bool:
+        """True if another runner already applied this step (call under the write lock)."""
+        if self.user_version(conn) >= mig.version:
+            return True
+        return self._get_meta(conn, f"migration.{mig.version}.step") > index
+
+    def _finish_step(self, conn: sqlite3.Connection, mig: Migration, index: int) -> None:
+        """Record step completion inside the caller's open transaction."""
+        key = f"migration.{mig.version}"
+        if index + 1 >= len(mig.steps):
+            conn.execute(f"DELETE FROM {META_TABLE} WHERE key IN (?, ?)", (key + ".step", key + ".last_id"))
+            conn.execute(f"PRAGMA user_version = {int(mig.version)}")
+        else:
+            self._set_meta(conn, key + ".step", index + 1)
+            conn.execute(f"DELETE FROM {META_TABLE} WHERE key=?", (key + ".last_id",))
+
+    def _run_script_step(self, conn: sqlite3.Connection, mig: Migration, index: int) -> None:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if self._step_done(conn, mig, index):
+                conn.execute("ROLLBACK")
+                return
+            for stmt in split_statements(mig.steps[index].sql):
+                conn.execute(stmt)
+            self._finish_step(conn, mig, index)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _run_chunked_step(
+        self, conn: sqlite3.Connection, mig: Migration, index: int, stop: threading.Event
+    ) -> None:
+        step = mig.steps[index]
+        key = f"migration.{mig.version}.last_id"
+        reported = time.monotonic()
+        while not stop.is_set():
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if self._step_done(conn, mig, index):
+                    conn.execute("ROLLBACK")
+                    return
+                lo = self._get_meta(conn, key)
+                max_id = conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {step.table}").fetchone()[0]
+                if lo >= max_id:
+                    self._finish_step(conn, mig, index)
+                    conn.execute("COMMIT")
+                    return
+                hi = min(lo + step.chunk_size, max_id)
+                conn.execute(step.sql, {"lo": lo, "hi": hi})
+                self._set_meta(conn, key, hi)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            if time.monotonic() - reported > 5.0:
+                reported = time.monotonic()
+                self._emit(f"Migration {mig.name}: step {index + 1}/{len(mig.steps)} at {step.table}.id {hi}/{max_id}")
+            stop.wait(self.pause)
+
+    # ---------- foreground ----------
+
+    def apply_sync(self, conn: sqlite3.Connection) -> bool:
+        """
+        Apply leading sync steps of pending migrations, in order.
+        Returns True when everything is applied, False if online steps remain.
+        """
+        self.ensure_meta(conn)
+        for mig in self.pending(conn):
+            index = self._get_meta(conn, f"migration.{mig.version}.step")
+            while index < len(mig.steps) and not mig.steps[index].online:
+                self._run_script_step(conn, mig, index)
+                index += 1
+            if index < len(mig.steps):
+                return False
+            self._emit(f"Applied migration {mig.name}")
+        return True
+
+    def apply_all(self, conn: sqlite3.Connection) -> None:
+        """
+        Apply every pending step inline: fresh, empty databases, and tools
+        that run without a pipeline's background migrator.
+        """
+        self.ensure_meta(conn)
+        for mig in self.pending(conn):
+            index = self._get_meta(conn, f"migration.{mig.version}.step")
+            for i in range(index, len(mig.steps)):
+                if mig.steps[i].mode == "chunked":
+                    self._run_chunked_step(conn, mig, i, threading.Event())
+                else:
+                    self._run_script_step(conn, mig, i)
+
+    # ---------- background ----------
+
+    def start_background(self) -> bool:
+        """Run remaining (online) steps on a background thread. Returns False if nothing to do."""
+        if self._thread is not None and self._thread.is_alive():
+            return True
+        conn = self._connect()
+        try:
+            if not self.pending(conn):
+                return False
+        finally:
+            conn.close()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run_background, name="migrator", daemon=True)
+        self._thread.start()
+        return True
+
+    def _run_background(self) -> None:
+        conn = self._connect()
+        try:
+            for mig in self.pending(conn):
+                index = self._get_meta(conn, f"migration.{mig.version}.step")
+                while index < len(mig.steps):
+                    if self._stop.is_set():
+                        return
+                    step = mig.steps[index]
+                    self._emit(f"Migration {mig.name}: step {index + 1}/{len(mig.steps)} ({step.mode}) started")
+                    if step.mode == "chunked":
+                        self._run_chunked_step(conn, mig, index, self._stop)
+                    else:
+                        self._run_script_step(conn, mig, index)
+                    if self._stop.is_set():
+                        return
+                    index += 1
+                self._emit(f"Applied migration {mig.name}")
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+            self._emit(f"Background migration failed: {self.error}")
+        finally:
+            conn.close()
+
+    def stop_background(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+        self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    # ---------- reporting ----------
+
+    def status(self, conn: sqlite3.Connection) -> Dict[str, Any]:
+        current = self.user_version(conn)
+        has_meta = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (META_TABLE,)
+        ).fetchone() is not None
+        pending: List[Dict[str, Any]] = []
+        for mig in self.migrations:
+            if mig.version <= current:
+                continue
+            step = self._get_meta(conn, f"migration.{mig.version}.step") if has_meta else 0
+            info: Dict[str, Any] = {"version": mig.version, "name": mig.name, "step": step, "steps": len(mig.steps)}
+            if step < len(mig.steps) and mig.steps[step].mode == "chunked" and has_meta:
+                table = mig.steps[step].table
+                info["last_id"] = self._get_meta(conn, f"migration.{mig.version}.last_id")
+                info["max_id"] = conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}").fetchone()[0]
+            pending.append(info)
+        return {
+            "version": current,
+            "target": max([m.version for m in self.migrations], default=current),
+            "running": self.running,
+            "error": self.error,
+            "pending": pending,
+        }
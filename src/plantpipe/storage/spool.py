@@ -0,0 +1,203 @@
+# src/plantpipe/storage/spool.py
+
+"""
+Durable, append-only ingest spool.
+
+Readings that cannot be written to SQLite right now (database locked past
+busy_timeout, disk full, a migration holding the write lock) are appended
+here instead of being dropped, and a drainer replays them later in large
+batches. Layout:
+
+    <dir>/spool-000000000001.jsonl   one JSON payload per line, in arrival order
+    <dir>/spool-000000000002.jsonl   <- rotated at segment_bytes
+    <dir>/_drain.json                drain position {segment, offset} (atomic)
+    <dir>/rejected.jsonl             rows the database refused permanently
+
+Appends are flushed to the OS on every call and fsync'd at most every
+`fsync_interval` seconds (group commit), so a burst costs one fsync, and a
+crash loses at most that interval of readings. A torn last line from a crash
+is ignored and overwritten on the next open. Fully drained segments are deleted.
+"""
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from plantpipe.common import write_json_atomic
+
+SEGMENT_PREFIX = "spool-"
+SEGMENT_SUFFIX = ".jsonl"
+DRAIN_STATE = "_drain.json"
+REJECTED = "rejected.jsonl"
+
+Position = Tuple[int, int]  # (segment number, byte offset)
+
+
+def _segment_name(number: int) -> str:
+    return f"{SEGMENT_PREFIX}{number:012d}{SEGMENT_SUFFIX}"
+
+
+def _segment_number(path: Path) -> int:
+    return int(path.name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)])
+
+
+class Spool:
+    """Segmented append-only log of reading payloads with one drain cursor. Thread-safe."""
+
+    def __init__(self, directory: str, segment_bytes: int = 16 * 1024 * 1024, fsync_interval: float = 0.2) -> None:
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.segment_bytes = max(1024, int(segment_bytes))
+        self.fsync_interval = max(0.0, float(fsync_interval))
+
+        self._lock = threading.Lock()
+        self._state_path = self.directory / DRAIN_STATE
+        self._file = None
+        self._write_segment = 0
+        self._write_offset = 0  # size of the write segment, kept for pending() after close()
+        self._last_fsync = 0.0
+        self._dirty = False
+        self.appended = 0
+        self.drained = 0
+        self.rejected = 0
+
+        self._read_pos: Position = (0, 0)
+        self._open()
+
+    # ---------- state ----------
+
+    def _segments(self) -> List[Path]:
+        return sorted(self.directory.glob(f"{SEGMENT_PREFIX}*{SEGMENT_SUFFIX}"), key=_segment_number)
+
+    def _open(self) -> None:
+        segments = self._segments()
+        if self._state_path.exists():
+            state = json.loads(self._state_path.read_text(encoding="utf-8"))
+            self._read_pos = (int(state["segment"]), int(state["offset"]))
+        elif segments:
+            self._read_pos = (_segment_number(segments[0]), 0)
+
+        if segments:
+            last = segments[-1]
+            self._write_segment = _segment_number(last)
+            self._truncate_torn_tail(last)
+        else:
+            self._write_segment = max(1, self._read_pos[0])
+            self._read_pos = (self._write_segment, 0)
+        self._file = open(self.directory / _segment_name(self._write_segment), "ab")
+
+    @staticmethod
+    def _truncate_torn_tail(path: Path) -> None:
+        size = path.stat().st_size
+        if size == 0:
+            return
+        with open(path, "rb+") as f:
+            f.seek(max(0, size - 65536))
+            tail = f.read()
+            if tail.endswith(b"\n"):
+                return
+            cut = tail.rfind(b"\n")
+            f.truncate(size - len(tail) + cut + 1 if cut >= 0 else max(0, size - len(tail)))
+
+    # ---------- append ----------
+
+    def append(self, payloads: List[Dict[str, Any]]) -> None:
+        if not payloads:
+            return
+        data = b"".join(json.dumps(p, separators=(",", ":")).encode("utf-8") + b"\n" for p in payloads)
+        with self._lock:
+            if self._file.tell() > 0 and self._file.tell() + len(data) > self.segment_bytes:
+                self._rotate()
+            self._file.write(data)
+            self._file.flush()
+            self._dirty = True
+            self.appended += len(payloads)
+            if time.monotonic() - self._last_fsync >= self.fsync_interval:
+                self._fsync()
+
+    def sync(self) -> None:
+        """fsync pending appends now (called periodically and on close)."""
+        with self._lock:
+            if self._dirty:
+                self._fsync()
+
+    def _fsync(self) -> None:
+        os.fsync(self._file.fileno())
+        self._last_fsync = time.monotonic()
+        self._dirty = False
+
+    def _rotate(self) -> None:
+        self._fsync()
+        self._file.close()
+        self._write_segment += 1
+        self._file = open(self.directory / _segment_name(self._write_segment), "ab")
+
+    # ---------- drain ----------
+
+    def pending(self) -> bool:
+        """True while some appended payload has not been committed as drained."""
+        with self._lock:
+            seg, off = self._read_pos
+            end = self._file.tell() if self._file is not None else self._write_offset
+            return seg < self._write_segment or off < end
+
+    def read(self, max_records: int) -> Tuple[List[Dict[str, Any]], List[Position], Position]:
+        """
+        Up to max_records payloads from the drain position, the position just
+        after each one (for partial commits), and the position after the last.
+        """
+        with self._lock:
+            self._file.flush()
+            seg, off = self._read_pos
+            write_seg = self._write_segment
+        out: List[Dict[str, Any]] = []
+        ends: List[Position] = []
+        while len(out) < max_records and seg <= write_seg:
+            path = self.directory / _segment_name(seg)
+            if path.exists():
+                with open(path, "rb") as f:
+                    f.seek(off)
+                    for line in f:
+                        if not line.endswith(b"\n"):
+                            break  # being written right now
+                        out.append(json.loads(line))
+                        off += len(line)
+                        ends.append((seg, off))
+                        if len(out) >= max_records:
+                            break
+            if len(out) >= max_records or seg == write_seg:
+                break
+            seg, off = seg + 1, 0
+        return out, ends, (seg, off)
+
+    def commit(self, position: Position, count: int) -> None:
+        """Mark everything before `position` as stored and delete drained segments."""
+        with self._lock:
+            self._read_pos = position
+            self.drained += count
+            write_json_atomic(self._state_path, {"segment": position[0], "offset": position[1]})
+            for path in self._segments():
+                if _segment_number(path) < position[0]:
+                    try:
+                        path.unlink()
+                    except OSError:
+                        pass
+
+    def reject(self, payload: Dict[str, Any], error: str) -> None:
+        """Keep a row the database refused permanently, for inspection."""
+        with self._lock:
+            with open(self.directory / REJECTED, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"error": error, "payload": payload}, separators=(",", ":")) + "\n")
+            self.rejected += 1
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                if self._dirty:
+                    self._fsync()
+                self._write_offset = self._file.tell()
+                self._file.close()
+                self._file = None
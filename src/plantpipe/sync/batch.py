@@ -0,0 +1,118 @@
+# src/plantpipe/sync/batch.py
+
+"""
+Sync batch files: what an edge node ships and the central node merges.
+
+One batch is a gzip'd JSONL file named <site>-<batch:012d>.jsonl.gz. The first
+line is the header, every other line one row:
+
+    {"format": 1, "site": "north", "node_id": "...", "batch": 7,
+     "after": {"readings": 1200, ...},   edge watermarks before this batch
+     "upto":  {"readings": 1700, ...},   ... and after it
+     "probes": {"1": "Monstera #1", ...}}
+    {"t": "probe_calibrations", "r": {...}}
+    {"t": "readings", "r": {...}}
+    {"t": "probe_alerts", "r": {...}}
+
+Rows are the CHANGE_TABLES columns of PlantDBWrapper, calibrations first so a
+reading never precedes the calibration it references. `after`/`upto` let the
+merger tell a duplicate batch from a missing one. Files are written to a temp
+name and renamed, so a reader never sees a partial batch.
+"""
+
+import gzip
+import json
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+FORMAT = 1
+SOURCES = ("probe_calibrations", "readings", "probe_alerts")
+SUFFIX = ".jsonl.gz"
+SITE_RE = re.compile(r"^[A-Za-z0-9_][A-Za-z0-9_.\-]{0,63}$")
+NAME_RE = re.compile(r"^(?P<site>[A-Za-z0-9_][A-Za-z0-9_.\-]{0,63})-(?P<batch>\d{12})\.jsonl\.gz$")
+
+Header = Dict[str, Any]
+Rows = Dict[str, List[Dict[str, Any]]]
+
+
+def batch_name(site: str, batch: int) -> str:
+    return f"{site}-{batch:012d}{SUFFIX}"
+
+
+def parse_name(name: str) -> Tuple[str, int]:
+    """(site, batch) from a batch file name; ValueError if it is not one."""
+    m = NAME_RE.match(name)
+    if not m:
+        raise ValueError(f"Not a sync batch name: {name!r}")
+    return m.group("site"), int(m.group("batch"))
+
+
+def write_batch(directory: Path, header: Header, rows: Rows) -> Path:
+    path = directory / batch_name(header["site"], header["batch"])
+    tmp = directory / f".{path.name}.tmp"
+    with open(tmp, "wb") as raw:
+        with gzip.GzipFile(fileobj=raw, mode="wb", mtime=0) as gz:
+            gz.write(json.dumps(header, separators=(",", ":")).encode("utf-8") + b"\n")
+            for table in SOURCES:
+                for row in rows.get(table, []):
+                    gz.write(json.dumps({"t": table, "r": row}, separators=(",", ":")).encode("utf-8") + b"\n")
+        raw.flush()
+        os.fsync(raw.fileno())
+    os.replace(tmp, path)
+    return path
+
+
+def store_batch(directory: Path, name: str, data: bytes) -> Path:
+    """Atomically place an already-encoded batch (e.g. an upload) under `name`."""
+    path = directory / name
+    tmp = directory / f".{name}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return path
+
+
+def _check_header(header: Any) -> Header:
+    if not isinstance(header, dict) or header.get("format") != FORMAT:
+        raise ValueError("Unsupported sync batch header")
+    for key in ("site", "node_id", "batch", "after", "upto"):
+        if key not in header:
+            raise ValueError(f"Sync batch header is missing {key!r}")
+    if not SITE_RE.match(str(header["site"])):
+        raise ValueError(f"Invalid site name: {header['site']!r}")
+    for key in ("after", "upto"):
+        marks = header[key]
+        if not isinstance(marks, dict) or not all(isinstance(v, int) for v in marks.values()):
+            raise ValueError(f"Sync batch header {key!r} must map tables to ids")
+    return header
+
+
+def decode_batch(data: bytes) -> Tuple[Header, Rows]:
+    """Parse a whole batch; ValueError on anything malformed or truncated."""
+    try:
+        lines = gzip.decompress(data).splitlines()
+    except (OSError, EOFError) as e:
+        raise ValueError(f"Corrupt sync batch: {e}") from None
+    if not lines:
+        raise ValueError("Empty sync batch")
+    try:
+        header = _check_header(json.loads(lines[0]))
+        rows: Rows = {t: [] for t in SOURCES}
+        for line in lines[1:]:
+            item = json.loads(line)
+            if item["t"] not in rows:
+                raise ValueError(f"Unknown table {item['t']!r}")
+            rows[item["t"]].append(item["r"])
+    except (KeyError, TypeError, json.JSONDecodeError) as e:
+        raise ValueError(f"Malformed sync batch: {e}") from None
+    return header, rows
+
+
+def read_batch(path: Path) -> Tuple[Header, Rows]:
+    return decode_batch(path.read_bytes())
+
@@ -0,0 +1,174 @@
+# src/plantpipe/sync/merger.py
+
+"""
+Central side of multi-site sync.
+
+SyncMerger watches an inbox directory for edge batches (dropped there by a
+shared mount / rsync, or by POST /api/sync/batches) and merges each one into
+this database in one transaction via PlantDBWrapper.merge_sync_batch: edge
+probes and calibrations are mapped to central ids, and per-site watermarks
+make re-delivered batches no-ops. Batches of a site are merged in batch order;
+if one is missing, later ones wait in the inbox until it arrives. Unreadable
+files are moved to <inbox>/rejected.
+
+The sync tables come from migration 005. Inside the pipeline the background
+migrator creates them and batches wait until it is done; the standalone CLI
+applies pending migrations itself (migrate=True).
+"""
+
+import argparse
+import shutil
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from plantpipe.storage.database import PlantDBWrapper
+from plantpipe.sync.batch import SUFFIX, parse_name, read_batch
+
+
+class SyncMerger:
+    """Merge edge batches from `inbox` into the central database."""
+
+    def __init__(self, db: PlantDBWrapper, inbox: str, poll_interval: float = 10.0, migrate: bool = False) -> None:
+        self.db = db
+        self.migrate = migrate
+        self.inbox = Path(inbox)
+        self.inbox.mkdir(parents=True, exist_ok=True)
+        self.poll_interval = max(0.5, float(poll_interval))
+
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._waiting: Dict[str, int] = {}  # site -> batch reported as waiting for a predecessor
+        self._schema_wait_reported = False
+        self.merged = 0
+
+    def _pending(self) -> List[Tuple[str, int, Path]]:
+        out = []
+        for path in self.inbox.glob(f"*{SUFFIX}"):
+            if path.name.startswith("."):
+                continue  # temp file of a batch still being written
+            try:
+                site, batch = parse_name(path.name)
+            except ValueError:
+                continue
+            out.append((site, batch, path))
+        return sorted(out)
+
+    def _reject(self, path: Path, reason: str) -> None:
+        rejected = self.inbox / "rejected"
+        rejected.mkdir(exist_ok=True)
+        shutil.move(str(path), str(rejected / path.name))
+        print(f"Sync: rejected {path.name}: {reason}")
+
+    def _schema_ready(self) -> bool:
+        ready = self.db.finish_migrations() if self.migrate else not self.db.migrations_pending()
+        if ready:
+            self._schema_wait_reported = False
+        elif not self._schema_wait_reported:
+            self._schema_wait_reported = True
+            print("Sync: batches wait in the inbox until the schema migration completes")
+        return ready
+
+    def poll_once(self) -> int:
+        """Merge every batch that can be merged now. Returns batches merged."""
+        if not self._schema_ready():
+            return 0
+        merged = 0
+        blocked = set()
+        for site, batch, path in self._pending():
+            if site in blocked:
+                continue
+            try:
+                header, rows = read_batch(path)
+            except ValueError as e:
+                self._reject(path, str(e))
+                continue
+            except OSError:
+                continue  # removed or replaced meanwhile
+            if header["site"] != site or header["batch"] != batch:
+                self._reject(path, "file name does not match its header")
+                continue
+
+            try:
+                result = self.db.merge_sync_batch(header, rows)
+            except sqlite3.OperationalError as e:
+                print(f"Sync: merge of {path.name} deferred: {e}")
+                return merged  # database busy/locked: retry on the next poll
+            except (sqlite3.Error, KeyError, TypeError, ValueError) as e:
+                self._reject(path, str(e))
+                continue
+
+            if result["status"] == "gap":
+                blocked.add(site)
+                if self._waiting.get(site) != batch:
+                    self._waiting[site] = batch
+                    print(f"Sync: {path.name} waits for an earlier batch of site {site}")
+                continue
+            self._waiting.pop(site, None)
+            if result.get("skipped"):
+                print(f"Sync: {path.name}: rows already present or refused by constraints: {result['skipped']}")
+            path.unlink()
+            if result["status"] == "merged":
+                merged += 1
+        self.merged += merged
+        return merged
+
+    # ---------- thread ----------
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sync-merge", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        try:
+            while not self._stop.is_set():
+                try:
+                    self.poll_once()
+                except Exception as e:
+                    print(f"Sync merge failed: {e}")
+                self._stop.wait(self.poll_interval)
+        finally:
+            self.db.close()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=30.0)
+        self._thread = None
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description="Merge edge sync batches into a central plant.db")
+    ap.add_argument("--db", default="data/plant.db")
+    ap.add_argument("--schema", default="sql/001_init.sql")
+    ap.add_argument("--inbox", default="data/sync/inbox")
+    ap.add_argument("--interval", type=float, default=10.0, help="Seconds between polls")
+    ap.add_argument("--once", action="store_true", help="Merge what is in the inbox and exit")
+    return ap.parse_args()
+
+
+def main():
+    args = parse_args()
+    db = PlantDBWrapper(args.db, args.schema)
+    merger = SyncMerger(db, args.inbox, poll_interval=args.interval, migrate=True)
+    if args.once:
+        print(f"Merged {merger.poll_once()} batch(es)")
+        db.close()
+        return
+    merger.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        merger.stop()
+
+
+if __name__ == "__main__":
+    main()
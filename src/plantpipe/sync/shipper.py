@@ -0,0 +1,226 @@
+# src/plantpipe/sync/shipper.py
+
+"""
+Edge side of multi-site sync.
+
+SyncShipper cuts batches of rows committed since the last batch (readings,
+probe_alerts, probe_calibrations, by id, in one read snapshot) into gzip'd
+JSONL files (see sync/batch.py). Its watermarks, batch counter and node id
+live in this database's plantpipe_meta, so they travel with the data: a
+recreated database gets a new node id and the central node starts it over.
+
+Transport:
+
+* files: `outbox` is the central node's inbox (shared mount, or a directory
+  rsync'd there); the shipper only writes files.
+* http:  `outbox` is local; every batch is POSTed in order to the central
+  node's /api/sync/batches and deleted once accepted.
+
+A crash between writing a batch and saving the watermarks re-cuts the same
+batch under the same name, and the merger skips rows it already has.
+"""
+
+import argparse
+import os
+import shutil
+import socket
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from plantpipe.storage.database import PlantDBWrapper
+from plantpipe.sync.batch import FORMAT, SITE_RE, SOURCES, SUFFIX, parse_name, write_batch
+
+META_PREFIX = "sync."
+
+
+class SyncShipper:
+    """Ship new rows of this node's database as numbered batches."""
+
+    def __init__(
+        self,
+        db: PlantDBWrapper,
+        site: str,
+        outbox: str,
+        url: str = "",
+        token: str = "",
+        batch_rows: int = 5000,
+        poll_interval: float = 10.0,
+        timeout: float = 30.0,
+    ) -> None:
+        site = site or socket.gethostname().split(".")[0]
+        if not SITE_RE.match(site):
+            raise ValueError(f"Invalid sync site name: {site!r}")
+        self.db = db
+        self.site = site
+        self.outbox = Path(outbox)
+        self.outbox.mkdir(parents=True, exist_ok=True)
+        self.url = url
+        self.token = token
+        self.batch_rows = max(1, int(batch_rows))
+        self.poll_interval = max(0.5, float(poll_interval))
+        self.timeout = timeout
+
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.shipped = 0
+
+    # ---------- batches ----------
+
+    def _state(self) -> Dict[str, str]:
+        state = self.db.get_meta(META_PREFIX)
+        if f"{META_PREFIX}node_id" not in state:
+            state[f"{META_PREFIX}node_id"] = uuid.uuid4().hex
+            self.db.set_meta({f"{META_PREFIX}node_id": state[f"{META_PREFIX}node_id"]})
+        return state
+
+    def cut_batch(self) -> Optional[Path]:
+        """Write the next batch if anything was committed since the last one."""
+        state = self._state()
+        after = {t: int(state.get(f"{META_PREFIX}{t}", 0)) for t in SOURCES}
+        batch = int(state.get(f"{META_PREFIX}batch", 0)) + 1
+
+        rows: Dict[str, List[Dict[str, Any]]] = {t: [] for t in SOURCES}
+        conn = self.db.connection()
+        conn.execute("BEGIN")  # one read snapshot across all sources
+        try:
+            for table in SOURCES:
+                rows[table] = self.db.get_rows_after_id(table, after[table], self.batch_rows)
+                if table == "probe_calibrations" and len(rows[table]) >= self.batch_rows:
+                    break  # readings may reference calibrations past this page: ship those first
+            probes = self.db.get_probe_labels()
+        finally:
+            conn.execute("COMMIT")
+        if not any(rows.values()):
+            return None
+
+        upto = {t: rows[t][-1]["id"] if rows[t] else after[t] for t in SOURCES}
+        header = {
+            "format": FORMAT,
+            "site": self.site,
+            "node_id": state[f"{META_PREFIX}node_id"],
+            "batch": batch,
+            "after": after,
+            "upto": upto,
+            "probes": {str(k): v for k, v in probes.items()},
+        }
+        path = write_batch(self.outbox, header, rows)
+        self.db.set_meta({f"{META_PREFIX}batch": batch, **{f"{META_PREFIX}{t}": upto[t] for t in SOURCES}})
+        self.shipped += sum(len(r) for r in rows.values())
+        return path
+
+    # ---------- http transport ----------
+
+    def send_pending(self) -> int:
+        """POST outbox batches in order; stop at the first failure. Returns batches sent."""
+        sent = 0
+        for path in sorted(p for p in self.outbox.glob(f"*{SUFFIX}") if not p.name.startswith(".")):
+            try:
+                parse_name(path.name)
+            except ValueError:
+                continue
+            req = urllib.request.Request(
+                f"{self.url}?{urllib.parse.urlencode({'name': path.name})}",
+                data=path.read_bytes(),
+                method="POST",
+                headers={"Content-Type": "application/gzip"},
+            )
+            if self.token:
+                req.add_header("Authorization", f"Bearer {self.token}")
+            try:
+                with urllib.request.urlopen(req, timeout=self.timeout):
+                    pass
+            except urllib.error.HTTPError as e:
+                if e.code in (400, 422):
+                    # the central node will never take this file; keep it aside instead of blocking the queue
+                    rejected = self.outbox / "rejected"
+                    rejected.mkdir(exist_ok=True)
+                    shutil.move(str(path), str(rejected / path.name))
+                    print(f"Sync: central node rejected {path.name}: HTTP {e.code}")
+                    continue
+                print(f"Sync: upload of {path.name} failed: HTTP {e.code}")
+                return sent
+            except (urllib.error.URLError, OSError) as e:
+                print(f"Sync: upload of {path.name} failed: {e}")
+                return sent
+            os.remove(path)
+            sent += 1
+        return sent
+
+    # ---------- thread ----------
+
+    def poll_once(self) -> int:
+        """Cut batches until caught up, then upload them (http transport). Returns batches cut."""
+        cut = 0
+        while self.cut_batch() is not None:
+            cut += 1
+        if self.url:
+            self.send_pending()
+        return cut
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sync-ship", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        try:
+            while not self._stop.is_set():
+                try:
+                    self.poll_once()
+                except Exception as e:
+                    print(f"Sync shipping failed: {e}")
+                self._stop.wait(self.poll_interval)
+        finally:
+            self.db.close()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.timeout + 5.0)
+        self._thread = None
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description="Ship new plant.db rows to a central node as sync batches")
+    ap.add_argument("--db", default="data/plant.db")
+    ap.add_argument("--schema", default="sql/001_init.sql")
+    ap.add_argument("--site", default="", help="This node's site name (default: hostname)")
+    ap.add_argument("--outbox", default="data/sync/outbox", help="Batch directory (the central inbox for file transport)")
+    ap.add_argument("--url", default="", help="Central /api/sync/batches URL (http transport)")
+    ap.add_argument("--token", default=os.environ.get("PLANTPIPE_SYNC_TOKEN", ""))
+    ap.add_argument("--batch-rows", type=int, default=5000)
+    ap.add_argument("--interval", type=float, default=10.0, help="Seconds between polls")
+    ap.add_argument("--once", action="store_true", help="Ship pending rows and exit")
+    return ap.parse_args()
+
+
+def main():
+    args = parse_args()
+    db = PlantDBWrapper(args.db, args.schema)
+    shipper = SyncShipper(db, args.site, args.outbox, url=args.url, token=args.token,
+                          batch_rows=args.batch_rows, poll_interval=args.interval)
+    if args.once:
+        cut = shipper.poll_once()
+        print(f"Cut {cut} batch(es), {shipper.shipped} rows for site {shipper.site}")
+        db.close()
+        return
+    shipper.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        shipper.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,20 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "src"))
+
+from plantpipe.storage.database import PlantDBWrapper  # noqa: E402
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = PlantDBWrapper(str(tmp_path / "plant.db"), str(ROOT / "sql" / "001_init.sql"))
+    yield db
+    db.close()
+
+
+def reading(probe_id: int, seq: int, ts: str = "2026-01-01 00:00:00", **extra):
+    return {"ts": ts, "probe_id": probe_id, "seq": seq, "lux": 100.0, "rh": 50.0, "temp_c": 20.0, **extra}
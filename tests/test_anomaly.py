@@ -0,0 +1,27 @@
+import numpy as np
+
+from plantpipe.processing.anomaly import _trailing_max, score_history
+
+
+def _ts(n):
+    return [f"2026-01-{1 + i // 86400:02d} {i // 3600 % 24:02d}:{i // 60 % 60:02d}:{i % 60:02d}" for i in range(n)]
+
+
+def test_small_step_after_a_flat_window_is_not_a_spike():
+    rng = np.random.default_rng(7)
+    values = list(rng.uniform(15000, 20000, 40000)) + [18068.6] * 60 + [18069.1]
+    findings = score_history(_ts(len(values)), values, "lux", window=60, z_threshold=6.0)
+    assert [f for f in findings if f["ts"] == _ts(len(values))[-1]] == []
+
+
+def test_spike_is_still_found():
+    values = [20.0 + 0.1 * (i % 5) for i in range(200)] + [35.0]
+    findings = score_history(_ts(len(values)), values, "temp_c", window=60)
+    assert [(f["type"], f["value"]) for f in findings] == [("spike", 35.0)]
+
+
+def test_trailing_max_matches_a_direct_scan():
+    x = np.random.default_rng(3).normal(size=1000)
+    for w in (1, 2, 7, 64, 1000):
+        expected = [x[max(0, i - w + 1):i + 1].max() for i in range(x.size)]
+        assert np.array_equal(_trailing_max(x, w), expected)
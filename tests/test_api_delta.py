@@ -0,0 +1,32 @@
+from fastapi.testclient import TestClient
+
+from conftest import ROOT, reading
+from plantpipe.api.api_server import PlantAPI, decode_cursor
+
+
+def test_idle_probe_cursor_advances(db):
+    for p in (1, 2):
+        db.ensure_probe_exists(p)
+    db.insert_batch_readings([reading(2, 0)], raise_errors=True)
+    client = TestClient(PlantAPI(db, frontend=str(ROOT / "frontend")).app)
+
+    cursor = client.get("/api/delta", params={"probe_id": 2}).json()["cursor"]
+    db.insert_batch_readings([reading(1, i) for i in range(50)], raise_errors=True)
+
+    body = client.get("/api/delta", params={"cursor": cursor, "probe_id": 2}).json()
+    assert body["rows"] == [] and not body["has_more"]
+    assert decode_cursor(body["cursor"]) == db.max_reading_id()
+
+    db.insert_batch_readings([reading(2, 1)], raise_errors=True)
+    rows = client.get("/api/delta", params={"cursor": body["cursor"], "probe_id": 2}).json()["rows"]
+    assert [(r["probe_id"], r["seq"]) for r in rows] == [(2, 1)]
+
+
+def test_paged_cursor_stops_at_last_row(db):
+    db.ensure_probe_exists(1)
+    db.insert_batch_readings([reading(1, i) for i in range(5)], raise_errors=True)
+    client = TestClient(PlantAPI(db, frontend=str(ROOT / "frontend")).app)
+
+    body = client.get("/api/delta", params={"limit": 2}).json()
+    assert body["has_more"]
+    assert decode_cursor(body["cursor"]) == body["rows"][-1]["id"]
@@ -0,0 +1,89 @@
+import pytest
+
+from conftest import reading
+from plantpipe.output.cdc import CDCReader, CDCWriter, OffsetPrunedError, _segment_name
+
+
+def _offsets_and_ids(directory):
+    events = list(CDCReader(str(directory), "test").read(max_events=10_000))
+    return [e["offset"] for e in events], [e["id"] for e in events if e["table"] == "readings"]
+
+
+def test_failed_write_keeps_rows(db, tmp_path, monkeypatch):
+    db.ensure_probe_exists(1)
+    db.insert_batch_readings([reading(1, i) for i in range(5)], raise_errors=True)
+    writer = CDCWriter(db, str(tmp_path / "cdc"))
+
+    def fail(*args):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(writer, "_save_state", fail)
+    with pytest.raises(OSError):
+        writer.poll_once()
+    assert writer.next_offset == 0 and writer.watermarks["readings"] == 0
+    monkeypatch.undo()
+
+    assert writer.poll_once() == 5
+    offsets, ids = _offsets_and_ids(tmp_path / "cdc")
+    assert offsets == list(range(5)) and len(set(ids)) == 5
+
+
+def test_unrecorded_segment_is_dropped_on_load(db, tmp_path):
+    db.ensure_probe_exists(1)
+    db.insert_batch_readings([reading(1, i) for i in range(3)], raise_errors=True)
+    directory = tmp_path / "cdc"
+    CDCWriter(db, str(directory)).poll_once()
+
+    # crash after rotating to and writing a new segment, before its state was saved
+    orphan = directory / _segment_name(3)
+    orphan.write_text('{"offset":3}\n', encoding="utf-8")
+
+    db.insert_batch_readings([reading(1, i) for i in range(3, 5)], raise_errors=True)
+    writer = CDCWriter(db, str(directory), segment_bytes=1)
+    assert not orphan.exists()
+    assert writer.poll_once() == 2
+    offsets, ids = _offsets_and_ids(directory)
+    assert offsets == list(range(5)) and len(set(ids)) == 5
+
+
+def _calibrate(db, probe_id, lux_max=20000.0):
+    return db.set_active_calibration(probe_id, 850, 350, 0, lux_max, 0, 100, -10, 50)
+
+
+def test_calibration_deactivation_is_captured_in_commit_order(db, tmp_path):
+    first = _calibrate(db, 1)
+    second = _calibrate(db, 1, lux_max=10000.0)
+    CDCWriter(db, str(tmp_path / "cdc")).poll_once()
+
+    events = list(CDCReader(str(tmp_path / "cdc"), "test").read())
+    assert [(e["op"], e["id"]) for e in events] == [("insert", first), ("update", first), ("insert", second)]
+    assert events[1]["row"] == {"id": first, "probe_id": 1, "active": 0}
+
+
+def test_readings_wait_for_calibrations_past_a_full_page(db, tmp_path):
+    cals = [_calibrate(db, 1, lux_max=float(10000 + i)) for i in range(5)]
+    db.insert_batch_readings([reading(1, i, calibration_id=cals[-1]) for i in range(3)], raise_errors=True)
+    CDCWriter(db, str(tmp_path / "cdc"), batch_size=2).poll_once()
+
+    seen = set()
+    events = list(CDCReader(str(tmp_path / "cdc"), "test").read())
+    for e in events:
+        if e["table"] == "probe_calibrations" and e["op"] == "insert":
+            seen.add(e["id"])
+        elif e["table"] == "readings":
+            assert e["row"]["calibration_id"] in seen
+    assert [e["offset"] for e in events] == list(range(len(events)))
+    assert sum(e["op"] == "update" for e in events) == 4
+
+
+def test_reader_reports_pruned_offsets(db, tmp_path):
+    db.ensure_probe_exists(1)
+    db.insert_batch_readings([reading(1, i) for i in range(6)], raise_errors=True)
+    CDCWriter(db, str(tmp_path / "cdc"), segment_bytes=1, batch_size=1, keep_segments=2).poll_once()
+
+    reader = CDCReader(str(tmp_path / "cdc"), "late")
+    with pytest.raises(OffsetPrunedError) as e:
+        list(reader.read())
+    assert e.value.oldest == 4
+    reader.commit(e.value.oldest)
+    assert [ev["offset"] for ev in reader.read()] == [4, 5]
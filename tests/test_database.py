@@ -0,0 +1,48 @@
+import sqlite3
+
+from conftest import reading
+
+
+def test_insert_alerts_reports_failure_outside_a_transaction(db, monkeypatch):
+    db.ensure_probe_exists(1)
+    conn = db.connection()
+
+    # BEGIN itself fails (e.g. database locked): there is nothing to roll back
+    class Locked:
+        in_transaction = False
+
+        def execute(self, sql, *args):
+            if sql == "BEGIN":
+                raise sqlite3.OperationalError("database is locked")
+            return conn.execute(sql, *args)
+
+    monkeypatch.setattr(db, "_get_conn", lambda: Locked())
+    assert db.insert_alerts([{"probe_id": 1, "type": "too_dry", "message": "x"}]) is False
+
+
+def test_insert_alerts_rolls_back_bad_batch(db):
+    db.ensure_probe_exists(1)
+    assert db.insert_alerts([
+        {"probe_id": 1, "type": "too_dry", "message": "ok"},
+        {"probe_id": 1, "type": "not_a_type", "message": "bad"},
+    ]) is False
+    assert db.get_probe_alerts(1) == []
+    assert not db.connection().in_transaction
+
+
+def test_ingest_counters_accumulate_and_reject_bad_rows(db):
+    db.ensure_probe_exists(1)
+    assert db.add_ingest_counters("sequence", {(1, "delivered"): 3})
+    assert db.add_ingest_counters("sequence", {(1, "delivered"): 2})
+    assert db.add_ingest_counters("sequence", {(999, "delivered"): 1}) is False
+    assert not db.connection().in_transaction
+    stats = {(r["stage"], r["counter"]): r["value"] for r in db.get_ingest_stats(1)}
+    assert stats[("sequence", "delivered")] == 5
+
+
+def test_history_and_series_keep_insert_order_within_a_ts(db):
+    db.ensure_probe_exists(1)
+    ts = "2026-01-01 00:00:00"
+    db.insert_batch_readings([reading(1, s, ts=ts, lux=lux) for s, lux in enumerate((30.0, 10.0, 20.0))], raise_errors=True)
+    assert [v for _, v in db.get_metric_history(1, "lux", ts)] == [30.0, 10.0, 20.0]
+    assert [v for _, v in db.get_series(1, "lux", ts)] == [30.0, 10.0, 20.0]
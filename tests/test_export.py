@@ -0,0 +1,25 @@
+import pytest
+
+from conftest import reading
+from plantpipe.output import export
+
+
+def test_failed_sink_removes_copy_snapshot(db, tmp_path, monkeypatch):
+    db.ensure_probe_exists(1)
+    db.insert_batch_readings([reading(1, i) for i in range(3)], raise_errors=True)
+    out = tmp_path / "out"
+
+    def fail(path, fmt):
+        raise ImportError("pyarrow is required")
+
+    monkeypatch.setattr(export, "open_sink", fail)
+    with pytest.raises(ImportError):
+        export.export_readings(str(db.path), str(out / "readings.parquet"), copy=True)
+    assert list(out.glob("plant_snapshot_*")) == []
+
+
+def test_export_csv(db, tmp_path):
+    db.ensure_probe_exists(1)
+    db.insert_batch_readings([reading(1, i) for i in range(3)], raise_errors=True)
+    assert export.export_readings(str(db.path), str(tmp_path / "r.csv"), copy=True) == 3
+    assert list(tmp_path.glob("plant_snapshot_*")) == []
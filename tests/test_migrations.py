@@ -0,0 +1,92 @@
+import shutil
+import sqlite3
+import time
+
+from conftest import ROOT, reading
+from plantpipe.config import PipelineConfig
+from plantpipe.core.pipe import PipelineRunner
+from plantpipe.storage.database import PlantDBWrapper
+from plantpipe.sync.merger import SyncMerger
+from plantpipe.sync.shipper import SyncShipper
+
+SCHEMA = str(ROOT / "sql" / "001_init.sql")
+
+
+def _baseline_db(tmp_path):
+    """A plant.db at version 1 opened with every migration available (startup stops at 003's online steps)."""
+    old = tmp_path / "old_sql"
+    old.mkdir()
+    shutil.copy(SCHEMA, old / "001_init.sql")
+    path = str(tmp_path / "plant.db")
+    PlantDBWrapper(path, str(old / "001_init.sql")).close()
+    return PlantDBWrapper(path, SCHEMA)
+
+
+def test_finish_migrations_applies_steps_behind_an_online_step(tmp_path):
+    db = _baseline_db(tmp_path)
+    try:
+        assert db.migrations_pending()
+        assert not db.table_exists("sync_sites")
+        assert db.finish_migrations()
+        assert not db.migrations_pending()
+        assert db.table_exists("sync_sites")
+        assert db.table_exists("probe_calibration_changes")
+    finally:
+        db.close()
+
+
+def test_standalone_merger_finishes_migrations(tmp_path):
+    edge = PlantDBWrapper(str(tmp_path / "edge.db"), SCHEMA)
+    edge.ensure_probe_exists(1)
+    edge.insert_batch_readings([reading(1, 0)], raise_errors=True)
+    SyncShipper(edge, "north", str(tmp_path / "inbox")).cut_batch()
+    edge.close()
+
+    central = _baseline_db(tmp_path)
+    try:
+        waiting = SyncMerger(central, str(tmp_path / "inbox"))
+        assert waiting.poll_once() == 0  # pipeline mode: waits for the background migrator
+        assert SyncMerger(central, str(tmp_path / "inbox"), migrate=True).poll_once() == 1
+        assert [s["name"] for s in central.get_sync_sites()] == ["north"]
+    finally:
+        central.close()
+
+
+def test_second_runner_skips_steps_already_applied(tmp_path):
+    db = _baseline_db(tmp_path)
+    try:
+        assert db.start_background_migrations()
+        assert db.finish_migrations()  # races the background thread step by step
+        while db.migration_status()["running"]:
+            time.sleep(0.01)
+        status = db.migration_status()
+        assert status["error"] is None
+        assert status["version"] == status["target"] and not status["pending"]
+    finally:
+        db.close()
+
+
+def test_writes_blocked_by_an_index_build_go_to_the_spool(tmp_path):
+    cfg = PipelineConfig()
+    cfg.database.path = str(tmp_path / "plant.db")
+    cfg.database.schema = SCHEMA
+    cfg.spool.directory = str(tmp_path / "spool")
+    runner = PipelineRunner(cfg)
+    runner.db.ensure_probe_exists(1)
+    runner.db.connection().execute("PRAGMA busy_timeout=50")
+
+    # a background step holds the write lock for the whole CREATE INDEX
+    build = sqlite3.connect(cfg.database.path, isolation_level=None)
+    build.execute("BEGIN IMMEDIATE")
+    runner._flush([reading(1, s) for s in range(3)])
+    assert runner.spool.pending()
+    assert runner.stored == 0 and runner.failed == 0
+    build.execute("COMMIT")
+    build.close()
+
+    rows, ends, _ = runner.spool.read(100)
+    assert runner._insert(rows) == 3
+    runner.spool.commit(ends[-1], 3)
+    assert runner.stored == 3 and not runner.spool.pending()
+    runner.spool.close()
+    runner.db.close()
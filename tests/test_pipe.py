@@ -0,0 +1,65 @@
+import sqlite3
+import threading
+
+import pytest
+
+from conftest import ROOT, reading
+from plantpipe.config import PipelineConfig
+from plantpipe.core.pipe import PipelineRunner
+
+
+@pytest.fixture
+def runner(tmp_path):
+    cfg = PipelineConfig()
+    cfg.database.path = str(tmp_path / "plant.db")
+    cfg.database.schema = str(ROOT / "sql" / "001_init.sql")
+    cfg.spool.directory = str(tmp_path / "spool")
+    runner = PipelineRunner(cfg)
+    yield runner
+    runner.spool.close()
+    runner.db.close()
+
+
+def test_stage_counters_drop_keys_that_can_never_be_stored(runner):
+    runner.db.ensure_probe_exists(1)
+    stage = runner.stages[0]
+    stage.count(1, "delivered", 3)
+    stage.count(999, "delivered", 1)  # no such probe
+
+    runner._flush_stage_counters()
+    assert stage.drain_counters() == {}
+    stats = {(r["probe_id"], r["counter"]): r["value"] for r in runner.db.get_ingest_stats()}
+    assert stats == {(1, "delivered"): 3}
+
+
+def test_stage_counters_are_kept_on_a_transient_error(runner, monkeypatch):
+    runner.db.ensure_probe_exists(1)
+    stage = runner.stages[0]
+    stage.count(1, "delivered", 3)
+
+    def locked(*args, **kwargs):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(runner.db, "add_ingest_counters", locked)
+    runner._flush_stage_counters()
+    assert stage.drain_counters() == {(1, "delivered"): 3}
+
+
+def test_writer_and_drainer_counts_add_up(runner):
+    runner.db.ensure_probe_exists(1)
+
+    def insert(first_seq):
+        for b in range(20):
+            seq = first_seq + b * 5
+            # one unknown probe per batch forces the row-by-row path
+            rows = [reading(1, seq + i, ts=f"2026-01-01 00:{b:02d}:{i:02d}") for i in range(4)] + [reading(999, 0)]
+            runner._insert(rows)
+        runner.db.close()
+
+    threads = [threading.Thread(target=insert, args=(k * 1000,)) for k in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert (runner.stored, runner.failed) == (160, 40)
+    assert runner.db.max_reading_id() == 160
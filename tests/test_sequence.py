@@ -0,0 +1,50 @@
+from conftest import reading
+from plantpipe.processing.sequence import SequenceStage
+
+
+def _feed(stage, seqs, ts="2026-01-01 00:00:00"):
+    out = []
+    for s in seqs:
+        out.extend(stage.process(reading(1, s, ts=ts)))
+    return [p["seq"] for p in out]
+
+
+def test_restart_after_short_uptime_is_a_reset():
+    stage = SequenceStage(window=64)
+    assert _feed(stage, range(30)) == list(range(30))
+    # device rebooted before its counter got past the window
+    assert _feed(stage, range(30), ts="2026-01-01 00:05:00") == list(range(30))
+    counters = stage.drain_counters()
+    assert counters[(1, "reset")] == 1
+    assert (1, "duplicate") not in counters
+
+
+def test_restart_that_lost_seq_zero_is_a_reset():
+    stage = SequenceStage(window=64)
+    _feed(stage, range(30))
+    assert _feed(stage, range(1, 5)) == [1, 2, 3, 4]
+    assert stage.drain_counters()[(1, "reset")] == 1
+
+
+def test_recent_repeats_are_duplicates():
+    stage = SequenceStage(window=64)
+    _feed(stage, range(30))
+    assert _feed(stage, [29, 20, 15]) == []
+    assert stage.drain_counters()[(1, "duplicate")] == 3
+
+
+def test_late_gap_seq_is_not_a_reset():
+    stage = SequenceStage(window=64, max_wait=0.0)
+    _feed(stage, [0, 1])
+    assert _feed(stage, range(3, 20)) == []
+    assert [p["seq"] for p in stage.flush()] == list(range(3, 20))
+    assert _feed(stage, [2]) == [2]
+    counters = stage.drain_counters()
+    assert counters[(1, "late")] == 1 and (1, "reset") not in counters
+
+
+def test_far_behind_replay_is_stale():
+    stage = SequenceStage(window=8)
+    _feed(stage, range(100))
+    assert _feed(stage, [50]) == []
+    assert stage.drain_counters()[(1, "stale")] == 1
@@ -0,0 +1,28 @@
+from plantpipe.input.serial_ingestor import ProbeManager
+
+CALIBRATION = {
+    "raw_dry": 850, "raw_wet": 350, "lux_min": 0, "lux_max": 20000,
+    "rh_min": 0, "rh_max": 100, "temp_min": -10, "temp_max": 50,
+}
+
+
+def test_recalibration_reaches_a_running_reader(db):
+    manager = ProbeManager(db, CALIBRATION, check_interval=0.0)
+    first = manager.prepare_reading({"probe_id": 1, "seq": 0, "lux": 15000.0})
+    assert first is not None
+
+    # recalibrated from elsewhere (API, CLI, another process) while the reader runs
+    cal_id = db.set_active_calibration(1, 850, 350, 0, 10000, 0, 100, -10, 50)
+    assert manager.prepare_reading({"probe_id": 1, "seq": 1, "lux": 15000.0}) is None
+    second = manager.prepare_reading({"probe_id": 1, "seq": 2, "lux": 5000.0})
+    assert second["calibration_id"] == cal_id != first["calibration_id"]
+
+
+def test_calibration_cache_is_checked_at_most_once_per_interval(db, monkeypatch):
+    manager = ProbeManager(db, CALIBRATION, check_interval=3600.0)
+    manager.prepare_reading({"probe_id": 1, "seq": 0, "lux": 10.0})
+    calls = []
+    monkeypatch.setattr(db, "calibration_version", lambda: calls.append(1) or 0)
+    for seq in range(1, 20):
+        manager.prepare_reading({"probe_id": 1, "seq": seq, "lux": 10.0})
+    assert calls == []
@@ -0,0 +1,225 @@
+import shutil
+
+import pytest
+from fastapi.testclient import TestClient
+
+from conftest import ROOT, reading
+from plantpipe.api.api_server import PlantAPI
+from plantpipe.input.serial_ingestor import ProbeManager
+from plantpipe.storage.database import PlantDBWrapper
+from plantpipe.sync.batch import SUFFIX, batch_name, read_batch, write_batch
+from plantpipe.sync.merger import SyncMerger
+from plantpipe.sync.shipper import SyncShipper
+
+CALIBRATION = {
+    "raw_dry": 850, "raw_wet": 350, "lux_min": 0, "lux_max": 20000,
+    "rh_min": 0, "rh_max": 100, "temp_min": -10, "temp_max": 50,
+}
+
+
+def _batch(site, batch, probe_ids, after=0):
+    rows = [dict(reading(p, i, ts=f"2026-01-01 00:00:{i:02d}"), id=after + n + 1, moisture_raw=None, calibration_id=None)
+            for n, (i, p) in enumerate((i, p) for p in probe_ids for i in range(2))]
+    header = {
+        "format": 1, "site": site, "node_id": f"{site}-node", "batch": batch,
+        "after": {"readings": after}, "upto": {"readings": rows[-1]["id"]},
+        "probes": {str(p): f"Probe {p}" for p in probe_ids},
+    }
+    return header, {"readings": rows}
+
+
+def _probe_counts(db):
+    return dict(db.connection().execute("SELECT probe_id, COUNT(*) FROM readings GROUP BY probe_id").fetchall())
+
+
+def test_merged_probes_do_not_collide_with_local_probes(db):
+    base = db.SYNC_PROBE_ID_BASE
+    assert db.merge_sync_batch(*_batch("north", 1, [1, 2]))["status"] == "merged"
+
+    # a probe wired to the central node with the same firmware id as an edge probe
+    manager = ProbeManager(db, CALIBRATION)
+    payload = manager.prepare_reading({"probe_id": 1, "seq": 0, "lux": 10.0})
+    assert db.insert_single_reading(payload, raise_errors=True)
+
+    site_id = db.get_sync_sites()[0]["id"]
+    assert _probe_counts(db) == {1: 1, site_id * base + 1: 2, site_id * base + 2: 2}
+    assert db.get_probe_labels()[1] == "Probe 1"
+    assert db.get_probe_labels()[site_id * base + 1] == "north/Probe 1"
+
+
+def test_local_ingest_refuses_merged_probe_range(db):
+    db.merge_sync_batch(*_batch("north", 1, [3]))
+    merged_id = db.get_sync_sites()[0]["id"] * db.SYNC_PROBE_ID_BASE + 3
+    manager = ProbeManager(db, CALIBRATION)
+    assert manager.prepare_reading({"probe_id": merged_id, "seq": 0, "lux": 10.0}) is None
+
+
+def test_merge_refuses_taken_probe_id(db):
+    db.ensure_probe_exists(db.SYNC_PROBE_ID_BASE + 4)  # created before the range was reserved
+    with pytest.raises(ValueError):
+        db.merge_sync_batch(*_batch("north", 1, [4]))
+    assert _probe_counts(db) == {}
+    assert not db.connection().in_transaction
+
+
+# ---------- edge -> central flow ----------
+
+@pytest.fixture
+def edge(tmp_path):
+    edge = PlantDBWrapper(str(tmp_path / "edge.db"), str(ROOT / "sql" / "001_init.sql"))
+    yield edge
+    edge.close()
+
+
+def _cal(db, probe_id, raw_dry=850, raw_wet=350):
+    cal = dict(CALIBRATION, raw_dry=raw_dry, raw_wet=raw_wet)
+    return db.set_active_calibration(probe_id, **cal)
+
+
+def _ship(edge, tmp_path, batch_rows=5000):
+    shipper = SyncShipper(edge, "north", str(tmp_path / "outbox"), batch_rows=batch_rows)
+    shipper.poll_once()
+    return sorted((tmp_path / "outbox").glob(f"*{SUFFIX}"))
+
+
+def test_later_batches_wait_for_a_missing_one(db, edge, tmp_path):
+    edge.ensure_probe_exists(1)
+    edge.insert_batch_readings([reading(1, i) for i in range(4)], raise_errors=True)
+    first, second = _ship(edge, tmp_path, batch_rows=2)
+    inbox = tmp_path / "inbox"
+    merger = SyncMerger(db, str(inbox))
+
+    shutil.copy(second, inbox / second.name)
+    assert merger.poll_once() == 0
+    assert (inbox / second.name).exists() and _probe_counts(db) == {}
+
+    shutil.copy(first, inbox / first.name)
+    assert merger.poll_once() == 2
+    assert list(inbox.glob(f"*{SUFFIX}")) == []
+    assert sum(_probe_counts(db).values()) == 4
+
+
+def test_redelivered_batch_is_a_no_op(db):
+    header, rows = _batch("north", 1, [1])
+    assert db.merge_sync_batch(header, rows)["status"] == "merged"
+    again = db.merge_sync_batch(header, rows)
+    assert again["status"] == "duplicate" and again["rows"]["readings"] == 0
+    assert sum(_probe_counts(db).values()) == 2
+    assert db.get_sync_sites()[0]["batches"] == 1
+
+
+def test_recreated_edge_starts_over_and_its_old_node_is_refused(db):
+    old = _batch("north", 1, [1])
+    assert db.merge_sync_batch(*old)["status"] == "merged"
+    leftover = _batch("north", 2, [1], after=2)
+
+    renewed = _batch("north", 1, [1])
+    renewed[0]["node_id"] = "north-node-2"
+    assert db.merge_sync_batch(*renewed)["status"] == "merged"
+    site = db.get_sync_sites()[0]
+    assert site["node_id"] == "north-node-2" and site["watermarks"]["readings"] == 2
+
+    with pytest.raises(ValueError):
+        db.merge_sync_batch(*leftover)
+    with pytest.raises(ValueError):
+        db.merge_sync_batch(*old)
+    assert not db.connection().in_transaction
+
+    following = _batch("north", 2, [1], after=2)
+    following[0]["node_id"] = "north-node-2"
+    assert db.merge_sync_batch(*following)["status"] == "merged"
+
+    unseen = _batch("north", 5, [1], after=40)
+    unseen[0]["node_id"] = "north-node-3"
+    assert db.merge_sync_batch(*unseen)["status"] == "gap"
+    assert db.get_sync_sites()[0]["node_id"] == "north-node-2"
+
+
+def test_merger_rejects_batches_of_a_replaced_node(db, tmp_path):
+    inbox = tmp_path / "inbox"
+    merger = SyncMerger(db, str(inbox))
+    renewed = _batch("north", 1, [1])
+    assert db.merge_sync_batch(*_batch("north", 1, [1]))["status"] == "merged"
+    renewed[0]["node_id"] = "north-node-2"
+    assert db.merge_sync_batch(*renewed)["status"] == "merged"
+
+    write_batch(inbox, *_batch("north", 2, [1], after=2))
+    assert merger.poll_once() == 0
+    assert (inbox / "rejected" / batch_name("north", 2)).exists()
+
+
+def test_calibrations_are_mapped_to_central_ids(db, edge, tmp_path):
+    db.ensure_probe_exists(1)
+    _cal(db, 1)  # central calibration ids are ahead of the edge's
+    edge.ensure_probe_exists(7)
+    edge_cal = _cal(edge, 7, raw_dry=800, raw_wet=400)
+    edge.insert_batch_readings(
+        [reading(7, 0, moisture_raw=600, calibration_id=edge_cal),
+         reading(7, 1, moisture_raw=400, calibration_id=edge_cal)],
+        raise_errors=True,
+    )
+    inbox = tmp_path / "inbox"
+    merger = SyncMerger(db, str(inbox))
+    for path in _ship(edge, tmp_path):
+        shutil.move(str(path), str(inbox / path.name))
+    assert merger.poll_once() == 1
+
+    central_probe = db.get_sync_sites()[0]["id"] * db.SYNC_PROBE_ID_BASE + 7
+    central_cal = db.get_active_calibration_id(central_probe)
+    assert central_cal is not None and central_cal != edge_cal
+    assert db.get_calibration_raw_range(central_cal) == (800, 400)
+    rows = db.connection().execute(
+        "SELECT calibration_id, moisture_pct FROM readings WHERE probe_id = ? ORDER BY seq", (central_probe,)
+    ).fetchall()
+    assert [tuple(r) for r in rows] == [(central_cal, 50), (central_cal, 100)]
+
+
+def test_unreadable_batches_are_set_aside(db, tmp_path):
+    inbox = tmp_path / "inbox"
+    merger = SyncMerger(db, str(inbox))
+    (inbox / batch_name("north", 1)).write_bytes(b"not gzip")
+    header, rows = _batch("south", 1, [1])
+    write_batch(inbox, header, rows)
+    (inbox / batch_name("south", 1)).rename(inbox / batch_name("west", 1))  # name and header disagree
+
+    assert merger.poll_once() == 0
+    assert sorted(p.name for p in (inbox / "rejected").iterdir()) == [batch_name("north", 1), batch_name("west", 1)]
+    assert db.get_sync_sites() == []
+
+
+def test_shipper_ships_a_full_calibration_page_before_readings(edge, tmp_path):
+    for p in (1, 2, 3):
+        edge.ensure_probe_exists(p)
+        _cal(edge, p)
+    edge.insert_batch_readings([reading(3, 0, moisture_raw=600, calibration_id=3)], raise_errors=True)
+
+    first, second = _ship(edge, tmp_path, batch_rows=2)
+    header, rows = read_batch(first)
+    assert [r["id"] for r in rows["probe_calibrations"]] == [1, 2] and rows["readings"] == []
+    assert header["upto"] == {"probe_calibrations": 2, "readings": 0, "probe_alerts": 0}
+    header, rows = read_batch(second)
+    assert header["after"] == {"probe_calibrations": 2, "readings": 0, "probe_alerts": 0}
+    assert [r["id"] for r in rows["probe_calibrations"]] == [3]
+    assert [r["calibration_id"] for r in rows["readings"]] == [3]
+    assert edge.get_meta("sync.")["sync.batch"] == "2"
+    assert _ship(edge, tmp_path) == [first, second]  # nothing new: no third batch
+
+
+def test_batch_upload_needs_the_sync_token(db, tmp_path):
+    inbox = tmp_path / "inbox"
+    api = PlantAPI(db, frontend=str(ROOT / "frontend"), sync_inbox=str(inbox), sync_token="s3cret")
+    client = TestClient(api.app)
+    write_batch(tmp_path, *_batch("north", 1, [1]))
+    name = batch_name("north", 1)
+    data = (tmp_path / name).read_bytes()
+
+    assert client.post("/api/sync/batches", params={"name": name}, content=data).status_code == 401
+    wrong = {"Authorization": "Bearer nope"}
+    assert client.post("/api/sync/batches", params={"name": name}, content=data, headers=wrong).status_code == 401
+    assert not (inbox / name).exists()
+
+    auth = {"Authorization": "Bearer s3cret"}
+    assert client.post("/api/sync/batches", params={"name": batch_name("north", 2)}, content=data,
+                       headers=auth).status_code == 400
+    assert client.post("/api/sync/batches", params={"name": name}, content=data, headers=auth).status_code == 202
+    assert (inbox / name).read_bytes() == data